@@ -0,0 +1,234 @@
+# anfis.py
+#
+# Evaluasi model ANFIS (Sugeno orde-1, multi-kelas) dari data/anfis_export.json dengan NumPy,
+# untuk scoring ulang rekaman sensor tulang belakang secara offline. Model yang sama dievaluasi
+# per sampel oleh ANFIS::predict di firmware ESP32 (src/anfis_model.cpp); di sini seluruh array
+# (N, 6) dihitung sekaligus:
+#   1. normalisasi scaler: x = (x_raw - mean) / scale
+#   2. membership Gaussian: mu[n, i, m] = exp(-0.5 * ((x[n, i] - center[i, m]) / sigma[i, m])^2)
+#   3. firing strength rule (product t-norm lewat tabel rules.index): satu perkalian matriks
+#      log(mu) @ S, dengan S matriks seleksi (12, R) dari rules.index
+#   4. normalisasi w / sum(w), consequent linear per rule dan kelas (satu GEMM), softmax
+# Semua perhitungan float32 seperti firmware, termasuk ambang sum(w) > 1e-10.
+#
+# Layout consequents: JSON menyimpan (R, C, 7) = [rule][kelas][bias, w1..w6] (lihat meta),
+# sedangkan loader firmware membaca consequents[c] seolah-olah (C, R, 7), sehingga di perangkat
+# hanya 8 "rule" pertama per kelas yang terisi (transpos) dan sisanya nol.
+# firmware_layout=True mereproduksi pembacaan firmware tersebut persis (untuk membandingkan
+# dengan log perangkat); default memakai layout yang tertulis di JSON.
+#
+# Penggunaan:
+#   python anfis.py rekaman.csv --output skor.csv          # CSV dengan header ccx..scx, atau .npy (N, 6)
+#   python anfis.py rekaman.npy --output skor.csv --firmware-layout
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import numpy as np
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'anfis_export.json')
+CHUNK_ROWS = 65536  # Frame per potongan saat streaming file log (memori ~ CHUNK_ROWS x 64 rule)
+W_SUM_EPS = 1e-10  # Ambang sum firing strength dan sum exp softmax (sama dengan firmware)
+
+
+class AnfisModel:
+    """
+    Model ANFIS dari JSON export. Parameter disimpan sebagai array NumPy (dtype default float32,
+    sama dengan firmware) dan matriks turunan untuk evaluasi batch dihitung sekali saat load.
+    - predict_scores(x_raw): skor (N, C), softmax (default) atau skor TSK mentah.
+    - predict(x_raw): (indeks kelas (N,), skor (N, C)).
+    """
+    def __init__(self, spec, firmware_layout=False, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self.features = list(spec['features'])
+        self.classes = list(spec['classes'])
+        self.mean = np.asarray(spec['scaler_mean'], dtype=self.dtype)
+        self.scale = np.asarray(spec['scaler_scale'], dtype=self.dtype)
+        self.center = np.asarray(spec['premise']['center'], dtype=self.dtype)  # (6, n_mfs)
+        self.sigma = np.asarray(spec['premise']['sigma'], dtype=self.dtype)
+        self.rule_index = np.asarray(spec['rules']['index'], dtype=np.int64)  # (R, 6)
+        n_rules, n_inputs = self.rule_index.shape
+        n_classes = len(self.classes)
+
+        consequents = np.asarray(spec['consequents'], dtype=self.dtype)
+        if consequents.shape != (n_rules, n_classes, n_inputs + 1):
+            raise ValueError(f"Bentuk consequents {consequents.shape} tidak sesuai "
+                             f"(rule, kelas, bias + {n_inputs} bobot) = {(n_rules, n_classes, n_inputs + 1)}")
+        if firmware_layout:
+            # ANFIS::beginFromFile: cons[c][r] = consequents[c][r] untuk r < n_classes, sisanya nol
+            firmware = np.zeros((n_classes, n_rules, n_inputs + 1), dtype=self.dtype)
+            firmware[:, :n_classes] = consequents[:n_classes]
+            consequents = firmware.transpose(1, 0, 2)
+        self.consequents = consequents  # (R, C, 1 + n_inputs)
+
+        # Firing strength = exp(sum_i log mu[i, rule_index[r, i]]) = exp(log_mu (N, 6*n_mfs) @ S)
+        n_mfs = self.center.shape[1]
+        self.selection = np.zeros((n_inputs * n_mfs, n_rules), dtype=self.dtype)
+        self.selection[np.arange(n_inputs) * n_mfs + self.rule_index, np.arange(n_rules)[:, None]] = 1
+        # Consequent: sum_r wn[r] * (b[r, c] + x . W[r, c]) = ((wn ⊗ [1, x]) (N, R*7)) @ P (R*7, C)
+        self.consequent_matrix = np.ascontiguousarray(
+            consequents.transpose(0, 2, 1).reshape(n_rules * (n_inputs + 1), n_classes))
+
+    @classmethod
+    def from_json(cls, path=MODEL_PATH, **kwargs):
+        with open(path) as f:
+            return cls(json.load(f), **kwargs)
+
+    @property
+    def n_rules(self):
+        return len(self.rule_index)
+
+    def normalize(self, x_raw):
+        return (np.asarray(x_raw, dtype=self.dtype) - self.mean) / self.scale
+
+    def membership(self, x):
+        """Derajat keanggotaan Gaussian (N, 6, n_mfs) untuk input ternormalisasi."""
+        z = (x[:, :, None] - self.center) / self.sigma
+        return np.exp(-0.5 * z * z)
+
+    def firing_strengths(self, x):
+        """Firing strength rule (N, R) untuk input ternormalisasi (product t-norm)."""
+        z = (x[:, :, None] - self.center) / self.sigma
+        log_mu = (-0.5 * z * z).reshape(len(x), -1)
+        return np.exp(log_mu @ self.selection)
+
+    def predict_scores(self, x_raw, softmax=True):
+        x = self.normalize(x_raw)
+        w = self.firing_strengths(x)
+        w_sum = w.sum(axis=1, keepdims=True)
+        valid = w_sum > W_SUM_EPS
+        w_norm = np.divide(w, w_sum, out=np.zeros_like(w), where=valid)
+
+        n = len(x)
+        x_aug = np.empty((n, x.shape[1] + 1), dtype=self.dtype)
+        x_aug[:, 0] = 1
+        x_aug[:, 1:] = x
+        scores = (w_norm[:, :, None] * x_aug[:, None, :]).reshape(n, -1) @ self.consequent_matrix
+        if softmax:
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            exp_sum = scores.sum(axis=1, keepdims=True)
+            np.divide(scores, exp_sum, out=scores, where=exp_sum > W_SUM_EPS)
+        return scores
+
+    def predict(self, x_raw, softmax=True):
+        scores = self.predict_scores(x_raw, softmax)
+        return scores.argmax(axis=1), scores
+
+
+def predict_firmware_sample(model, x_raw, do_softmax=True):
+    """
+    Port langsung ANFIS::predict (satu sampel, loop per rule/kelas, float32). Dipakai sebagai
+    referensi untuk mengecek hasil predict_scores dan sebagai baseline benchmark.
+    Return (indeks kelas, skor list).
+    """
+    f32 = np.float32
+    x = [(f32(x_raw[i]) - model.mean[i]) / model.scale[i] for i in range(len(model.mean))]
+    w = []
+    w_sum = f32(0)
+    for r in range(model.n_rules):
+        wr = f32(1)
+        for i, mf in enumerate(model.rule_index[r]):
+            z = (x[i] - model.center[i, mf]) / model.sigma[i, mf]
+            wr *= np.exp(f32(-0.5) * z * z)
+        w.append(wr)
+        w_sum += wr
+
+    scores = []
+    for c in range(len(model.classes)):
+        numerator = f32(0)
+        for r in range(model.n_rules):
+            if w_sum > W_SUM_EPS:
+                lin = model.consequents[r, c]
+                consequent = lin[0]
+                for i in range(len(x)):
+                    consequent += lin[i + 1] * x[i]
+                numerator += w[r] * consequent
+        scores.append(numerator / w_sum if w_sum > W_SUM_EPS else f32(0))
+
+    if do_softmax:
+        max_score = max(scores)
+        scores = [np.exp(s - max_score) for s in scores]
+        exp_sum = sum(scores, f32(0))
+        if exp_sum > W_SUM_EPS:
+            scores = [s / exp_sum for s in scores]
+    return int(np.argmax(scores)), scores
+
+
+# --- Streaming input (generator (offset, array float (n, 6))) ---
+
+def iter_npy_chunks(path, chunk_rows=CHUNK_ROWS):
+    frames = np.load(path, mmap_mode='r')
+    if frames.ndim != 2:
+        raise ValueError(f"{path}: array harus berbentuk (N, fitur), didapat {frames.shape}")
+    for start in range(0, len(frames), chunk_rows):
+        yield start, np.asarray(frames[start:start + chunk_rows])
+
+def iter_csv_chunks(path, features, chunk_rows=CHUNK_ROWS):
+    """
+    Baca CSV per potongan. Jika baris pertama berisi nama fitur (ccx, tcx, ...), kolom dipilih
+    berdasarkan nama (kolom lain seperti timestamp diabaikan); jika tidak ada header, dipakai
+    len(features) kolom pertama.
+    """
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        first = next(reader, None)
+        if first is None:
+            return
+        header = [name.strip() for name in first]
+        if set(features) <= set(header):
+            columns = [header.index(name) for name in features]
+        else:
+            try:
+                [float(v) for v in first[:len(features)]]
+            except ValueError:
+                raise ValueError(f"{path}: header CSV harus memuat kolom {features}, didapat {header}") from None
+            columns = list(range(len(features)))
+            reader = itertools.chain([first], reader)
+        offset = 0
+        while True:
+            rows = list(itertools.islice(reader, chunk_rows))
+            if not rows:
+                return
+            chunk = np.array([[row[c] for c in columns] for row in rows], dtype=np.float64)
+            yield offset, chunk
+            offset += len(rows)
+
+def iter_feature_chunks(path, features, chunk_rows=CHUNK_ROWS):
+    """Pilih sumber input berdasarkan ekstensi (.npy atau .csv)."""
+    if path.endswith('.npy'):
+        return iter_npy_chunks(path, chunk_rows)
+    if path.endswith('.csv'):
+        return iter_csv_chunks(path, features, chunk_rows)
+    raise ValueError(f"Input tidak didukung: {path} (gunakan .csv atau .npy)")
+
+
+def score_file(input_path, output_path, model=None, chunk_rows=CHUNK_ROWS, softmax=True):
+    """Skor semua frame di `input_path` dan tulis CSV (id, label, skor per kelas) per potongan."""
+    model = model or AnfisModel.from_json()
+    n_total = 0
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'label', *model.classes])
+        for offset, chunk in iter_feature_chunks(input_path, model.features, chunk_rows):
+            predicted, scores = model.predict(chunk, softmax)
+            labels = [model.classes[i] for i in predicted.tolist()]
+            writer.writerows(zip(range(offset, offset + len(chunk)), labels, *scores.T.tolist()))
+            n_total += len(chunk)
+    print(f"✅ {n_total} frame diskor, hasil ditulis ke '{output_path}'")
+    return n_total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scoring batch model ANFIS (anfis_export.json) untuk log sensor")
+    parser.add_argument('input', help="file .csv (header ccx..scx) atau .npy (N, 6) berisi fitur mentah")
+    parser.add_argument('--output', default='anfis_scores.csv')
+    parser.add_argument('--model', default=MODEL_PATH, help="file JSON export ANFIS")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--raw-scores', action='store_true', help="skor TSK tanpa softmax")
+    parser.add_argument('--firmware-layout', action='store_true',
+                        help="baca consequents seperti loader firmware ESP32 saat ini (lihat catatan di atas)")
+    args = parser.parse_args()
+    anfis = AnfisModel.from_json(args.model, firmware_layout=args.firmware_layout)
+    score_file(args.input, args.output, anfis, args.chunk_rows, softmax=not args.raw_scores)
@@ -0,0 +1,144 @@
+# augment.py
+#
+# Augmentasi data per batch, langsung pada tensor (N, C, H, W) di CPU maupun GPU, sebagai
+# pengganti transform PIL per gambar. Setiap gambar mendapat parameter acak sendiri, tetapi semua
+# operasi dijalankan sekali untuk seluruh batch:
+#   - affine (rotasi, translasi, skala) + flip: satu affine_grid + grid_sample
+#   - intensity jitter (brightness/contrast), cutout, mixup: operasi broadcasting
+# Parameter acak diambil dari np.random.Generator (seed) di host lalu dikirim ke device dalam satu
+# copy kecil, sehingga hasilnya reproducible dan sama di CPU maupun GPU.
+#
+# Penggunaan di training loop (lihat train.py):
+#   augment = BatchAugment(seed=0)
+#   images, targets = augment(images, labels)   # hanya untuk batch training
+#   augment.eval()                               # nonaktif: images/labels dikembalikan apa adanya
+
+import math
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# Default: augmentasi ringan yang aman untuk rontgen dada
+ROTATION = 10.0  # derajat, rotasi acak di [-ROTATION, ROTATION]
+TRANSLATE = 0.05  # fraksi lebar/tinggi gambar
+SCALE = (0.95, 1.05)
+HFLIP = 0.0  # Probabilitas flip horizontal (0: jantung selalu di kiri gambar)
+VFLIP = 0.0
+BRIGHTNESS = 0.1  # Offset acak di [-b, b], dalam satuan piksel setelah normalisasi
+CONTRAST = 0.1  # Faktor acak di [1 - c, 1 + c] terhadap rata-rata tiap gambar
+CUTOUT = 0.0  # Probabilitas satu kotak cutout per gambar
+CUTOUT_SIZE = 8  # Sisi kotak cutout (piksel)
+MIXUP_ALPHA = 0.0  # 0 = tanpa mixup; lambda ~ Beta(alpha, alpha) per gambar
+
+
+class BatchAugment:
+    """
+    Augmentasi batch dengan parameter acak per gambar. Memanggil objek ini dengan (images, labels)
+    mengembalikan (images, targets). `targets` sama dengan labels (float) kecuali mixup aktif,
+    yang menghasilkan label lunak; hitung akurasi tetap dengan `labels` asli.
+    - train()/eval(): aktif/nonaktifkan (mode eval mengembalikan input apa adanya).
+    - state_dict()/load_state_dict(): state RNG, untuk checkpoint/resume.
+    """
+    def __init__(self, rotation=ROTATION, translate=TRANSLATE, scale=SCALE, hflip=HFLIP, vflip=VFLIP,
+                 brightness=BRIGHTNESS, contrast=CONTRAST, cutout=CUTOUT, cutout_size=CUTOUT_SIZE,
+                 mixup_alpha=MIXUP_ALPHA, seed=None):
+        self.rotation = rotation
+        self.translate = translate
+        self.scale = scale
+        self.hflip = hflip
+        self.vflip = vflip
+        self.brightness = brightness
+        self.contrast = contrast
+        self.cutout = cutout
+        self.cutout_size = cutout_size
+        self.mixup_alpha = mixup_alpha
+        self.rng = np.random.default_rng(seed)
+        self.training = True
+
+    def train(self, mode=True):
+        self.training = mode
+        return self
+
+    def eval(self):
+        return self.train(False)
+
+    def state_dict(self):
+        return {'rng': self.rng.bit_generator.state}
+
+    def load_state_dict(self, state):
+        self.rng.bit_generator.state = state['rng']
+
+    def __call__(self, images, labels):
+        labels = labels.float()
+        if not self.training:
+            return images, labels
+        n = images.size(0)
+        params = self._sample_params(n)
+        # Parameter acak hanya beberapa vektor berukuran N: murah dipindah ke device tiap batch
+        params = {k: v.to(images.device, non_blocking=True) for k, v in params.items()}
+
+        images = self._geometric(images, params)
+        if self.brightness or self.contrast:
+            mean = images.mean(dim=(1, 2, 3), keepdim=True)
+            contrast = params['contrast'].view(n, 1, 1, 1).to(images.dtype)
+            brightness = params['brightness'].view(n, 1, 1, 1).to(images.dtype)
+            images = (images - mean) * contrast + mean + brightness
+        if self.cutout:
+            images = self._cutout(images, params)
+        if self.mixup_alpha:
+            lam = params['lam'].to(images.dtype)
+            perm = params['perm']
+            images = torch.lerp(images[perm], images, lam.view(n, 1, 1, 1))
+            labels = torch.lerp(labels[perm], labels, lam.view(n, *[1] * (labels.dim() - 1)))
+        return images, labels
+
+    def _sample_params(self, n):
+        rng = self.rng
+        params = {
+            'angle': rng.uniform(-self.rotation, self.rotation, n) * math.pi / 180,
+            'scale': rng.uniform(self.scale[0], self.scale[1], n),
+            'shift': rng.uniform(-self.translate, self.translate, (n, 2)) * 2,  # koordinat [-1, 1]
+            'hflip': rng.random(n) < self.hflip,
+            'vflip': rng.random(n) < self.vflip,
+            'brightness': rng.uniform(-self.brightness, self.brightness, n),
+            'contrast': rng.uniform(1 - self.contrast, 1 + self.contrast, n),
+            'cutout': rng.random(n) < self.cutout,
+            'center': rng.random((n, 2)),
+        }
+        if self.mixup_alpha:
+            params['lam'] = rng.beta(self.mixup_alpha, self.mixup_alpha, n)
+            params['perm'] = rng.permutation(n)
+        return {k: torch.from_numpy(v.astype(np.float32) if v.dtype == np.float64 else v)
+                for k, v in params.items()}
+
+    def _geometric(self, images, params):
+        n = images.size(0)
+        if self.rotation or self.translate or tuple(self.scale) != (1, 1):
+            # Matriks affine per gambar (koordinat output → input) untuk affine_grid
+            cos, sin = params['angle'].cos(), params['angle'].sin()
+            inv_scale = 1 / params['scale']
+            flip_x = 1 - 2 * params['hflip'].to(cos.dtype)
+            flip_y = 1 - 2 * params['vflip'].to(cos.dtype)
+            theta = torch.stack([
+                torch.stack([cos * inv_scale * flip_x, -sin * inv_scale * flip_y, params['shift'][:, 0]], dim=1),
+                torch.stack([sin * inv_scale * flip_x, cos * inv_scale * flip_y, params['shift'][:, 1]], dim=1),
+            ], dim=1).to(images.dtype)
+            grid = F.affine_grid(theta, images.shape, align_corners=False)
+            return F.grid_sample(images, grid, mode='bilinear', padding_mode='border', align_corners=False)
+        # Tanpa affine: flip cukup dengan indexing (tanpa interpolasi)
+        if self.hflip:
+            images = torch.where(params['hflip'].view(n, 1, 1, 1), images.flip(-1), images)
+        if self.vflip:
+            images = torch.where(params['vflip'].view(n, 1, 1, 1), images.flip(-2), images)
+        return images
+
+    def _cutout(self, images, params):
+        n, _, h, w = images.shape
+        half = self.cutout_size / 2
+        center_y = params['center'][:, 0].view(n, 1, 1) * h
+        center_x = params['center'][:, 1].view(n, 1, 1) * w
+        ys = torch.arange(h, device=images.device).view(1, h, 1) + 0.5
+        xs = torch.arange(w, device=images.device).view(1, 1, w) + 0.5
+        mask = ((ys - center_y).abs() < half) & ((xs - center_x).abs() < half) & params['cutout'].view(n, 1, 1)
+        # Isi 0 = intensitas rata-rata setelah normalisasi (mean .5, std .5)
+        return images.masked_fill(mask.unsqueeze(1), 0.0)
@@ -0,0 +1,473 @@
+# benchmark.py
+#
+# Benchmark suite yang bisa direproduksi untuk pipeline ChestMNIST, memakai data sintetis
+# berbentuk ChestMNIST (tanpa download):
+#   - dataset.*    : waktu konstruksi FilteredBinaryDataset (per-sampel PIL, preload cold/warm cache)
+#   - loader.*     : batch/detik get_data_loaders vs get_fast_data_loaders
+#   - train_step.* : waktu forward+backward+optimizer.step SimpleCNN untuk beberapa batch size
+#   - inference.*  : latency inferensi satu gambar vs batch
+#   - ensemble.*   : training step N anggota: satu pass vmap (ensemble.py) vs N model berurutan
+#   - augment.*    : augmentasi satu batch: BatchAugment (augment.py) vs transform PIL per gambar
+#   - cache.*      : inferensi batch lewat cache prediksi (cache.py): semua miss vs semua hit (memori/SQLite)
+#   - startup.*    : cold start proses baru: import inference.py vs train.py, waktu ke prediksi pertama
+#   - anfis.*      : frame/detik model ANFIS (anfis.py): port per sampel firmware vs evaluasi batch NumPy
+#
+# Penggunaan:
+#   python benchmark.py run --output bench.json
+#   python benchmark.py compare base.json bench.json --threshold 0.10   # exit code 1 jika ada regresi
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.optim as optim
+
+import datareader
+from augment import BatchAugment
+from cache import PredictionCache, cached_forward, model_fingerprint
+from ensemble import StackedAdam, StackedSimpleCNN
+from model import SimpleCNN
+
+# Ukuran split ChestMNIST asli (28x28)
+N_TRAIN = 78468
+N_TEST = 22433
+N_LABELS = 14
+TRAIN_BATCH_SIZES = (32, 64, 128, 256)
+INFERENCE_BATCH_SIZE = 256
+ENSEMBLE_SIZE = 8
+LOADER_BATCH_SIZE = 32
+ANFIS_FRAMES = 65536
+ANFIS_SCALAR_FRAMES = 200  # Port per sampel jauh lebih lambat; cukup sampel kecil untuk laju
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REGRESSION_THRESHOLD = 0.10  # Perubahan relatif > 10% ke arah buruk dianggap regresi
+
+
+def make_synthetic_chestmnist(root, n_train=N_TRAIN, n_test=N_TEST, size=28, seed=0):
+    """Tulis chestmnist.npz sintetis (gambar uint8 acak, label multi-hot 14 kelas) ke `root`."""
+    rng = np.random.default_rng(seed)
+    arrays = {}
+    for split, n in (('train', n_train), ('val', max(n_test // 2, 1)), ('test', n_test)):
+        # ~10% hanya Cardiomegaly, ~10% hanya Pneumothorax, sisanya campuran/tanpa label
+        labels = (rng.random((n, N_LABELS)) < 0.05).astype(np.uint8)
+        group = rng.random(n)
+        labels[group < 0.2] = 0
+        labels[group < 0.1, datareader.CLASS_A_IDX] = 1
+        labels[(group >= 0.1) & (group < 0.2), datareader.CLASS_B_IDX] = 1
+        arrays[f'{split}_images'] = rng.integers(0, 256, (n, size, size), dtype=np.uint8)
+        arrays[f'{split}_labels'] = labels
+    suffix = '' if size == 28 else f'_{size}'
+    np.savez(os.path.join(root, f'chestmnist{suffix}.npz'), **arrays)
+
+
+def _timeit(fn, repeat, warmup=1):
+    """Median waktu (detik) dari `repeat` kali pemanggilan `fn`."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def _result(value, unit, higher_is_better):
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+@contextlib.contextmanager
+def _quiet():
+    # Sembunyikan print dari datareader agar output benchmark tetap rapi
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_dataset(repeat):
+    results = {}
+    with _quiet():
+        results['dataset.construct.per_sample_pil'] = _result(
+            _timeit(lambda: datareader.FilteredBinaryDataset('train'), max(1, repeat // 2), warmup=0) * 1000,
+            'ms', False)
+
+        def cold():
+            with tempfile.TemporaryDirectory() as cache_dir:
+                datareader.FilteredBinaryDataset('train', preload=True, cache_dir=cache_dir)
+        results['dataset.construct.preload_cold_cache'] = _result(_timeit(cold, repeat) * 1000, 'ms', False)
+
+        warm = lambda: datareader.FilteredBinaryDataset('train', preload=True)
+        results['dataset.construct.preload_warm_cache'] = _result(_timeit(warm, repeat) * 1000, 'ms', False)
+    return results
+
+
+def bench_loaders(repeat):
+    results = {}
+    for name, factory in (('dataloader', datareader.get_data_loaders),
+                          ('fast', datareader.get_fast_data_loaders)):
+        with _quiet():
+            train_loader, _, _, _ = factory(LOADER_BATCH_SIZE)
+
+        def epoch():
+            for _ in train_loader:
+                pass
+        seconds = _timeit(epoch, repeat)
+        results[f'loader.{name}.batches_per_s'] = _result(len(train_loader) / seconds, 'batch/s', True)
+    return results
+
+
+def bench_train_step(repeat, device, steps=20):
+    results = {}
+    criterion = nn.BCEWithLogitsLoss()
+    for batch_size in TRAIN_BATCH_SIZES:
+        torch.manual_seed(0)
+        model = SimpleCNN(in_channels=1, num_classes=2).to(device).train()
+        optimizer = optim.Adam(model.parameters(), lr=1e-3, weight_decay=1e-4)
+        images = torch.randn(batch_size, 1, 28, 28, device=device)
+        labels = torch.randint(0, 2, (batch_size, 1), device=device).float()
+
+        def run_steps():
+            for _ in range(steps):
+                loss = criterion(model(images), labels)
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+            if device.type == 'cuda':
+                torch.cuda.synchronize()
+        results[f'train_step.bs{batch_size}'] = _result(_timeit(run_steps, repeat) / steps * 1000, 'ms', False)
+    return results
+
+
+def bench_inference(repeat, device, iters=100):
+    torch.manual_seed(0)
+    model = SimpleCNN(in_channels=1, num_classes=2).to(device).eval()
+    single = torch.randn(1, 1, 28, 28, device=device)
+    batched = torch.randn(INFERENCE_BATCH_SIZE, 1, 28, 28, device=device)
+
+    def run(x):
+        def fn():
+            with torch.inference_mode():
+                for _ in range(iters):
+                    model(x)
+            if device.type == 'cuda':
+                torch.cuda.synchronize()
+        return _timeit(fn, repeat) / iters
+
+    single_s = run(single)
+    batched_s = run(batched)
+    return {
+        'inference.single.latency': _result(single_s * 1000, 'ms', False),
+        f'inference.bs{INFERENCE_BATCH_SIZE}.latency': _result(batched_s * 1000, 'ms', False),
+        f'inference.bs{INFERENCE_BATCH_SIZE}.per_image': _result(batched_s / INFERENCE_BATCH_SIZE * 1000, 'ms', False),
+        'inference.single.images_per_s': _result(1 / single_s, 'img/s', True),
+        f'inference.bs{INFERENCE_BATCH_SIZE}.images_per_s': _result(INFERENCE_BATCH_SIZE / batched_s, 'img/s', True),
+    }
+
+
+def bench_ensemble(repeat, device, steps=10, batch_size=32):
+    torch.manual_seed(0)
+    criterion = nn.BCEWithLogitsLoss()
+    images = torch.randn(batch_size, 1, 28, 28, device=device)
+    labels = torch.randint(0, 2, (batch_size, 1), device=device).float()
+    models = [SimpleCNN(in_channels=1, num_classes=2).to(device).train() for _ in range(ENSEMBLE_SIZE)]
+    optimizers = [optim.Adam(m.parameters(), lr=1e-3, weight_decay=1e-4) for m in models]
+    stacked = StackedSimpleCNN([SimpleCNN(in_channels=1, num_classes=2).to(device)
+                                for _ in range(ENSEMBLE_SIZE)]).train()
+    stacked_optimizer = StackedAdam(stacked.params, torch.full((ENSEMBLE_SIZE,), 1e-3, device=device))
+
+    def sequential():
+        for _ in range(steps):
+            for model, optimizer in zip(models, optimizers):
+                loss = criterion(model(images), labels)
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+
+    def vectorized():
+        for _ in range(steps):
+            outputs = stacked(images)
+            losses = F.binary_cross_entropy_with_logits(
+                outputs, labels.expand_as(outputs), reduction='none').mean(dim=(1, 2))
+            stacked_optimizer.zero_grad()
+            losses.sum().backward()
+            stacked_optimizer.step()
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+
+    sequential_s = _timeit(sequential, repeat) / steps
+    vectorized_s = _timeit(vectorized, repeat) / steps
+    return {
+        f'ensemble.n{ENSEMBLE_SIZE}.sequential.step': _result(sequential_s * 1000, 'ms', False),
+        f'ensemble.n{ENSEMBLE_SIZE}.vmap.step': _result(vectorized_s * 1000, 'ms', False),
+        f'ensemble.n{ENSEMBLE_SIZE}.vmap.speedup': _result(sequential_s / vectorized_s, 'x', True),
+    }
+
+
+def bench_augment(repeat, device, batch_size=LOADER_BATCH_SIZE):
+    from PIL import Image
+    from torchvision import transforms
+
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (batch_size, 28, 28), dtype=np.uint8)
+    pil_images = [Image.fromarray(p) for p in pixels]
+    pil_transform = transforms.Compose([
+        transforms.RandomAffine(10, translate=(0.05, 0.05), scale=(0.95, 1.05)),
+        transforms.ColorJitter(brightness=0.1, contrast=0.1),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[.5], std=[.5]),
+    ])
+    images = torch.from_numpy(pixels).float().div_(255).sub_(.5).div_(.5).unsqueeze(1).to(device)
+    labels = torch.zeros(batch_size, 1, dtype=torch.long, device=device)
+    augment = BatchAugment(seed=0)
+
+    def per_sample():
+        torch.stack([pil_transform(image) for image in pil_images])
+
+    def batched():
+        augment(images, labels)
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+
+    return {
+        f'augment.bs{batch_size}.pil_per_sample': _result(_timeit(per_sample, repeat) * 1000, 'ms', False),
+        f'augment.bs{batch_size}.batched': _result(_timeit(batched, repeat) * 1000, 'ms', False),
+    }
+
+
+def bench_cache(repeat, device):
+    torch.manual_seed(0)
+    model = SimpleCNN(in_channels=1, num_classes=2).to(device).eval()
+    images = torch.randn(INFERENCE_BATCH_SIZE, 1, 28, 28)
+    fingerprint = model_fingerprint(model)
+
+    def uncached():
+        with torch.inference_mode():
+            model(images.to(device)).float().cpu()
+
+    def cold():
+        cached_forward(model, images, PredictionCache(fingerprint), device)
+
+    warm_cache = PredictionCache(fingerprint)
+    cached_forward(model, images, warm_cache, device)
+    warm = lambda: cached_forward(model, images, warm_cache, device)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        disk_cache = PredictionCache(fingerprint, path=os.path.join(workdir, 'cache.sqlite'))
+        cached_forward(model, images, disk_cache, device)
+
+        def disk():
+            disk_cache.entries.clear()  # Paksa semua lookup ke SQLite
+            cached_forward(model, images, disk_cache, device)
+        disk_s = _timeit(disk, repeat)
+        disk_cache.close()
+
+    uncached_s = _timeit(uncached, repeat)
+    warm_s = _timeit(warm, repeat)
+    bs = INFERENCE_BATCH_SIZE
+    return {
+        f'cache.bs{bs}.no_cache': _result(uncached_s * 1000, 'ms', False),
+        f'cache.bs{bs}.all_miss': _result(_timeit(cold, repeat) * 1000, 'ms', False),
+        f'cache.bs{bs}.all_hit_memory': _result(warm_s * 1000, 'ms', False),
+        f'cache.bs{bs}.all_hit_sqlite': _result(disk_s * 1000, 'ms', False),
+        f'cache.bs{bs}.hit_speedup': _result(uncached_s / warm_s, 'x', True),
+    }
+
+
+def _run_python(*args):
+    """Jalankan interpreter baru di folder script ini. Return (detik wall clock, stdout)."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, *args], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, proc.stdout
+
+
+def bench_startup(repeat):
+    results = {}
+    # Wall clock termasuk start interpreter, seperti yang dialami worker saat cold start
+    for module in ('inference', 'train'):
+        seconds = statistics.median(_run_python('-c', f'import {module}')[0] for _ in range(repeat))
+        results[f'startup.import.{module}'] = _result(seconds * 1000, 'ms', False)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        checkpoint = os.path.join(workdir, 'best_model.pth')
+        torch.save({'model_state_dict': SimpleCNN(in_channels=1, num_classes=2).state_dict()}, checkpoint)
+        runs = []
+        for _ in range(repeat):
+            seconds, stdout = _run_python('inference.py', '--checkpoint', checkpoint, '--json')
+            runs.append((seconds, json.loads(stdout)))
+    heavy = sorted({name for _, timing in runs for name in timing['heavy_modules']})
+    if heavy:
+        print(f"⚠️  inference.py ikut mengimpor modul berat: {', '.join(heavy)}")
+    results['startup.time_to_first_prediction'] = _result(
+        statistics.median(seconds for seconds, _ in runs) * 1000, 'ms', False)
+    for key, name in (('load_s', 'load_model'), ('first_prediction_s', 'first_prediction')):
+        results[f'startup.{name}'] = _result(statistics.median(t[key] for _, t in runs) * 1000, 'ms', False)
+    return results
+
+
+def bench_anfis(repeat, n_frames=ANFIS_FRAMES, n_scalar=ANFIS_SCALAR_FRAMES):
+    from anfis import AnfisModel, predict_firmware_sample
+
+    model = AnfisModel.from_json()
+    rng = np.random.default_rng(0)
+    frames = (model.mean + rng.standard_normal((n_frames, len(model.features))) * model.scale).astype(np.float32)
+    scalar_frames = frames[:n_scalar]
+
+    def scalar():
+        for x in scalar_frames:
+            predict_firmware_sample(model, x)
+
+    scalar_s = _timeit(scalar, max(1, repeat // 2), warmup=0) / n_scalar
+    vectorized_s = _timeit(lambda: model.predict(frames), repeat) / n_frames
+    # Selisih skor maksimum terhadap port firmware (bukan waktu; dicatat untuk memantau kecocokan)
+    reference = np.array([predict_firmware_sample(model, x)[1] for x in scalar_frames], dtype=np.float32)
+    max_diff = float(np.abs(model.predict_scores(scalar_frames) - reference).max())
+    return {
+        'anfis.scalar.frames_per_s': _result(1 / scalar_s, 'frame/s', True),
+        'anfis.vectorized.frames_per_s': _result(1 / vectorized_s, 'frame/s', True),
+        'anfis.vectorized.speedup': _result(scalar_s / vectorized_s, 'x', True),
+        'anfis.parity.max_abs_diff': _result(max_diff, 'prob', False),
+    }
+
+
+BENCHMARKS = {
+    'dataset': lambda args, device: bench_dataset(args.repeat),
+    'loader': lambda args, device: bench_loaders(args.repeat),
+    'train_step': lambda args, device: bench_train_step(args.repeat, device),
+    'inference': lambda args, device: bench_inference(args.repeat, device),
+    'ensemble': lambda args, device: bench_ensemble(args.repeat, device),
+    'augment': lambda args, device: bench_augment(args.repeat, device),
+    'cache': lambda args, device: bench_cache(args.repeat, device),
+    'startup': lambda args, device: bench_startup(args.repeat),
+    'anfis': lambda args, device: bench_anfis(args.repeat),
+}
+
+
+def run(args):
+    torch.manual_seed(0)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    device = torch.device(args.device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        # Arahkan datareader ke data sintetis dan cache sementara (cache asli tidak tersentuh)
+        datareader.DATA_ROOT = workdir
+        datareader.CACHE_DIR = os.path.join(workdir, '.cache')
+        make_synthetic_chestmnist(workdir, args.n_train, args.n_test)
+        for name in args.only or list(BENCHMARKS):
+            print(f"Menjalankan benchmark '{name}' ...", flush=True)
+            results.update(BENCHMARKS[name](args, device))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'platform': platform.platform(),
+            'device': str(device),
+            'threads': torch.get_num_threads(),
+            'n_train': args.n_train,
+            'n_test': args.n_test,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Hasil benchmark disimpan ke '{args.output}'")
+    return report
+
+
+def print_results(results):
+    print(f"\n{'Benchmark':<40} {'Nilai':>12} {'Unit':>8}")
+    print('-' * 62)
+    for name, r in results.items():
+        print(f"{name:<40} {r['value']:>12.3f} {r['unit']:>8}")
+
+
+def compare(base, new, threshold=REGRESSION_THRESHOLD):
+    """
+    Bandingkan dua laporan benchmark. Return list (nama, nilai lama, nilai baru, perubahan relatif,
+    status) dengan status 'REGRESI' jika perubahan ke arah buruk melebihi `threshold`.
+    """
+    rows = []
+    for name, new_result in new['results'].items():
+        old_result = base['results'].get(name)
+        if old_result is None:
+            rows.append((name, None, new_result['value'], None, 'baru'))
+            continue
+        old, value = old_result['value'], new_result['value']
+        change = (value - old) / old if old else 0.0
+        worse = -change if new_result['higher_is_better'] else change
+        if worse > threshold:
+            status = 'REGRESI'
+        elif worse < -threshold:
+            status = 'lebih baik'
+        else:
+            status = 'ok'
+        rows.append((name, old, value, change, status))
+    return rows
+
+
+def run_compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows = compare(base, new, args.threshold)
+
+    print(f"{'Benchmark':<40} {'Lama':>12} {'Baru':>12} {'Perubahan':>10}  Status")
+    print('-' * 88)
+    for name, old, value, change, status in rows:
+        old_text = f"{old:12.3f}" if old is not None else f"{'-':>12}"
+        change_text = f"{change:+10.1%}" if change is not None else f"{'-':>10}"
+        print(f"{name:<40} {old_text} {value:12.3f} {change_text}  {status}")
+
+    regressions = [row for row in rows if row[4] == 'REGRESI']
+    if regressions:
+        print(f"\n❌ {len(regressions)} regresi melebihi {args.threshold:.0%}")
+        return 1
+    print(f"\n✅ Tidak ada regresi melebihi {args.threshold:.0%}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite ChestMNIST (data sintetis)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help="jalankan benchmark dan simpan hasil sebagai JSON")
+    run_parser.add_argument('--output', default='benchmark.json')
+    run_parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="jalankan sebagian saja")
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--n-train', type=int, default=N_TRAIN)
+    run_parser.add_argument('--n-test', type=int, default=N_TEST)
+    run_parser.add_argument('--threads', type=int, default=None)
+    run_parser.add_argument('--device', default=None)
+
+    compare_parser = sub.add_parser('compare', help="bandingkan dua hasil benchmark")
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(run_compare(args))
+
+
+if __name__ == '__main__':
+    main()
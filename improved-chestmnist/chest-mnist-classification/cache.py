@@ -0,0 +1,182 @@
+# cache.py
+#
+# Cache prediksi content-addressed di depan forward pass SimpleCNN. Gambar yang sama (re-submission,
+# batch rerun malam hari, dashboard) cukup dihitung sekali:
+#   - key: blake2b dari byte input yang sudah dinormalisasi (tensor float32 (C, H, W) hasil
+#     inference.to_model_input, bentuk ikut di-hash), jadi format sumber (png, npy, JSON) tidak berpengaruh
+#   - nilai: vektor logit lengkap (float32 BLOB; 1 logit untuk biner, satu per kelas untuk
+#     multi-kelas/multi-label), prob dan label diturunkan dari logit
+#   - LRU berukuran tetap di memori, plus store SQLite opsional di disk yang bertahan antar proses
+#   - semua entri terikat pada fingerprint bobot model (model_fingerprint): lookup hanya membaca entri
+#     model yang sama, sehingga cache otomatis tidak berlaku lagi saat best_model.pth berubah dan
+#     beberapa model bisa berbagi satu file SQLite. Entri model lain hanya dihapus dengan purge_stale=True.
+# Hanya butuh torch, NumPy dan standard library (aman untuk jalur inferensi ringan).
+#
+# Penggunaan:
+#   cache = PredictionCache(model_fingerprint(model), path='predictions.sqlite')
+#   logits = cached_forward(model, images, cache)   # hanya gambar yang belum ada di cache di-forward
+#   print(cache.stats())                            # hits/misses/hit_rate
+
+import collections
+import hashlib
+import sqlite3
+import threading
+import torch
+
+CACHE_CAPACITY = 100_000  # Entri LRU di memori (~150 byte per entri)
+DIGEST_SIZE = 16  # Byte digest blake2b (128 bit)
+SQLITE_BATCH = 500  # Key per query IN (...) (di bawah batas variabel SQLite)
+
+
+def model_fingerprint(model):
+    """Digest blake2b (hex) dari kelas model dan seluruh state_dict (nama, dtype, bentuk, byte)."""
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    h.update(type(model).__name__.encode())
+    for name, tensor in sorted(model.state_dict().items()):
+        tensor = tensor.detach().cpu().contiguous()
+        h.update(f"{name}:{tensor.dtype}:{tuple(tensor.shape)}".encode())
+        h.update(tensor.reshape(-1).view(torch.uint8).numpy())
+    return h.hexdigest()
+
+
+def input_keys(images):
+    """Key cache per gambar untuk batch tensor ternormalisasi (n, C, H, W)."""
+    rows = images.detach().cpu().float().contiguous().reshape(len(images), -1).numpy()
+    shape = str(tuple(images.shape[1:])).encode()
+    keys = []
+    for row in rows:
+        h = hashlib.blake2b(shape, digest_size=DIGEST_SIZE)
+        h.update(row)
+        keys.append(h.digest())
+    return keys
+
+
+class PredictionCache:
+    """
+    LRU logit di memori (capacity entri) dengan store SQLite opsional di `path`. Nilai per key
+    adalah byte float32 dari vektor logit. Aman dipakai dari banyak thread. Store hanya dibaca
+    untuk `fingerprint` ini; purge_stale=True menghapus entri fingerprint lain saat dibuka.
+    Counter: memory_hits, disk_hits, misses (lihat stats()).
+    """
+    def __init__(self, fingerprint, capacity=CACHE_CAPACITY, path=None, purge_stale=False):
+        self.fingerprint = fingerprint
+        self.capacity = capacity
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.memory_hits = self.disk_hits = self.misses = 0
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS logits "
+                            "(fingerprint TEXT, key BLOB, logits BLOB, PRIMARY KEY (fingerprint, key)) WITHOUT ROWID")
+            self.db.commit()
+            if purge_stale:
+                stale = self.db.execute("DELETE FROM logits WHERE fingerprint != ?", (fingerprint,)).rowcount
+                self.db.commit()
+                if stale:
+                    print(f"⚠️  {stale} prediksi model lain dihapus dari cache '{path}'")
+
+    def _remember(self, key, logit):
+        self.entries[key] = logit
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def get_many(self, keys):
+        """List byte logit float32 (atau None jika belum ada) untuk setiap key."""
+        with self.lock:
+            results = [None] * len(keys)
+            missing = []
+            for i, key in enumerate(keys):
+                logit = self.entries.get(key)
+                if logit is None:
+                    missing.append(i)
+                else:
+                    self.entries.move_to_end(key)
+                    results[i] = logit
+            self.memory_hits += len(keys) - len(missing)
+
+            if self.db is not None and missing:
+                found = {}
+                unique = list({keys[i] for i in missing})
+                for start in range(0, len(unique), SQLITE_BATCH):
+                    chunk = unique[start:start + SQLITE_BATCH]
+                    found.update(self.db.execute(
+                        f"SELECT key, logits FROM logits WHERE fingerprint = ? "
+                        f"AND key IN ({','.join('?' * len(chunk))})", (self.fingerprint, *chunk)))
+                still_missing = []
+                for i in missing:
+                    logit = found.get(keys[i])
+                    if logit is None:
+                        still_missing.append(i)
+                    else:
+                        results[i] = logit
+                        self._remember(keys[i], logit)
+                self.disk_hits += len(missing) - len(still_missing)
+                missing = still_missing
+            self.misses += len(missing)
+            return results
+
+    def put_many(self, keys, logits):
+        with self.lock:
+            for key, logit in zip(keys, logits):
+                self._remember(key, logit)
+            if self.db is not None:
+                self.db.executemany("INSERT OR REPLACE INTO logits VALUES (?, ?, ?)",
+                                    [(self.fingerprint, key, logit) for key, logit in zip(keys, logits)])
+                self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'lookups': lookups,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else None,
+                'entries': len(self.entries),
+                'capacity': self.capacity,
+                'fingerprint': self.fingerprint,
+            }
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+def cached_forward(model, images, cache, device=None):
+    """
+    Logit float CPU untuk batch ternormalisasi (n, C, H, W): (n,) untuk model dengan satu output
+    (biner), (n, k) untuk k output. Batch dipecah menjadi hit dan miss; hanya miss (unik) yang
+    di-forward lalu disimpan ke cache. Logit dari cache dikembalikan persis seperti saat pertama dihitung.
+    """
+    if len(images) == 0:
+        # Batch kosong tetap di-forward supaya bentuknya (0,) / (0, k) sama seperti batch biasa
+        device = device or next(model.parameters()).device
+        with torch.inference_mode():
+            logits = model(images.to(device)).float().cpu()
+        width = logits.shape[1] if logits.dim() > 1 else 1
+        return logits.reshape(0) if width == 1 else logits.reshape(0, width)
+    keys = input_keys(images)
+    logits = cache.get_many(keys)
+    # Gambar identik di dalam satu batch cukup di-forward sekali
+    first_index = {}
+    for i, logit in enumerate(logits):
+        if logit is None:
+            first_index.setdefault(keys[i], i)
+    if first_index:
+        device = device or next(model.parameters()).device
+        misses = list(first_index.values())
+        batch = images if len(misses) == len(images) else images[misses]
+        with torch.inference_mode():
+            computed = model(batch.to(device)).float().cpu().reshape(len(misses), -1)
+        computed = [row.numpy().tobytes() for row in computed]
+        cache.put_many(list(first_index), computed)
+        computed = dict(zip(first_index, computed))
+        logits = [computed[key] if logit is None else logit for key, logit in zip(keys, logits)]
+    logits = torch.frombuffer(bytearray(b''.join(logits)), dtype=torch.float32).reshape(len(keys), -1)
+    return logits.squeeze(1) if logits.shape[1] == 1 else logits
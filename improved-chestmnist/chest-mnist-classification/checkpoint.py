@@ -0,0 +1,128 @@
+# checkpoint.py
+#
+# Snapshot state training yang tidak ber-alias dengan parameter yang sedang dilatih, dan penulisan
+# checkpoint di thread latar belakang agar torch.save tidak menahan training loop.
+#   - snapshot(): salin semua tensor (nested dict/list) ke CPU. Di CUDA penyalinan memakai pinned
+#     memory + non_blocking, sehingga thread utama hanya meng-enqueue copy lalu lanjut training.
+#   - AsyncCheckpointer.save(): snapshot di thread utama, tunggu copy selesai + torch.save di thread
+#     latar belakang. File ditulis ke file sementara lalu di-rename (tidak pernah setengah jadi).
+#     Snapshot yang sudah ada boleh ikut di dalam state (dipakai bersama, tidak disalin ulang).
+
+import os
+import random
+import threading
+import numpy as np
+import torch
+
+
+def _copy_to_cpu(obj):
+    if isinstance(obj, torch.Tensor):
+        obj = obj.detach()
+        if obj.device.type == 'cpu':
+            return obj.clone()
+        out = torch.empty(obj.shape, dtype=obj.dtype, pin_memory=True)
+        return out.copy_(obj, non_blocking=True)
+    if isinstance(obj, dict):
+        return type(obj)((k, _copy_to_cpu(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_copy_to_cpu(v) for v in obj)
+    return obj
+
+
+class Snapshot:
+    """Hasil snapshot(): `state` siap dipakai setelah wait() (copy GPU → CPU selesai)."""
+    def __init__(self, state, event=None):
+        self.state = state
+        self._event = event
+
+    def wait(self):
+        if self._event is not None:
+            self._event.synchronize()
+            self._event = None
+        return self.state
+
+
+def snapshot(state):
+    """Salinan CPU dari `state` (state_dict/nested dict). Tidak pernah berbagi memori dengan tensor asli."""
+    copied = _copy_to_cpu(state)
+    event = None
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        event = torch.cuda.Event()
+        event.record()
+    return Snapshot(copied, event)
+
+
+def _resolve(obj):
+    # Ganti Snapshot yang ikut di dalam state dengan isinya (setelah copy-nya selesai)
+    if isinstance(obj, Snapshot):
+        return obj.wait()
+    if isinstance(obj, dict):
+        return type(obj)((k, _resolve(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_resolve(v) for v in obj)
+    return obj
+
+
+def _atomic_save(state, path):
+    tmp_path = f"{path}.tmp"
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class AsyncCheckpointer:
+    """
+    Menulis checkpoint di satu thread latar belakang. Paling banyak satu penulisan berjalan;
+    save() berikutnya menunggu penulisan sebelumnya selesai (backpressure, urutan terjaga).
+    Error dari thread penulis dilempar ulang pada save()/wait() berikutnya.
+    """
+    def __init__(self):
+        self._thread = None
+        self._error = None
+
+    def save(self, state, path):
+        """`state`: state (di-snapshot sekarang) atau Snapshot yang sudah dibuat."""
+        snap = state if isinstance(state, Snapshot) else snapshot(state)
+        self.wait()
+        self._thread = threading.Thread(target=self._write, args=(snap, path), daemon=True)
+        self._thread.start()
+
+    def _write(self, snap, path):
+        try:
+            _atomic_save(_resolve(snap.wait()), path)
+        except BaseException as exc:
+            self._error = exc
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    close = wait
+
+
+def rng_state():
+    """State semua RNG (python, numpy, torch CPU/CUDA) agar run yang di-resume identik."""
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def load_checkpoint(path, map_location='cpu'):
+    # weights_only=False: checkpoint berisi state RNG python/numpy (bukan hanya tensor)
+    return torch.load(path, map_location=map_location, weights_only=False)
@@ -1,9 +1,10 @@
+import os
+import zipfile
 import torch
 import numpy as np
-import matplotlib.pyplot as plt
-import torchvision.transforms as transforms
-from torch.utils.data import DataLoader, Dataset
-from medmnist import ChestMNIST
+from torch.utils.data import DataLoader, Dataset, DistributedSampler, Sampler
+# medmnist (beserta sklearn/pandas/scipy, ~2 detik) dan matplotlib diimpor di dalam fungsi yang
+# memakainya, sehingga `from datareader import NEW_CLASS_NAMES` (inference.py) tetap ringan.
 
 # --- Konfigurasi Kelas Biner ---
 CLASS_A_IDX = 1  # 'Cardiomegaly'
@@ -27,72 +28,632 @@ ALL_CLASS_NAMES = [
     'Hernia',             # 13
 ]
 
+def iter_npz_rows(path, key, chunk_rows):
+    """
+    Baca array `key` dari file .npz secara bertahap, `chunk_rows` baris per potongan,
+    tanpa memuat seluruh array ke memori (np.load pada .npz selalu membaca array utuh).
+    Menghasilkan (offset, chunk) dengan chunk berbentuk (n, *shape[1:]).
+    """
+    with zipfile.ZipFile(path) as archive, archive.open(f"{key}.npy") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if fortran_order:
+            raise ValueError(f"Array '{key}' di {path} berformat Fortran, tidak bisa dibaca per baris")
+        row_shape = shape[1:]
+        row_bytes = int(np.prod(row_shape, dtype=np.int64)) * dtype.itemsize
+        for offset in range(0, shape[0], chunk_rows):
+            n = min(chunk_rows, shape[0] - offset)
+            buffer = f.read(n * row_bytes)
+            yield offset, np.frombuffer(buffer, dtype=dtype).reshape((n,) + row_shape)
+
+
+# --- Cache hasil filter di disk ---
+# Naikkan CACHE_VERSION jika format/isi cache berubah agar cache lama tidak dipakai lagi.
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+# Folder file npz ChestMNIST. None = folder default medmnist (~/.medmnist) dengan download otomatis;
+# jika diisi, file dibaca dari folder tersebut tanpa download (misalnya data sintetis untuk benchmark).
+DATA_ROOT = None
+
+# Resolusi resmi MedMNIST+. Di atas 28 px, loader membaca split per potongan dari cache memmap
+# (lihat MemmapChunkLoader) alih-alih memegang seluruh split di memori.
+IMAGE_SIZES = (28, 64, 128, 224)
+STREAM_CHUNK_ROWS = 512  # Baris gambar per potongan saat membangun cache dan saat streaming
+STREAM_WINDOW_CHUNKS = 8  # Potongan yang diacak bersama (memori loader ~ window x chunk baris)
+
+
+def _load_chestmnist(split, size=28):
+    from medmnist import ChestMNIST
+
+    if DATA_ROOT is None:
+        return ChestMNIST(split=split, transform=None, download=True, size=size)
+    return ChestMNIST(split=split, transform=None, download=False, size=size, root=DATA_ROOT)
+
+
+def _npz_path(size=28):
+    """Path file npz ChestMNIST untuk resolusi ini (download dulu jika DATA_ROOT None dan belum ada)."""
+    from medmnist import ChestMNIST, INFO
+    from medmnist.info import DEFAULT_ROOT
+
+    root = DATA_ROOT or DEFAULT_ROOT
+    size_flag = '' if size == 28 else f'_{size}'
+    path = os.path.join(root, f"{ChestMNIST.flag}{size_flag}.npz")
+    if DATA_ROOT is None and not os.path.exists(path):
+        # Pakai routine download medmnist tanpa membuat ChestMNIST (yang langsung memuat seluruh split)
+        downloader = ChestMNIST.__new__(ChestMNIST)
+        downloader.info, downloader.root, downloader.size_flag = INFO[ChestMNIST.flag], root, size_flag
+        os.makedirs(root, exist_ok=True)
+        downloader.download()
+    return path
+
+
+def resolve_classes(classes=None, multilabel=False):
+    """
+    Normalisasi pilihan kelas → (tuple indeks ALL_CLASS_NAMES, task, class_names).
+    - classes: nama atau indeks kelas ChestMNIST. None = (CLASS_A_IDX, CLASS_B_IDX), atau
+      ke-14 kelas jika multilabel=True.
+    - task: 'binary' (2 kelas single-label, 1 logit), 'multiclass' (>2 kelas single-label, softmax)
+      atau 'multilabel' (sigmoid per kelas, semua sampel yang memiliki salah satu kelas).
+    - class_names: {indeks label baru: nama kelas}, format sama dengan NEW_CLASS_NAMES.
+    """
+    if classes is None:
+        classes = range(len(ALL_CLASS_NAMES)) if multilabel else (CLASS_A_IDX, CLASS_B_IDX)
+    resolved = []
+    for c in classes:
+        if isinstance(c, str) and not c.isdigit():
+            if c not in ALL_CLASS_NAMES:
+                raise ValueError(f"Kelas tidak dikenal: '{c}' (pilihan: {', '.join(ALL_CLASS_NAMES)})")
+            c = ALL_CLASS_NAMES.index(c)
+        c = int(c)
+        if not 0 <= c < len(ALL_CLASS_NAMES):
+            raise ValueError(f"Indeks kelas {c} di luar rentang 0-{len(ALL_CLASS_NAMES) - 1}")
+        resolved.append(c)
+    if len(set(resolved)) != len(resolved):
+        raise ValueError(f"Kelas duplikat: {resolved}")
+    if multilabel:
+        # SimpleCNN(num_classes=2) hanya punya 1 logit, jadi multi-label 2 kelas tidak bisa dibedakan
+        if len(resolved) == 2:
+            raise ValueError("Multi-label membutuhkan 1 atau minimal 3 kelas")
+        task = 'multilabel'
+    else:
+        if len(resolved) < 2:
+            raise ValueError("Klasifikasi single-label membutuhkan minimal 2 kelas")
+        task = 'binary' if len(resolved) == 2 else 'multiclass'
+    return tuple(resolved), task, {i: ALL_CLASS_NAMES[c] for i, c in enumerate(resolved)}
+
+
+class LabelIndex:
+    """
+    Indeks label satu split, dibangun sekali dari matriks label (N, 14) dengan operasi
+    vektor (tanpa np.where per kelas). Keanggotaan disimpan sebagai offset array (format CSR):
+    - single(c): indeks sampel yang HANYA berlabel c
+    - multi(c): indeks semua sampel yang berlabel c (termasuk multi-label)
+    Memilih subset kelas cukup menggabungkan potongan array: O(jumlah sampel terpilih).
+    """
+    def __init__(self, labels):
+        self.labels = np.asarray(labels)
+        membership = self.labels.astype(bool)
+        n_classes = membership.shape[1]
+
+        # np.nonzero pada matriks transpose: pasangan (kelas, sampel) terurut per kelas
+        member_class, member_sample = np.nonzero(membership.T)
+        self.multi_indices = member_sample
+        self.multi_offsets = np.concatenate([[0], np.cumsum(np.bincount(member_class, minlength=n_classes))])
+
+        single_samples = np.flatnonzero(membership.sum(axis=1) == 1)
+        single_class = membership[single_samples].argmax(axis=1)
+        order = np.argsort(single_class, kind='stable')
+        self.single_indices = single_samples[order]
+        self.single_offsets = np.concatenate([[0], np.cumsum(np.bincount(single_class, minlength=n_classes))])
+
+    def single(self, c):
+        return self.single_indices[self.single_offsets[c]:self.single_offsets[c + 1]]
+
+    def multi(self, c):
+        return self.multi_indices[self.multi_offsets[c]:self.multi_offsets[c + 1]]
+
+    def single_counts(self):
+        return np.diff(self.single_offsets)
+
+    def multi_counts(self):
+        return np.diff(self.multi_offsets)
+
+    def select(self, classes, multilabel=False):
+        """
+        (indices, labels) untuk subset `classes` (indeks ALL_CLASS_NAMES), format label:
+        binary (n, 1), multiclass (n,) berisi 0..k-1, multilabel (n, k) multi-hot; semuanya int64.
+        """
+        if multilabel:
+            if len(classes) == self.labels.shape[1]:
+                indices = np.arange(len(self.labels))  # Semua kelas: semua sampel (termasuk tanpa temuan)
+            else:
+                indices = np.unique(np.concatenate([self.multi(c) for c in classes]))
+            labels = self.labels[indices][:, list(classes)]
+        else:
+            parts = [self.single(c) for c in classes]
+            indices = np.concatenate(parts)
+            labels = np.repeat(np.arange(len(classes)), [len(p) for p in parts])
+            if len(classes) == 2:
+                labels = labels[:, None]
+        return indices, labels.astype(np.int64)
+
+
+_LABEL_INDEXES = {}
+
+
+def get_label_index(split, size=28, dataset=None):
+    """LabelIndex untuk split ini, dibangun sekali per proses (`dataset`: ChestMNIST yang sudah dimuat)."""
+    key = (split, size, DATA_ROOT)
+    if key not in _LABEL_INDEXES:
+        if dataset is None:
+            # Hanya array label yang dibaca dari npz (bukan gambar)
+            with np.load(_npz_path(size)) as npz:
+                labels = npz[f'{split}_labels']
+        else:
+            labels = dataset.labels
+        _LABEL_INDEXES[key] = LabelIndex(labels)
+    return _LABEL_INDEXES[key]
+
+    # Nama file task biner default (c1-7) tetap sama; validitas terhadap npz sumber dicek lewat sidecar
+def _cache_paths(split, size, mean, std, cache_dir, classes, multilabel):
+    # Key task biner default (c1-7) sama seperti sebelumnya, sehingga cache lama tetap terpakai
+    task_key = f"{'ml' if multilabel else 'c'}{'-'.join(map(str, classes))}"
+    key = f"v{CACHE_VERSION}_{split}_{task_key}_s{size}_m{mean:g}_sd{std:g}"
+    return (os.path.join(cache_dir, f"{key}_images.npy"),
+            os.path.join(cache_dir, f"{key}_labels.npy"),
+            os.path.join(cache_dir, f"{key}_source.txt"))
+
+
+def _source_stamp(npz_path):
+    """Fingerprint file npz sumber (path, ukuran, mtime) untuk sidecar cache."""
+    stat = os.stat(npz_path)
+    return f"{os.path.abspath(npz_path)}\n{stat.st_size}\n{stat.st_mtime_ns}\n"
+
+
+def _cache_is_fresh(images_path, labels_path, source_path):
+    """True jika cache lengkap dan file npz yang tercatat di sidecar belum berubah."""
+    if not (os.path.exists(images_path) and os.path.exists(labels_path) and os.path.exists(source_path)):
+        return False
+    with open(source_path) as f:
+        stamp = f.read()
+    # Path dibaca dari sidecar sehingga cache hit tidak perlu mengimpor medmnist
+    npz_path = stamp.split('\n', 1)[0]
+    return os.path.exists(npz_path) and _source_stamp(npz_path) == stamp
+
+
+def load_filtered_split(split, size=28, mean=.5, std=.5, cache_dir=None, classes=None, multilabel=False,
+                        mmap_mode='c'):
+    """
+    Kembalikan (images, labels) hasil filter dari cache `.npy` di `cache_dir` (default: CACHE_DIR).
+    - images: float32 (N, 1, H, W), sudah dinormalisasi dengan `mean`/`std`.
+    - labels: int64, format sesuai task (lihat LabelIndex.select). Default (biner):
+      (N, 1), 0 = Cardiomegaly, 1 = Pneumothorax.
+    - classes/multilabel: subset kelas, lihat resolve_classes.
+    Cache dibuat sekali (dari file npz ChestMNIST) dan dibuat ulang jika ukuran/mtime npz tersebut
+    berubah (sidecar `*_source.txt`), selanjutnya dibuka sebagai `np.memmap`
+    tanpa copy. mmap_mode='c' (copy-on-write) membuat array bisa dibungkus `torch.from_numpy`
+    tanpa menyalin, dan halaman memori dibagi antar proses yang membuka file yang sama.
+    Pembuatan cache membaca npz per STREAM_CHUNK_ROWS baris (iter_npz_rows) dan menulis langsung
+    ke file memmap, sehingga memori tetap kecil juga untuk split 224 px.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    classes, _, _ = resolve_classes(classes, multilabel)
+    images_path, labels_path, source_path = _cache_paths(split, size, mean, std, cache_dir, classes, multilabel)
+
+    if not _cache_is_fresh(images_path, labels_path, source_path):
+        npz_path = _npz_path(size)
+        stamp = _source_stamp(npz_path)
+        indices, labels = get_label_index(split, size).select(classes, multilabel)
+
+        # Tulis ke file sementara lalu rename, agar proses lain tidak membaca cache setengah jadi
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_images_path = f"{images_path}.{os.getpid()}.tmp"
+        images = np.lib.format.open_memmap(tmp_images_path, mode='w+', dtype=np.float32,
+                                           shape=(len(indices), 1, size, size))
+        # Potongan npz dibaca berurutan; baris terpilih ditulis ke posisinya di cache
+        order = np.argsort(indices, kind='stable')
+        sorted_indices = indices[order]
+        for offset, chunk in iter_npz_rows(npz_path, f'{split}_images', STREAM_CHUNK_ROWS):
+            lo, hi = np.searchsorted(sorted_indices, [offset, offset + len(chunk)])
+            if lo == hi:
+                continue
+            block = chunk[sorted_indices[lo:hi] - offset][:, None].astype(np.float32)
+            block /= 255
+            block -= mean
+            block /= std
+            images[order[lo:hi]] = block
+        images.flush()
+        del images
+        os.replace(tmp_images_path, images_path)
+
+        tmp_labels_path = f"{labels_path}.{os.getpid()}.tmp"
+        with open(tmp_labels_path, 'wb') as f:
+            np.save(f, labels)
+        os.replace(tmp_labels_path, labels_path)
+
+        # Sidecar ditulis terakhir: cache baru dianggap valid setelah gambar dan label lengkap
+        tmp_source_path = f"{source_path}.{os.getpid()}.tmp"
+        with open(tmp_source_path, 'w') as f:
+            f.write(stamp)
+        os.replace(tmp_source_path, source_path)
+
+    return (np.load(images_path, mmap_mode=mmap_mode),
+            np.load(labels_path, mmap_mode=mmap_mode))
+
+
 class FilteredBinaryDataset(Dataset):
-    def __init__(self, split, transform=None):
+    """
+    Subset ChestMNIST. Default: biner (Cardiomegaly=0, Pneumothorax=1), hanya sampel single-label.
+    - classes/multilabel: subset kelas lain (N kelas single-label, atau multi-label), lihat
+      resolve_classes. Atribut `task` dan `class_names` menjelaskan format label.
+    - preload=False: menyimpan gambar PIL, `transform` dijalankan per sampel (perilaku lama).
+    - preload=True: gambar di-slice sekaligus dari `ChestMNIST.imgs` lalu dinormalisasi
+      satu kali menjadi satu tensor kontigu (N, 1, H, W). `transform` (opsional) harus
+      menerima tensor. Jika `cache=True`, hasilnya disimpan/dibaca lewat
+      `load_filtered_split` (memmap, tanpa copy).
+    """
+    def __init__(self, split, transform=None, preload=False, mean=.5, std=.5, size=28,
+                 cache=True, cache_dir=None, classes=None, multilabel=False):
         self.transform = transform
-        
-        # Muat dataset lengkap
-        full_dataset = ChestMNIST(split=split, transform=None, download=True)
-        original_labels = full_dataset.labels
-
-        # Cari indeks untuk gambar yang HANYA memiliki satu label yang kita inginkan
-        indices_a = np.where((original_labels[:, CLASS_A_IDX] == 1) & (original_labels.sum(axis=1) == 1))[0]
-        indices_b = np.where((original_labels[:, CLASS_B_IDX] == 1) & (original_labels.sum(axis=1) == 1))[0]
-
-        # Simpan gambar dan label yang sudah dipetakan ulang
-        self.images = []
-        self.labels = []
-
-        # Tambahkan data untuk kelas Cardiomegaly (dipetakan ke label 0)
-        for idx in indices_a:
-            self.images.append(full_dataset[idx][0])
-            self.labels.append(0)
-
-        # Tambahkan data untuk kelas Pneumothorax (dipetakan ke label 1)
-        for idx in indices_b:
-            self.images.append(full_dataset[idx][0])
-            self.labels.append(1)
-        
+        self.preload = preload
+        self._cache_key = None
+        classes, self.task, self.class_names = resolve_classes(classes, multilabel)
+
+        if preload and cache:
+            self._cache_key = (split, size, mean, std, cache_dir or CACHE_DIR, classes, multilabel)
+            self._attach_cache()
+            labels = self.labels.numpy()
+        else:
+            # Muat dataset lengkap, lalu pilih sampel lewat indeks label (dibangun sekali per split)
+            full_dataset = _load_chestmnist(split, size)
+            indices, labels = get_label_index(split, size, full_dataset).select(classes, multilabel)
+
+            if preload:
+                # Slice sekali dengan array indeks NumPy, lalu ToTensor + Normalize dalam satu langkah
+                images = torch.from_numpy(full_dataset.imgs[indices]).unsqueeze(1)
+                self.images = images.float().div_(255).sub_(mean).div_(std).contiguous()
+                self.labels = torch.from_numpy(labels)
+            else:
+                # Simpan gambar PIL dan label yang sudah dipetakan ulang
+                self.images = [full_dataset[idx][0] for idx in indices]
+                self.labels = list(labels)
+
         print(f"Split: {split}")
-        print(f"Jumlah Cardiomegaly (label 0): {len(indices_a)}")
-        print(f"Jumlah Pneumothorax (label 1): {len(indices_b)}")
+        if self.task == 'multilabel':
+            print(f"Multi-label, {len(labels)} sampel. Jumlah positif per kelas:")
+            counts = labels.sum(axis=0)
+        else:
+            counts = np.bincount(labels.ravel(), minlength=len(self.class_names))
+        for i, name in self.class_names.items():
+            print(f"Jumlah {name} (label {i}): {counts[i]}")
         print()
 
+    def _attach_cache(self):
+        images, labels = load_filtered_split(*self._cache_key)
+        self.images = torch.from_numpy(images)
+        self.labels = torch.from_numpy(labels)
+
+    def __getstate__(self):
+        # Saat dikirim ke worker DataLoader, jangan pickle isi tensor: worker membuka memmap yang sama
+        state = self.__dict__.copy()
+        if self._cache_key is not None:
+            state['images'] = state['labels'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._cache_key is not None:
+            self._attach_cache()
+
     def __len__(self):
         return len(self.labels)
 
     def __getitem__(self, idx):
+        if self.preload:
+            image = self.images[idx]
+            if self.transform:
+                image = self.transform(image)
+            return image, self.labels[idx]
+
         image = self.images[idx]
         label = self.labels[idx]
 
         if self.transform:
             image = self.transform(image)
             
-        return image, torch.tensor([label])
+        # Biner: tensor([label]), multi-class: skalar, multi-label: vektor multi-hot
+        return image, torch.as_tensor(label)
+
+    def get_batch(self, indices):
+        """Ambil satu batch utuh (images, labels) dengan satu operasi indexing (mode preload)."""
+        if not self.preload:
+            raise RuntimeError("get_batch hanya tersedia jika preload=True")
+        if not isinstance(indices, torch.Tensor):
+            indices = torch.as_tensor(indices, dtype=torch.long)
+        images = self.images[indices]
+        if self.transform:
+            images = self.transform(images)
+        return images, self.labels[indices]
 
-def get_data_loaders(batch_size):
-    data_transform = transforms.Compose([
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[.5], std=[.5]),
-    ])
+_TASK_NAMES = {'binary': 'klasifikasi biner', 'multiclass': 'klasifikasi multi-kelas', 'multilabel': 'multi-label'}
 
-    train_dataset = FilteredBinaryDataset('train', data_transform)
-    val_dataset = FilteredBinaryDataset('test', data_transform)
+def _print_split_summary(train_dataset, val_dataset):
+    print(f"Dataset ChestMNIST berhasil difilter untuk {_TASK_NAMES[train_dataset.task]}!")
+    names = [f"{name} (Label {i})" for i, name in train_dataset.class_names.items()]
+    print(f"Kelas yang digunakan: {', '.join(names)}")
+    print(f"Jumlah data training: {len(train_dataset)}")
+    print(f"Jumlah data validasi: {len(val_dataset)}")
+
+def _make_samplers(train_dataset, val_dataset, world_size, rank, seed, drop_last=False):
+    """Sampler untuk training terdistribusi: train diacak & dibagi rata, val dibagi tanpa duplikasi."""
+    train_sampler = DistributedSampler(train_dataset, num_replicas=world_size, rank=rank, shuffle=True,
+                                       seed=0 if seed is None else seed, drop_last=drop_last)
+    val_sampler = ShardSampler(len(val_dataset), world_size, rank)
+    return train_sampler, val_sampler
+
+def get_data_loaders(batch_size, world_size=1, rank=0, seed=None, classes=None, multilabel=False, size=28):
+    """
+    Loader train/val. Default task biner; `classes` (nama/indeks) memilih N kelas single-label,
+    `multilabel=True` memakai label multi-hot (default ke-14 kelas). n_classes = jumlah kelas.
+    `size`: resolusi MedMNIST+ (IMAGE_SIZES). Di atas 28 px, split dibaca per potongan dari cache
+    memmap (MemmapChunkLoader) dengan memori terbatas.
+    """
+    if size != 28:
+        return _get_stream_loaders(batch_size, size, world_size, rank, seed, classes, multilabel)
+    # Setara dengan ToTensor() + Normalize(mean=[.5], std=[.5]), tetapi dihitung sekali saat load
+    train_dataset = FilteredBinaryDataset('train', preload=True, mean=.5, std=.5,
+                                          classes=classes, multilabel=multilabel)
+    val_dataset = FilteredBinaryDataset('test', preload=True, mean=.5, std=.5,
+                                        classes=classes, multilabel=multilabel)
     
-    train_loader = DataLoader(dataset=train_dataset, batch_size=batch_size, shuffle=True)
-    val_loader = DataLoader(dataset=val_dataset, batch_size=batch_size, shuffle=False)
+    if world_size > 1:
+        train_sampler, val_sampler = _make_samplers(train_dataset, val_dataset, world_size, rank, seed)
+        train_loader = DataLoader(dataset=train_dataset, batch_size=batch_size, sampler=train_sampler)
+        val_loader = DataLoader(dataset=val_dataset, batch_size=batch_size, sampler=val_sampler)
+    else:
+        train_loader = DataLoader(dataset=train_dataset, batch_size=batch_size, shuffle=True)
+        val_loader = DataLoader(dataset=val_dataset, batch_size=batch_size, shuffle=False)
     
-    n_classes = 2
+    n_classes = len(train_dataset.class_names)
     n_channels = 1
     
-    print("Dataset ChestMNIST berhasil difilter untuk klasifikasi biner!")
-    print(f"Kelas yang digunakan: {NEW_CLASS_NAMES[0]} (Label 0) dan {NEW_CLASS_NAMES[1]} (Label 1)")
-    print(f"Jumlah data training: {len(train_dataset)}")
-    print(f"Jumlah data validasi: {len(val_dataset)}")
+    _print_split_summary(train_dataset, val_dataset)
     
     return train_loader, val_loader, n_classes, n_channels
 
+class ShardSampler(Sampler):
+    """Bagi indeks 0..n-1 ke `num_replicas` rank (rank, rank + R, ...) tanpa padding maupun duplikasi."""
+    def __init__(self, n, num_replicas, rank):
+        self.n = n
+        self.num_replicas = num_replicas
+        self.rank = rank
+
+    def __iter__(self):
+        return iter(range(self.rank, self.n, self.num_replicas))
+
+    def __len__(self):
+        return len(range(self.rank, self.n, self.num_replicas))
+
+class TensorBatchLoader:
+    """
+    Pengganti DataLoader untuk dataset preload: seluruh split dipegang sebagai satu tensor,
+    diacak dengan satu permutasi per epoch, lalu batch diambil dengan satu operasi indexing
+    (tanpa __getitem__ per sampel dan tanpa collate).
+    - device: jika diisi, seluruh split dipindahkan sekali ke device tersebut.
+    - pin_memory: batch disalin ke pinned memory (hanya berguna untuk transfer CPU -> CUDA).
+    - seed: permutasi epoch ke-e memakai seed + e, sehingga urutan batch deterministik.
+      Jika None, seed diambil dari RNG global torch (ikut torch.manual_seed).
+    - sampler: jika diisi (misalnya DistributedSampler), urutan indeks tiap epoch diambil dari
+      sampler ini (set_epoch dipanggil otomatis) dan `shuffle`/`seed` diabaikan.
+    """
+    def __init__(self, dataset, batch_size, shuffle=False, drop_last=False, seed=None,
+                 device=None, pin_memory=False, sampler=None):
+        if not getattr(dataset, 'preload', False):
+            raise ValueError("TensorBatchLoader membutuhkan FilteredBinaryDataset dengan preload=True")
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.sampler = sampler
+        self.seed = int(torch.randint(2**62, (1,)).item()) if seed is None else seed
+        self.epoch = 0
+
+        self.images = dataset.images
+        self.labels = dataset.labels
+        if device is not None:
+            self.images = self.images.to(device)
+            self.labels = self.labels.to(device)
+        self.pin_memory = pin_memory and self.images.device.type == 'cpu' and torch.cuda.is_available()
+
+    def __len__(self):
+        n = len(self.sampler) if self.sampler is not None else len(self.labels)
+        if self.drop_last:
+            return n // self.batch_size
+        return (n + self.batch_size - 1) // self.batch_size
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _gather(self, tensor, idx):
+        if not self.pin_memory:
+            return tensor[idx]
+        out = torch.empty((len(idx),) + tensor.shape[1:], dtype=tensor.dtype, pin_memory=True)
+        return torch.index_select(tensor, 0, idx, out=out)
+
+    def _epoch_order(self):
+        if self.sampler is not None:
+            if hasattr(self.sampler, 'set_epoch'):
+                self.sampler.set_epoch(self.epoch)
+            self.epoch += 1
+            return torch.as_tensor(list(self.sampler), dtype=torch.long)
+        if self.shuffle:
+            generator = torch.Generator()
+            generator.manual_seed(self.seed + self.epoch)
+            self.epoch += 1
+            return torch.randperm(len(self.labels), generator=generator)
+        return None
+
+    def __iter__(self):
+        order = self._epoch_order()
+        if order is not None:
+            order = order.to(self.images.device)
+        n = len(self.labels) if order is None else len(order)
+
+        transform = self.dataset.transform
+        for b in range(len(self)):
+            start = b * self.batch_size
+            end = min(start + self.batch_size, n)
+            if order is None:
+                if self.pin_memory:
+                    idx = torch.arange(start, end)
+                    images, labels = self._gather(self.images, idx), self._gather(self.labels, idx)
+                else:
+                    images, labels = self.images[start:end], self.labels[start:end]
+            else:
+                idx = order[start:end]
+                images, labels = self._gather(self.images, idx), self._gather(self.labels, idx)
+            if transform:
+                images = transform(images)
+            yield images, labels
+
+class MemmapChunkLoader:
+    """
+    Loader out-of-core untuk dataset preload yang di-backing cache memmap (resolusi tinggi).
+    Split dibagi menjadi potongan `chunk_rows` baris berurutan. Tiap epoch urutan potongan
+    diacak, `window_chunks` potongan dibaca sekaligus (baca berurutan dari disk, satu copy ke
+    RAM), diacak di dalam window, lalu dipecah menjadi batch. Memori loader dibatasi
+    window_chunks x chunk_rows gambar, berapa pun ukuran split.
+    - seed/set_epoch: sama seperti TensorBatchLoader (urutan deterministik per epoch).
+    - world_size/rank: setiap rank mengambil baris window[rank::world_size]; saat shuffle,
+      window dipotong ke kelipatan world_size agar jumlah batch semua rank sama (untuk DDP).
+    - pin_memory: batch disalin ke pinned memory (hanya berguna untuk transfer CPU -> CUDA).
+    """
+    def __init__(self, dataset, batch_size, shuffle=False, drop_last=False, seed=None,
+                 chunk_rows=STREAM_CHUNK_ROWS, window_chunks=STREAM_WINDOW_CHUNKS,
+                 world_size=1, rank=0, pin_memory=False):
+        if not getattr(dataset, 'preload', False):
+            raise ValueError("MemmapChunkLoader membutuhkan FilteredBinaryDataset dengan preload=True")
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = int(torch.randint(2**62, (1,)).item()) if seed is None else seed
+        self.epoch = 0
+        self.chunk_rows = chunk_rows
+        self.window_chunks = window_chunks
+        self.world_size = world_size
+        self.rank = rank
+        self.pin_memory = pin_memory and torch.cuda.is_available()
+
+    def _windows(self):
+        # Yield (rentang baris potongan di window ini, urutan baris lokal milik rank ini)
+        n = len(self.dataset)
+        chunks = torch.arange(0, n, self.chunk_rows)
+        generator = None
+        if self.shuffle:
+            generator = torch.Generator()
+            generator.manual_seed(self.seed + self.epoch)
+            self.epoch += 1
+            chunks = chunks[torch.randperm(len(chunks), generator=generator)]
+        for w in range(0, len(chunks), self.window_chunks):
+            spans = [(start, min(start + self.chunk_rows, n))
+                     for start in chunks[w:w + self.window_chunks].tolist()]
+            n_rows = sum(end - start for start, end in spans)
+            if self.shuffle:
+                order = torch.randperm(n_rows, generator=generator)
+                order = order[:n_rows - n_rows % self.world_size]
+            else:
+                order = torch.arange(n_rows)
+            yield spans, order[self.rank::self.world_size]
+
+    def __len__(self):
+        # Ukuran window bergantung pada urutan potongan (potongan terakhir lebih pendek):
+        # hitung dari indeks window epoch berikutnya tanpa memajukan epoch
+        epoch = self.epoch
+        n_batches = sum(self._batches_in(len(order)) for _, order in self._windows())
+        self.epoch = epoch
+        return n_batches
+
+    def _batches_in(self, n):
+        if self.drop_last:
+            return n // self.batch_size
+        return (n + self.batch_size - 1) // self.batch_size
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        images, labels = self.dataset.images, self.dataset.labels
+        transform = self.dataset.transform
+        for spans, order in self._windows():
+            if len(order) == 0:
+                continue
+            # Baca berurutan per potongan (satu copy ke RAM), lalu batch diambil dari window
+            window_images = torch.cat([images[start:end] for start, end in spans])
+            window_labels = torch.cat([labels[start:end] for start, end in spans])
+            for b in range(self._batches_in(len(order))):
+                idx = order[b * self.batch_size:(b + 1) * self.batch_size]
+                batch_images, batch_labels = window_images[idx], window_labels[idx]
+                if self.pin_memory:
+                    batch_images, batch_labels = batch_images.pin_memory(), batch_labels.pin_memory()
+                if transform:
+                    batch_images = transform(batch_images)
+                yield batch_images, batch_labels
+
+def _get_stream_loaders(batch_size, size, world_size, rank, seed, classes, multilabel, pin_memory=False,
+                        drop_last=False):
+    # Resolusi tinggi: dataset tetap di memmap (tanpa copy), loader membaca per window potongan
+    if size not in IMAGE_SIZES:
+        raise ValueError(f"size harus salah satu dari {IMAGE_SIZES}, didapat {size}")
+    train_dataset = FilteredBinaryDataset('train', preload=True, mean=.5, std=.5, size=size,
+                                          classes=classes, multilabel=multilabel)
+    val_dataset = FilteredBinaryDataset('test', preload=True, mean=.5, std=.5, size=size,
+                                        classes=classes, multilabel=multilabel)
+    train_loader = MemmapChunkLoader(train_dataset, batch_size, shuffle=True, drop_last=drop_last, seed=seed,
+                                     world_size=world_size, rank=rank, pin_memory=pin_memory)
+    val_loader = MemmapChunkLoader(val_dataset, batch_size, shuffle=False,
+                                   world_size=world_size, rank=rank, pin_memory=pin_memory)
+    _print_split_summary(train_dataset, val_dataset)
+    return train_loader, val_loader, len(train_dataset.class_names), 1
+
+def get_fast_data_loaders(batch_size, device=None, pin_memory=False, drop_last=False, seed=None,
+                          world_size=1, rank=0, classes=None, multilabel=False, size=28):
+    """
+    Sama seperti get_data_loaders, tetapi memakai TensorBatchLoader (batch langsung dari tensor).
+    Untuk size > 28, split tidak dipindah ke `device`: batch dibaca per potongan (MemmapChunkLoader).
+    """
+    if size != 28:
+        return _get_stream_loaders(batch_size, size, world_size, rank, seed, classes, multilabel,
+                                   pin_memory=pin_memory, drop_last=drop_last)
+    train_dataset = FilteredBinaryDataset('train', preload=True, mean=.5, std=.5,
+                                          classes=classes, multilabel=multilabel)
+    val_dataset = FilteredBinaryDataset('test', preload=True, mean=.5, std=.5,
+                                        classes=classes, multilabel=multilabel)
+
+    train_sampler = val_sampler = None
+    if world_size > 1:
+        train_sampler, val_sampler = _make_samplers(train_dataset, val_dataset, world_size, rank, seed,
+                                                    drop_last)
+
+    train_loader = TensorBatchLoader(train_dataset, batch_size, shuffle=True, drop_last=drop_last,
+                                     seed=seed, device=device, pin_memory=pin_memory, sampler=train_sampler)
+    val_loader = TensorBatchLoader(val_dataset, batch_size, shuffle=False,
+                                   device=device, pin_memory=pin_memory, sampler=val_sampler)
+
+    n_classes = len(train_dataset.class_names)
+    n_channels = 1
+
+    _print_split_summary(train_dataset, val_dataset)
+
+    return train_loader, val_loader, n_classes, n_channels
+
 def show_samples(dataset):
+    import matplotlib.pyplot as plt
+
     cardiomegaly_imgs = []
     pneumothorax_imgs = []
     
@@ -124,13 +685,8 @@ def show_samples(dataset):
     plt.show()
 
 def show_class_distribution(split='train'):
-    full_dataset = ChestMNIST(split=split, transform=None, download=True)
-    original_labels = full_dataset.labels
-    
-    class_counts = {}
-    for idx, class_name in enumerate(ALL_CLASS_NAMES):
-        count = np.where((original_labels[:, idx] == 1) & (original_labels.sum(axis=1) == 1))[0].shape[0]
-        class_counts[class_name] = count
+    # Jumlah single-label per kelas langsung dari offset indeks label (tanpa scan per kelas)
+    class_counts = dict(zip(ALL_CLASS_NAMES, get_label_index(split).single_counts().tolist()))
     
     # Urutkan berdasarkan jumlah (descending)
     sorted_classes = sorted(class_counts.items(), key=lambda x: x[1], reverse=True)
@@ -163,8 +719,8 @@ if __name__ == '__main__':
     print("\n--- Distribusi Kelas Test Set ---")
     show_class_distribution('test')
     
-    plot_transform = transforms.Compose([transforms.ToTensor()])
-    train_dataset = FilteredBinaryDataset('train', transform=plot_transform)
+    # mean=0, std=1 setara dengan ToTensor() saja (piksel di rentang [0, 1])
+    train_dataset = FilteredBinaryDataset('train', preload=True, mean=0., std=1.)
     
     if len(train_dataset) > 0:
         print("\n--- Menampilkan 5 Contoh Gambar per Kelas ---")
@@ -0,0 +1,58 @@
+# ddp_scaling.py
+#
+# Ukur scaling training data-parallel (torchrun + gloo) untuk 1/2/4/8 proses.
+# Setiap konfigurasi menjalankan train.py beberapa epoch di folder sementara (agar
+# best_model.pth dan plot milik user tidak tertimpa), dengan core CPU dibagi rata antar proses.
+# Batch size per proses tetap BATCH_SIZE, jadi batch global = BATCH_SIZE x jumlah proses.
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'train.py')
+THROUGHPUT_PATTERN = re.compile(r"Throughput training run ini: ([\d.]+) sampel/detik")
+
+
+def run_config(nproc, epochs, threads_per_proc, backend='gloo'):
+    """Jalankan train.py dengan `nproc` proses, return throughput global (sampel/detik)."""
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads_per_proc), MPLBACKEND='Agg')
+    cmd = [sys.executable, '-m', 'torch.distributed.run', '--standalone', f'--nproc_per_node={nproc}',
+           TRAIN_SCRIPT, '--epochs', str(epochs), '--backend', backend]
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"torchrun dengan {nproc} proses gagal:\n{result.stderr[-2000:]}")
+    match = THROUGHPUT_PATTERN.search(result.stdout)
+    if match is None:
+        raise RuntimeError(f"Throughput tidak ditemukan di output {nproc} proses")
+    return float(match.group(1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling training DDP (gloo) untuk beberapa jumlah proses")
+    parser.add_argument('--nprocs', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--cores', type=int, default=os.cpu_count(), help="jumlah core yang dibagi antar proses")
+    parser.add_argument('--backend', default='gloo')
+    args = parser.parse_args()
+
+    results = []
+    for nproc in args.nprocs:
+        threads = max(1, args.cores // nproc)
+        print(f"Menjalankan {nproc} proses x {threads} thread ...", flush=True)
+        results.append((nproc, threads, run_config(nproc, args.epochs, threads, args.backend)))
+
+    base = results[0][2] / results[0][0]  # Throughput per proses pada konfigurasi pertama
+    print(f"\n--- Scaling DDP ({args.backend}, {args.epochs} epoch, {args.cores} core) ---")
+    print(f"{'Proses':>6} {'Thread/proses':>14} {'Sampel/detik':>13} {'Speedup':>8} {'Efisiensi':>10}")
+    for nproc, threads, throughput in results:
+        speedup = throughput / results[0][2]
+        efficiency = throughput / (base * nproc)
+        print(f"{nproc:>6} {threads:>14} {throughput:>13.0f} {speedup:>7.2f}x {efficiency:>9.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+# ensemble.py
+#
+# Training ensemble SimpleCNN secara tervektorisasi. N anggota (kombinasi seed / learning rate /
+# dropout) ditumpuk dengan torch.func.stack_module_state lalu dijalankan dengan vmap, sehingga satu
+# forward/backward memproses semua anggota pada batch yang sama. Ini menggantikan N kali train()
+# terpisah yang masing-masing memuat data sendiri.
+#   - Setiap anggota punya learning rate, scheduler plateau, early stopping dan checkpoint sendiri.
+#     Checkpoint memakai format yang sama dengan best_model.pth (bisa dimuat dengan load_simple_cnn).
+#   - Anggota yang sudah early stopping dikeluarkan dari tumpukan (tidak dihitung lagi).
+#   - Inferensi ensemble = satu forward pass batch untuk semua anggota (rata-rata probabilitas).
+#
+# Penggunaan:
+#   python ensemble.py --seeds 0 1 2 3 --lrs 1e-3 5e-4 --dropouts 0.3 0.5
+#   → ensemble/member_00.pth ... ensemble/member_15.pth
+
+import argparse
+import copy
+import itertools
+import os
+import time
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.func import functional_call, stack_module_state, vmap
+from checkpoint import AsyncCheckpointer
+from datareader import get_data_loaders, get_fast_data_loaders
+from model import SimpleCNN, load_simple_cnn
+from train import BATCH_SIZE, DROPOUT_RATE, EARLY_STOP_PATIENCE, EPOCHS, LEARNING_RATE, USE_FAST_LOADER
+
+SEEDS = (0, 1, 2, 3)
+WEIGHT_DECAY = 1e-4  # Sama dengan optimizer di train.py
+# ReduceLROnPlateau per anggota (parameter sama dengan train.py)
+LR_FACTOR = 0.5
+LR_PATIENCE = 3
+MIN_LR = 1e-6
+PLATEAU_THRESHOLD = 1e-4  # threshold default ReduceLROnPlateau (mode 'rel')
+OUTPUT_DIR = 'ensemble'
+
+
+class MemberDropout(nn.Module):
+    """Dropout dengan p sebagai buffer, sehingga setiap anggota tumpukan bisa punya dropout rate sendiri."""
+    def __init__(self, p):
+        super().__init__()
+        self.register_buffer('p', torch.tensor(float(p)))
+
+    def forward(self, x):
+        if not self.training:
+            return x
+        keep = 1 - self.p
+        return x * (torch.rand_like(x) < keep) / keep
+
+
+def _with_member_dropout(model):
+    model.dropout1 = MemberDropout(model.dropout1.p)
+    model.dropout2 = MemberDropout(model.dropout2.p)
+    return model
+
+
+class StackedSimpleCNN:
+    """
+    N SimpleCNN dengan arsitektur sama; parameter dan buffer ditumpuk menjadi tensor [N, ...].
+    Memanggil objek ini dengan batch (B, C, H, W) → logits (N, B, 1) dalam satu pass vmap.
+    """
+    def __init__(self, members):
+        members = [_with_member_dropout(m) for m in members]
+        self.params, self.buffers = stack_module_state(members)
+        self._dropout_keys = {f'{name}.p' for name, m in members[0].named_modules()
+                              if isinstance(m, MemberDropout)}
+        # Modul "kosong" (device meta) hanya sebagai definisi forward untuk functional_call
+        self.base = copy.deepcopy(members[0]).to('meta')
+        self._forward = vmap(self._forward_one, in_dims=(0, 0, None), randomness='different')
+
+    def _forward_one(self, params, buffers, x):
+        return functional_call(self.base, (params, buffers), (x,))
+
+    def __call__(self, x):
+        return self._forward(self.params, self.buffers, x)
+
+    def __len__(self):
+        return next(iter(self.params.values())).shape[0]
+
+    def train(self, mode=True):
+        self.base.train(mode)
+        return self
+
+    def eval(self):
+        return self.train(False)
+
+    def select(self, index):
+        """Pertahankan hanya anggota pada `index` (parameter hasilnya tetap leaf tensor)."""
+        self.params = {k: v.detach()[index].requires_grad_() for k, v in self.params.items()}
+        self.buffers = {k: v[index] for k, v in self.buffers.items()}
+
+    def member_state_dict(self, i):
+        """state_dict SimpleCNN biasa untuk anggota ke-i (view, bukan salinan)."""
+        state = {**self.params, **self.buffers}
+        return {k: v[i].detach() for k, v in state.items() if k not in self._dropout_keys}
+
+
+class StackedAdam:
+    """
+    Adam (weight decay L2 seperti optim.Adam) untuk parameter bertumpuk [N, ...].
+    `lr`: tensor [N], learning rate per anggota. Semua anggota di-update dengan operasi yang sama.
+    """
+    def __init__(self, params, lr, betas=(0.9, 0.999), eps=1e-8, weight_decay=WEIGHT_DECAY):
+        self.params = params
+        self.lr = lr
+        self.betas = betas
+        self.eps = eps
+        self.weight_decay = weight_decay
+        self.step_count = 0
+        self.exp_avg = {k: torch.zeros_like(p) for k, p in params.items()}
+        self.exp_avg_sq = {k: torch.zeros_like(p) for k, p in params.items()}
+
+    def zero_grad(self):
+        for p in self.params.values():
+            p.grad = None
+
+    @torch.no_grad()
+    def step(self):
+        self.step_count += 1
+        beta1, beta2 = self.betas
+        bias_correction1 = 1 - beta1 ** self.step_count
+        bias_correction2_sqrt = (1 - beta2 ** self.step_count) ** 0.5
+        for k, p in self.params.items():
+            grad = p.grad.add(p, alpha=self.weight_decay)
+            exp_avg = self.exp_avg[k].lerp_(grad, 1 - beta1)
+            exp_avg_sq = self.exp_avg_sq[k].mul_(beta2).addcmul_(grad, grad, value=1 - beta2)
+            step_size = (self.lr / bias_correction1).view(-1, *[1] * (p.dim() - 1))
+            denom = (exp_avg_sq.sqrt() / bias_correction2_sqrt).add_(self.eps)
+            p.sub_(exp_avg * step_size / denom)
+
+    def select(self, index, params):
+        self.params = params
+        self.lr = self.lr[index]
+        self.exp_avg = {k: v[index] for k, v in self.exp_avg.items()}
+        self.exp_avg_sq = {k: v[index] for k, v in self.exp_avg_sq.items()}
+
+
+def make_configs(seeds=SEEDS, learning_rates=(LEARNING_RATE,), dropout_rates=(DROPOUT_RATE,)):
+    """Grid seed x learning rate x dropout → list konfigurasi anggota."""
+    return [{'seed': seed, 'learning_rate': lr, 'dropout_rate': dropout}
+            for lr, dropout, seed in itertools.product(learning_rates, dropout_rates, seeds)]
+
+
+def _plateau_step(member, val_loss):
+    # Logika ReduceLROnPlateau(mode='min', factor=LR_FACTOR, patience=LR_PATIENCE, min_lr=MIN_LR)
+    if val_loss < member['plateau_best'] * (1 - PLATEAU_THRESHOLD):
+        member['plateau_best'] = val_loss
+        member['plateau_bad'] = 0
+    else:
+        member['plateau_bad'] += 1
+    if member['plateau_bad'] > LR_PATIENCE:
+        member['lr'] = max(member['lr'] * LR_FACTOR, MIN_LR)
+        member['plateau_bad'] = 0
+
+
+def _member_path(output_dir, member_id):
+    return os.path.join(output_dir, f'member_{member_id:02d}.pth')
+
+
+def train_ensemble(configs, epochs=EPOCHS, output_dir=OUTPUT_DIR, device=None):
+    """
+    Latih semua konfigurasi sekaligus pada batch yang sama. Return list ringkasan per anggota
+    (konfigurasi, best val loss/acc, epoch terbaik, path checkpoint).
+    """
+    device = torch.device(device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+    print(f"Menggunakan device: {device}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    if USE_FAST_LOADER:
+        train_loader, val_loader, num_classes, in_channels = get_fast_data_loaders(BATCH_SIZE, device=device)
+    else:
+        train_loader, val_loader, num_classes, in_channels = get_data_loaders(BATCH_SIZE)
+
+    models = []
+    for config in configs:
+        torch.manual_seed(config['seed'])
+        models.append(SimpleCNN(in_channels=in_channels, num_classes=num_classes,
+                                dropout_rate=config['dropout_rate']).to(device))
+    model = StackedSimpleCNN(models)
+    optimizer = StackedAdam(model.params, torch.tensor([c['learning_rate'] for c in configs], device=device))
+
+    members = [dict(config, id=i, lr=config['learning_rate'], best_val_loss=float('inf'), best_val_acc=0.0,
+                    best_epoch=0, patience=0, plateau_best=float('inf'), plateau_bad=0,
+                    path=_member_path(output_dir, i))
+               for i, config in enumerate(configs)]
+    active = list(members)  # Urutan sama dengan dimensi 0 tumpukan
+    writers = [AsyncCheckpointer() for _ in members]
+
+    print(f"\n--- Memulai Training Ensemble ({len(members)} anggota) ---")
+    print(f"  - Epochs: {epochs} (max) | Batch Size: {BATCH_SIZE} | Early Stop Patience: {EARLY_STOP_PATIENCE}")
+    print()
+
+    train_time_total = 0.0
+    train_samples_total = 0
+    for epoch in range(epochs):
+        n = len(active)
+        model.train()
+        if hasattr(train_loader, 'set_epoch'):
+            train_loader.set_epoch(epoch)
+        running_loss = torch.zeros(n, dtype=torch.float64, device=device)
+        train_correct = torch.zeros(n, dtype=torch.long, device=device)
+        train_total = 0
+        steps = 0
+        epoch_start = time.perf_counter()
+
+        for images, labels in train_loader:
+            images = images.to(device)
+            labels = labels.float().to(device)
+
+            outputs = model(images)  # (N, B, 1)
+            # Loss per anggota; jumlahnya di-backward sekali (gradien tiap anggota tetap terpisah)
+            losses = F.binary_cross_entropy_with_logits(
+                outputs, labels.expand_as(outputs), reduction='none').mean(dim=(1, 2))
+            optimizer.zero_grad()
+            losses.sum().backward()
+            optimizer.step()
+
+            running_loss += losses.detach()
+            train_correct += ((outputs > 0).float() == labels).sum(dim=(1, 2))
+            train_total += labels.size(0)
+            steps += 1
+
+        train_time_total += time.perf_counter() - epoch_start
+        train_samples_total += train_total * n
+
+        # --- Fase Validasi ---
+        model.eval()
+        val_running_loss = torch.zeros(n, dtype=torch.float64, device=device)
+        val_correct = torch.zeros(n, dtype=torch.long, device=device)
+        val_total = 0
+        val_batches = 0
+        with torch.no_grad():
+            for images, labels in val_loader:
+                images = images.to(device)
+                labels = labels.float().to(device)
+                outputs = model(images)
+                val_running_loss += F.binary_cross_entropy_with_logits(
+                    outputs, labels.expand_as(outputs), reduction='none').mean(dim=(1, 2))
+                val_correct += ((outputs > 0).float() == labels).sum(dim=(1, 2))
+                val_total += labels.size(0)
+                val_batches += 1
+
+        # Satu sinkronisasi ke host per epoch untuk semua anggota
+        train_losses, train_accs, val_losses, val_accs = torch.stack([
+            running_loss / steps, 100 * train_correct / train_total,
+            val_running_loss / val_batches, 100 * val_correct / val_total]).tolist()
+
+        print(f"Epoch [{epoch+1}/{epochs}] | {n} anggota aktif")
+        keep = []
+        for j, member in enumerate(active):
+            status = ''
+            if val_losses[j] < member['best_val_loss']:
+                member.update(best_val_loss=val_losses[j], best_val_acc=val_accs[j], best_epoch=epoch + 1,
+                              patience=0)
+                # Snapshot CPU anggota ini + tulis checkpoint di thread latar belakang
+                writers[member['id']].save({
+                    'epoch': epoch + 1,
+                    'model_state_dict': model.member_state_dict(j),
+                    'best_val_loss': val_losses[j],
+                    'best_val_acc': val_accs[j],
+                    'seed': member['seed'],
+                    'learning_rate': member['learning_rate'],
+                    'dropout_rate': member['dropout_rate'],
+                }, member['path'])
+                status = ' ⭐'
+            else:
+                member['patience'] += 1
+            _plateau_step(member, val_losses[j])
+            if member['patience'] >= EARLY_STOP_PATIENCE:
+                status = f" ⚠️  early stop (best epoch {member['best_epoch']})"
+            else:
+                keep.append(j)
+            print(f"  #{member['id']:02d} seed={member['seed']} lr={member['learning_rate']:g} "
+                  f"dropout={member['dropout_rate']:g} | Train Loss: {train_losses[j]:.4f} | "
+                  f"Train Acc: {train_accs[j]:.2f}% | Val Loss: {val_losses[j]:.4f} | "
+                  f"Val Acc: {val_accs[j]:.2f}%{status}")
+
+        if not keep:
+            print("\n⚠️  Semua anggota sudah early stopping")
+            break
+        if len(keep) < n:
+            # Keluarkan anggota yang berhenti dari tumpukan agar tidak ikut dihitung lagi
+            index = torch.tensor(keep, device=device)
+            model.select(index)
+            optimizer.select(index, model.params)
+            active = [active[j] for j in keep]
+        optimizer.lr = torch.tensor([m['lr'] for m in active], device=device)
+
+    for writer in writers:
+        writer.close()
+    print("--- Training Ensemble Selesai ---")
+    print(f"\nThroughput ensemble: {train_samples_total / train_time_total:.0f} sampel-anggota/detik")
+
+    print(f"\n{'Anggota':>7} {'Seed':>5} {'LR':>8} {'Dropout':>8} {'Epoch':>6} {'Val Loss':>9} {'Val Acc':>8}")
+    for member in sorted(members, key=lambda m: m['best_val_loss']):
+        print(f"{member['id']:>7} {member['seed']:>5} {member['learning_rate']:>8g} {member['dropout_rate']:>8g} "
+              f"{member['best_epoch']:>6} {member['best_val_loss']:>9.4f} {member['best_val_acc']:>7.2f}%")
+    print(f"\n✅ Checkpoint per anggota disimpan di '{output_dir}/'")
+
+    summaries = [{k: m[k] for k in ('id', 'seed', 'learning_rate', 'dropout_rate', 'best_epoch',
+                                    'best_val_loss', 'best_val_acc', 'path')} for m in members]
+
+    # Evaluasi ensemble (anggota terbaik masing-masing) dalam satu forward pass per batch
+    ensemble = load_ensemble([m['path'] for m in summaries], map_location=device)
+    correct = 0
+    total = 0
+    for images, labels in val_loader:
+        probs = predict_ensemble(ensemble, images.to(device))
+        correct += ((probs > 0.5).float() == labels.float().to(device)).sum().item()
+        total += labels.size(0)
+    print(f"Akurasi ensemble ({len(summaries)} anggota, rata-rata probabilitas) pada validation: "
+          f"{100 * correct / total:.2f}%")
+    return summaries
+
+
+def load_ensemble(checkpoint_paths, map_location='cpu'):
+    """Muat checkpoint anggota (format best_model.pth) menjadi satu StackedSimpleCNN dalam mode eval."""
+    return StackedSimpleCNN([load_simple_cnn(path, map_location=map_location)
+                             for path in checkpoint_paths]).eval()
+
+
+def predict_ensemble(ensemble, images):
+    """Probabilitas rata-rata semua anggota (B, 1), dihitung dengan satu forward pass."""
+    with torch.inference_mode():
+        return torch.sigmoid(ensemble(images).float()).mean(dim=0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Training ensemble SimpleCNN tervektorisasi (torch.func.vmap)")
+    parser.add_argument('--seeds', type=int, nargs='+', default=list(SEEDS))
+    parser.add_argument('--lrs', type=float, nargs='+', default=[LEARNING_RATE])
+    parser.add_argument('--dropouts', type=float, nargs='+', default=[DROPOUT_RATE])
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--device', default=None)
+    args = parser.parse_args()
+    train_ensemble(make_configs(args.seeds, args.lrs, args.dropouts), epochs=args.epochs,
+                   output_dir=args.output_dir, device=args.device)
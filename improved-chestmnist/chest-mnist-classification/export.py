@@ -0,0 +1,114 @@
+# export.py
+#
+# Build inference dari best_model.pth:
+#   1. Lipat BatchNorm ke Conv2d/Linear (FusedSimpleCNN)
+#   2. torch.compile (opsional) untuk inferensi di proses yang sama
+#   3. torch.export → file .pt2 yang bisa di-load tanpa definisi class Python (serving CPU)
+# lalu bandingkan latency/throughput terhadap model eager dan cek output dalam toleransi.
+
+import argparse
+import time
+import torch
+from model import FusedSimpleCNN, load_simple_cnn
+
+CHECKPOINT_PATH = 'best_model.pth'
+EXPORT_PATH = 'best_model_fused.pt2'
+ATOL = 1e-4  # Toleransi absolut perbandingan logit
+RTOL = 1e-4
+MAX_EXPORT_BATCH = 65536
+
+
+def export_fused(model, path=EXPORT_PATH, example_batch=4):
+    """
+    Simpan FusedSimpleCNN sebagai ExportedProgram (.pt2) dengan dimensi batch dinamis. Resolusi
+    input tetap, yaitu model.image_size (resolusi checkpoint).
+    """
+    in_channels = model.conv1.in_channels
+    example = torch.randn(example_batch, in_channels, model.image_size, model.image_size)
+    batch = torch.export.Dim('batch', min=1, max=MAX_EXPORT_BATCH)
+    exported = torch.export.export(model, (example,), dynamic_shapes=({0: batch},))
+    torch.export.save(exported, path)
+    return exported
+
+
+def load_exported(path=EXPORT_PATH):
+    """Muat model hasil export sebagai nn.Module yang bisa dipanggil (tanpa import model.py)."""
+    return torch.export.load(path).module()
+
+
+def check_outputs(reference, candidate, x, atol=ATOL, rtol=RTOL):
+    """Kembalikan (lolos, selisih maksimum) antara output dua model pada input `x`."""
+    with torch.inference_mode():
+        expected = reference(x)
+        actual = candidate(x)
+    max_diff = (expected - actual).abs().max().item()
+    same_preds = torch.equal(expected > 0, actual > 0)
+    return torch.allclose(expected, actual, atol=atol, rtol=rtol) and same_preds, max_diff
+
+
+def benchmark(fn, x, iters=200, warmup=20):
+    """Median latency (ms) per panggilan `fn(x)` dan throughput (sampel/detik)."""
+    times = []
+    with torch.inference_mode():
+        for _ in range(warmup):
+            fn(x)
+        for _ in range(iters):
+            start = time.perf_counter()
+            fn(x)
+            times.append(time.perf_counter() - start)
+    times.sort()
+    median = times[len(times) // 2]
+    return median * 1000, x.shape[0] / median
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuse Conv-BN-ReLU, compile dan export SimpleCNN")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--output', default=EXPORT_PATH)
+    parser.add_argument('--batch-size', type=int, default=256, help="batch untuk pengukuran throughput")
+    parser.add_argument('--iters', type=int, default=200)
+    parser.add_argument('--no-compile', action='store_true', help="lewati torch.compile")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    eager = load_simple_cnn(args.checkpoint)
+    fused = FusedSimpleCNN(eager)
+    in_channels = eager.conv1.in_channels
+    size = eager.image_size
+
+    export_fused(fused, args.output)
+    exported = load_exported(args.output)
+    print(f"✅ Model ter-fuse disimpan sebagai '{args.output}' (torch.export, tanpa definisi class, "
+          f"input {size}x{size})")
+
+    variants = [('eager', eager), ('fused', fused), ('exported', exported)]
+    if not args.no_compile:
+        variants.append(('fused+compile', torch.compile(fused)))
+
+    # Cek kesamaan output terhadap model eager
+    x_check = torch.randn(args.batch_size, in_channels, size, size)
+    print(f"\n--- Cek Output vs Eager (atol={ATOL}, rtol={RTOL}) ---")
+    all_ok = True
+    for name, module in variants[1:]:
+        ok, max_diff = check_outputs(eager, module, x_check)
+        all_ok &= ok
+        print(f"  {name:<15} max |diff| = {max_diff:.2e}  {'OK' if ok else 'GAGAL'}")
+
+    # Latency (batch 1) dan throughput (batch besar)
+    single = torch.randn(1, in_channels, size, size)
+    batched = torch.randn(args.batch_size, in_channels, size, size)
+    print(f"\n--- Benchmark CPU ({torch.get_num_threads()} thread) ---")
+    print(f"{'Varian':<15} {'Latency b=1 (ms)':>17} {f'b={args.batch_size} (sampel/detik)':>24} {'Speedup':>8}")
+    base_throughput = None
+    for name, module in variants:
+        latency, _ = benchmark(module, single, args.iters)
+        _, throughput = benchmark(module, batched, max(args.iters // 4, 10))
+        base_throughput = base_throughput or throughput
+        print(f"{name:<15} {latency:>17.3f} {throughput:>24.0f} {throughput / base_throughput:>7.2f}x")
+
+    if not all_ok:
+        raise SystemExit("Output model hasil fuse/export tidak sesuai dengan model eager")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+# inference.py
+#
+# Entry point inferensi ringan untuk worker scoring: hanya butuh torch dan NumPy. Modul ini
+# (beserta model.py dan datareader.py yang diimpornya) tidak mengimpor medmnist, torchvision,
+# matplotlib atau PIL, sehingga cold start = import torch + load bobot + satu forward pass.
+# predict.py dan serve.py memakai preprocessing dari sini.
+#
+# Penggunaan:
+#   from inference import load_model, predict
+#   model = load_model('best_model.pth')                 # torch.load(mmap=True)
+#   logits, probs, labels = predict(model, images)       # uint8 (n, H, W) atau float [0, 1], H = W = model.image_size
+#   model.task, model.class_names                        # metadata checkpoint (biner/multi-kelas/multi-label)
+#   cache = PredictionCache(model_fingerprint(model))    # opsional, lihat cache.py
+#   logits, probs, labels = predict(model, images, cache)
+#
+#   python inference.py --checkpoint best_model.pth      # ukur import, load dan waktu ke prediksi pertama
+
+import time
+
+_IMPORT_START = time.perf_counter()
+
+import argparse
+import json
+import sys
+import numpy as np
+import torch
+from cache import cached_forward
+from model import default_task, load_simple_cnn
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_START  # Waktu import dependency modul ini
+
+CHECKPOINT_PATH = 'best_model.pth'
+IMAGE_SIZE = 28  # Resolusi default; checkpoint MedMNIST+ menyimpan resolusinya sendiri (model.image_size)
+MEAN, STD = .5, .5  # Sama dengan normalisasi di get_data_loaders
+MMAP_LOAD = True  # Memory-map bobot checkpoint saat load (lebih cepat untuk cold start)
+# Modul berat yang tidak boleh ikut terimpor oleh jalur inferensi (dicek oleh `python inference.py` dan benchmark 'startup')
+HEAVY_MODULES = ('medmnist', 'torchvision', 'matplotlib', 'PIL', 'sklearn', 'pandas')
+
+
+def to_model_input(batch):
+    """Array gambar → tensor float (n, 1, H, W) ternormalisasi, sama seperti saat training."""
+    batch = np.ascontiguousarray(batch)
+    if not batch.flags.writeable:
+        batch = batch.copy()  # Input memmap/read-only: normalisasi in-place di bawah tidak boleh menulis ke sana
+    images = torch.from_numpy(batch)
+    if images.ndim == 3:
+        images = images.unsqueeze(1)
+    if images.dtype == torch.uint8:
+        images = images.float().div_(255)
+    else:
+        images = images.float()  # Diasumsikan sudah dalam rentang [0, 1]
+    return images.sub_(MEAN).div_(STD)
+
+
+def load_model(checkpoint=CHECKPOINT_PATH, device='cpu', mmap=MMAP_LOAD):
+    """
+    SimpleCNN dari checkpoint `train()` dalam mode eval di `device`, dengan metadata checkpoint
+    sebagai atribut `task`, `class_names` dan `image_size` (lihat model.load_simple_cnn).
+    """
+    device = torch.device(device)
+    return load_simple_cnn(checkpoint, map_location=device, mmap=mmap).to(device)
+
+
+def model_task(model):
+    """(task, class_names) model; model tanpa metadata checkpoint lihat model.default_task."""
+    task, class_names = default_task(model.fc3.out_features)
+    return getattr(model, 'task', task), getattr(model, 'class_names', class_names)
+
+
+def decode_logits(logits, task, class_names):
+    """
+    Logit (n,) atau (n, k) → (probs, labels) sesuai task checkpoint:
+    - binary: sigmoid (n,), label class_names[logit > 0]
+    - multiclass: softmax (n, k), label kelas top-1
+    - multilabel: sigmoid per kelas (n, k), label = tuple nama kelas dengan prob > 0.5
+    """
+    if task == 'binary':
+        probs = torch.sigmoid(logits)
+        labels = [class_names[int(v)] for v in (logits > 0).tolist()]
+    elif task == 'multiclass':
+        probs = torch.softmax(logits, dim=1)
+        labels = [class_names[i] for i in probs.argmax(dim=1).tolist()]
+    elif task == 'multilabel':
+        probs = torch.sigmoid(logits)
+        labels = [tuple(class_names[i] for i, positive in enumerate(row) if positive)
+                  for row in (logits > 0).tolist()]
+    else:
+        raise ValueError(f"Task tidak dikenal: {task} (gunakan 'binary', 'multiclass' atau 'multilabel')")
+    return probs, labels
+
+
+def forward_logits(model, images, device, cache=None):
+    """Logit float CPU (n,) untuk model 1 output atau (n, k); dengan cache hanya miss yang di-forward."""
+    if cache is not None:
+        return cached_forward(model, images, cache, device)
+    with torch.inference_mode():
+        logits = model(images.to(device, non_blocking=True)).float().cpu()
+    return logits.squeeze(1) if logits.shape[1] == 1 else logits
+
+
+def predict(model, images, cache=None):
+    """
+    Prediksi untuk satu batch: array numpy (lihat to_model_input) atau tensor yang sudah
+    dinormalisasi. Return (logits, probs, labels) sebagai numpy/list, sesuai task model
+    (lihat decode_logits; biner: logits/probs (n,), multi-kelas/multi-label: (n, k)).
+    - cache: cache.PredictionCache; hanya gambar yang belum ada di cache yang di-forward.
+    """
+    if not torch.is_tensor(images):
+        images = to_model_input(images)
+    logits = forward_logits(model, images, next(model.parameters()).device, cache)
+    probs, labels = decode_logits(logits, *model_task(model))
+    return logits.numpy(), probs.numpy(), labels
+
+
+def loaded_heavy_modules():
+    """Modul berat (HEAVY_MODULES) yang sudah ada di sys.modules."""
+    return sorted(name for name in HEAVY_MODULES if name in sys.modules)
+
+
+def measure_cold_start(checkpoint=CHECKPOINT_PATH, device='cpu', mmap=MMAP_LOAD):
+    """
+    Waktu (detik) import, load model dan prediksi pertama di proses ini. Bermakna hanya jika
+    dipanggil di proses baru (misalnya `python inference.py` atau benchmark 'startup').
+    """
+    start = time.perf_counter()
+    model = load_model(checkpoint, device, mmap)
+    loaded = time.perf_counter()
+    size = getattr(model, 'image_size', IMAGE_SIZE)
+    predict(model, np.zeros((1, model.conv1.in_channels, size, size), dtype=np.uint8))
+    done = time.perf_counter()
+    return {
+        'import_s': IMPORT_SECONDS,
+        'load_s': loaded - start,
+        'first_prediction_s': done - loaded,
+        'time_to_first_prediction_s': IMPORT_SECONDS + done - start,
+        'heavy_modules': loaded_heavy_modules(),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ukur cold start inferensi SimpleCNN (import, load, prediksi pertama)")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--no-mmap', action='store_true', help="baca checkpoint utuh ke memori (tanpa mmap)")
+    parser.add_argument('--json', action='store_true', help="cetak hasil sebagai JSON (dipakai benchmark.py)")
+    args = parser.parse_args()
+    timing = measure_cold_start(args.checkpoint, args.device, mmap=not args.no_mmap)
+    if args.json:
+        print(json.dumps(timing))
+    else:
+        print(f"Import      : {timing['import_s'] * 1000:8.1f} ms")
+        print(f"Load model  : {timing['load_s'] * 1000:8.1f} ms")
+        print(f"Prediksi #1 : {timing['first_prediction_s'] * 1000:8.1f} ms")
+        print(f"Total (TTFP): {timing['time_to_first_prediction_s'] * 1000:8.1f} ms")
+        if timing['heavy_modules']:
+            print(f"⚠️  Modul berat ikut terimpor: {', '.join(timing['heavy_modules'])}")
+        else:
+            print("✅ Tidak ada modul berat (medmnist/torchvision/matplotlib/PIL) yang terimpor")
@@ -0,0 +1,223 @@
+# metrics.py
+#
+# Metrik evaluasi streaming untuk validasi: ROC-AUC, PR-AUC (average precision), sensitivity/
+# specificity per kelas, confusion matrix dan expected calibration error (ECE).
+# Statistik diakumulasi di device per batch ke dalam histogram berukuran tetap (probabilitas
+# dibagi ke N_BINS bin), tanpa menyimpan prediksi satu per satu, sehingga memori konstan berapa pun
+# ukuran split. Di akhir epoch semua state cukup di-all_reduce (satu panggilan) lalu dihitung
+# sekali di host. AUC dari histogram adalah pendekatan dengan resolusi 1/N_BINS.
+#
+# Penggunaan:
+#   metrics = StreamingMetrics('binary', num_classes=2, device=device, class_names=NEW_CLASS_NAMES)
+#   for images, labels in val_loader:
+#       metrics.update(model(images), labels)
+#   metrics.all_reduce()          # hanya jika distributed
+#   result = metrics.compute()    # dict berisi roc_auc, pr_auc, sensitivity, specificity, ...
+#   print(format_report(result))
+
+import numpy as np
+import torch
+import torch.distributed as dist
+
+N_BINS = 1000  # Resolusi histogram probabilitas (AUC/PR-AUC)
+CALIBRATION_BINS = 15  # Jumlah bin untuk ECE
+
+
+class StreamingMetrics:
+    """
+    Akumulator metrik berukuran tetap untuk task 'binary' (1 logit), 'multiclass' (softmax) atau
+    'multilabel' (sigmoid per kelas). ROC/PR dihitung one-vs-rest per kelas (biner: kelas label 1).
+    update() tidak pernah menyinkronkan device dengan host.
+    """
+    def __init__(self, task, num_classes, device, class_names=None, n_bins=N_BINS,
+                 calibration_bins=CALIBRATION_BINS):
+        self.task = task
+        self.num_classes = num_classes
+        self.device = device
+        self.class_names = class_names or {i: str(i) for i in range(num_classes)}
+        self.n_bins = n_bins
+        self.calibration_bins = calibration_bins
+        # Jumlah skor one-vs-rest yang diukur: biner hanya probabilitas kelas 1
+        self.n_scores = 1 if task == 'binary' else num_classes
+        self.reset()
+
+    def reset(self):
+        scores_bins = (self.n_scores, self.n_bins)
+        self.total_hist = torch.zeros(scores_bins, dtype=torch.long, device=self.device)
+        self.pos_hist = torch.zeros(scores_bins, dtype=torch.long, device=self.device)
+        self.prob_sum = torch.zeros(scores_bins, dtype=torch.float64, device=self.device)
+        if self.task == 'multilabel':
+            self.confusion = torch.zeros((self.num_classes, 2, 2), dtype=torch.long, device=self.device)
+        else:
+            self.confusion = torch.zeros((self.num_classes, self.num_classes), dtype=torch.long, device=self.device)
+        # Kalibrasi multi-class memakai confidence top-1 (bukan skor one-vs-rest)
+        self.conf_total = torch.zeros(self.n_bins, dtype=torch.long, device=self.device)
+        self.conf_correct = torch.zeros(self.n_bins, dtype=torch.long, device=self.device)
+        self.conf_sum = torch.zeros(self.n_bins, dtype=torch.float64, device=self.device)
+
+    def _state(self):
+        return [self.total_hist, self.pos_hist, self.prob_sum, self.confusion,
+                self.conf_total, self.conf_correct, self.conf_sum]
+
+    def _bin(self, probs):
+        return (probs * self.n_bins).long().clamp_(0, self.n_bins - 1)
+
+    @torch.no_grad()
+    def update(self, outputs, labels):
+        """outputs: logits (N, 1) atau (N, K); labels: format dari datareader untuk task ini."""
+        outputs = outputs.detach().float()
+        if self.task == 'multiclass':
+            labels = labels.long().view(-1)
+            probs = torch.softmax(outputs, dim=1)
+            targets = torch.nn.functional.one_hot(labels, self.num_classes)
+            predicted = probs.argmax(dim=1)
+            self.confusion.view(-1).index_add_(0, labels * self.num_classes + predicted,
+                                               torch.ones_like(labels))
+            confidence = probs.max(dim=1).values
+            conf_bins = self._bin(confidence)
+            self.conf_total.index_add_(0, conf_bins, torch.ones_like(conf_bins))
+            self.conf_correct.index_add_(0, conf_bins, (predicted == labels).long())
+            self.conf_sum.index_add_(0, conf_bins, confidence.double())
+        else:
+            targets = labels.long().reshape(outputs.shape)
+            probs = torch.sigmoid(outputs)
+            predicted = (outputs > 0).long()
+            if self.task == 'binary':
+                index = targets.reshape(-1) * 2 + predicted.reshape(-1)
+            else:
+                # Confusion 2x2 per kelas: indeks kelas * 4 + label * 2 + prediksi
+                class_offset = torch.arange(self.num_classes, device=outputs.device) * 4
+                index = (class_offset + targets * 2 + predicted).reshape(-1)
+            self.confusion.view(-1).index_add_(0, index, torch.ones_like(index))
+
+        # Histogram probabilitas per skor (positif dan total), dengan offset per kelas
+        offsets = torch.arange(self.n_scores, device=outputs.device) * self.n_bins
+        flat_bins = (self._bin(probs) + offsets).reshape(-1)
+        self.total_hist.view(-1).index_add_(0, flat_bins, torch.ones_like(flat_bins))
+        self.pos_hist.view(-1).index_add_(0, flat_bins, targets.reshape(-1).long())
+        self.prob_sum.view(-1).index_add_(0, flat_bins, probs.reshape(-1).double())
+
+    def all_reduce(self):
+        """Jumlahkan state dari semua proses (satu all_reduce float64; hitungan tetap eksak < 2^53)."""
+        if not (dist.is_available() and dist.is_initialized()) or dist.get_world_size() == 1:
+            return
+        state = self._state()
+        flat = torch.cat([t.reshape(-1).to(torch.float64) for t in state])
+        dist.all_reduce(flat)
+        for t, chunk in zip(state, flat.split([t.numel() for t in state])):
+            t.copy_(chunk.view(t.shape).to(t.dtype))
+
+    def compute(self):
+        """Hitung semua metrik di host (satu transfer dari device)."""
+        total, pos, prob_sum, confusion, conf_total, conf_correct, conf_sum = (
+            t.cpu().numpy() for t in self._state())
+        neg = total - pos
+
+        if self.task == 'binary':
+            score_names = [self.class_names[1]]
+        else:
+            score_names = [self.class_names[i] for i in range(self.num_classes)]
+        roc_auc = {name: _roc_auc(pos[i], neg[i]) for i, name in enumerate(score_names)}
+        pr_auc = {name: _average_precision(pos[i], neg[i]) for i, name in enumerate(score_names)}
+
+        if self.task == 'multilabel':
+            per_class = [(c[1, 1], c[1, 0], c[0, 1], c[0, 0]) for c in confusion]  # TP, FN, FP, TN
+        else:
+            n = confusion.sum()
+            per_class = []
+            for k in range(self.num_classes):
+                tp = confusion[k, k]
+                fn = confusion[k].sum() - tp
+                fp = confusion[:, k].sum() - tp
+                per_class.append((tp, fn, fp, n - tp - fn - fp))
+        names = [self.class_names[i] for i in range(self.num_classes)]
+        sensitivity = {name: _ratio(tp, tp + fn) for name, (tp, fn, fp, tn) in zip(names, per_class)}
+        specificity = {name: _ratio(tn, tn + fp) for name, (tp, fn, fp, tn) in zip(names, per_class)}
+
+        if self.task == 'multiclass':
+            ece = _calibration_error(conf_total, conf_correct, conf_sum, self.calibration_bins)
+        else:
+            ece = _calibration_error(total.sum(axis=0), pos.sum(axis=0), prob_sum.sum(axis=0),
+                                     self.calibration_bins)
+
+        return {
+            'task': self.task,
+            'roc_auc': roc_auc,
+            'pr_auc': pr_auc,
+            'macro_roc_auc': _nanmean(roc_auc.values()),
+            'macro_pr_auc': _nanmean(pr_auc.values()),
+            'sensitivity': sensitivity,
+            'specificity': specificity,
+            'confusion_matrix': confusion.tolist(),
+            'ece': ece,
+        }
+
+
+def _ratio(a, b):
+    return float(a / b) if b else float('nan')
+
+
+def _nanmean(values):
+    values = [v for v in values if not np.isnan(v)]
+    return float(np.mean(values)) if values else float('nan')
+
+
+def _curve_counts(pos, neg):
+    # Threshold dari bin tertinggi ke terendah: TP/FP kumulatif (diawali titik (0, 0))
+    tp = np.concatenate([[0], np.cumsum(pos[::-1])])
+    fp = np.concatenate([[0], np.cumsum(neg[::-1])])
+    return tp, fp
+
+
+def _roc_auc(pos, neg):
+    n_pos, n_neg = pos.sum(), neg.sum()
+    if n_pos == 0 or n_neg == 0:
+        return float('nan')
+    tp, fp = _curve_counts(pos, neg)
+    # Trapesium antar threshold = AUC dengan skor seri di dalam satu bin dihitung setengah
+    return float(np.sum((fp[1:] - fp[:-1]) * (tp[1:] + tp[:-1])) / (2 * n_pos * n_neg))
+
+
+def _average_precision(pos, neg):
+    n_pos = pos.sum()
+    if n_pos == 0:
+        return float('nan')
+    tp, fp = _curve_counts(pos, neg)
+    predicted = tp + fp
+    precision = np.divide(tp, predicted, out=np.ones(len(tp)), where=predicted > 0)
+    recall_gain = (tp[1:] - tp[:-1]) / n_pos
+    return float(np.sum(recall_gain * precision[1:]))
+
+
+def _calibration_error(total, hits, prob_sum, n_bins):
+    """ECE: rata-rata |confidence - frekuensi benar| per bin kalibrasi, dibobot jumlah sampel."""
+    n = total.sum()
+    if n == 0:
+        return float('nan')
+    group = np.arange(len(total)) * n_bins // len(total)
+    count = np.bincount(group, weights=total, minlength=n_bins)
+    hit = np.bincount(group, weights=hits, minlength=n_bins)
+    confidence = np.bincount(group, weights=prob_sum, minlength=n_bins)
+    filled = count > 0
+    return float(np.sum(np.abs(confidence[filled] - hit[filled])) / n)
+
+
+def format_report(result):
+    """Ringkasan metrik dalam beberapa baris teks (untuk log akhir training)."""
+    lines = [f"ROC-AUC (macro): {result['macro_roc_auc']:.4f} | PR-AUC (macro): {result['macro_pr_auc']:.4f} | "
+             f"ECE: {result['ece']:.4f}"]
+    lines.append(f"{'Kelas':<22} {'ROC-AUC':>8} {'PR-AUC':>8} {'Sensitivity':>12} {'Specificity':>12}")
+    for name in result['sensitivity']:
+        # Biner: ROC/PR hanya untuk kelas positif (label 1)
+        roc, pr = (f"{result[key][name]:>8.4f}" if name in result[key] else f"{'-':>8}"
+                   for key in ('roc_auc', 'pr_auc'))
+        lines.append(f"{name:<22} {roc} {pr} {result['sensitivity'][name]:>12.4f} "
+                     f"{result['specificity'][name]:>12.4f}")
+    confusion = result['confusion_matrix']
+    if result['task'] == 'multilabel':
+        lines.append("Confusion matrix per kelas [[TN, FP], [FN, TP]]:")
+        lines.extend(f"  {name:<20} {matrix}" for name, matrix in zip(result['sensitivity'], confusion))
+    else:
+        lines.append("Confusion matrix (baris = label, kolom = prediksi):")
+        lines.extend(f"  {name:<20} {row}" for name, row in zip(result['sensitivity'], confusion))
+    return '\n'.join(lines)
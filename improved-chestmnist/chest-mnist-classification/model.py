@@ -2,31 +2,41 @@
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval, fuse_linear_bn_eval
+import torch.utils.checkpoint
+from datareader import NEW_CLASS_NAMES
+
+# Lebar default (conv1, conv2, conv3, fc1, fc2). Model hasil pruning (prune.py) memakai lebar lebih kecil;
+# lebar tersimpan di checkpoint dan dibaca ulang dari bentuk bobot oleh load_simple_cnn.
+DEFAULT_WIDTHS = (16, 32, 64, 256, 128)
 
 class SimpleCNN(nn.Module):
-    def __init__(self, in_channels=1, num_classes=10, dropout_rate=0.3):
+    def __init__(self, in_channels=1, num_classes=10, dropout_rate=0.3, widths=DEFAULT_WIDTHS):
         super().__init__()
+        self.widths = tuple(int(w) for w in widths)
+        c1, c2, c3, f1, f2 = self.widths
         # Convolutional layers dengan Batch Normalization
-        self.conv1 = nn.Conv2d(in_channels, 16, kernel_size=5, stride=1, padding=2)  # 28x28 → 28x28
-        self.bn1 = nn.BatchNorm2d(16)
-        self.conv2 = nn.Conv2d(16, 32, kernel_size=5, stride=1, padding=2)           # 14x14 → 14x14
-        self.bn2 = nn.BatchNorm2d(32)
-        self.conv3 = nn.Conv2d(32, 64, kernel_size=3, stride=1, padding=1)           # 7x7 → 7x7
-        self.bn3 = nn.BatchNorm2d(64)
+        self.conv1 = nn.Conv2d(in_channels, c1, kernel_size=5, stride=1, padding=2)  # 28x28 → 28x28
+        self.bn1 = nn.BatchNorm2d(c1)
+        self.conv2 = nn.Conv2d(c1, c2, kernel_size=5, stride=1, padding=2)           # 14x14 → 14x14
+        self.bn2 = nn.BatchNorm2d(c2)
+        self.conv3 = nn.Conv2d(c2, c3, kernel_size=3, stride=1, padding=1)           # 7x7 → 7x7
+        self.bn3 = nn.BatchNorm2d(c3)
         
         self.pool = nn.MaxPool2d(2, 2)                                               # Pooling 2x2
         self.dropout_conv = nn.Dropout2d(p=0.25)                                     # Dropout untuk conv layers
         
         # Fully connected layers
-        self.fc1 = nn.Linear(64 * 3 * 3, 256)                                        # 7x7 → 3x3 setelah pool
-        self.bn_fc1 = nn.BatchNorm1d(256)
+        self.fc1 = nn.Linear(c3 * 3 * 3, f1)                                         # 7x7 → 3x3 setelah pool
+        self.bn_fc1 = nn.BatchNorm1d(f1)
         self.dropout1 = nn.Dropout(p=dropout_rate)
         
-        self.fc2 = nn.Linear(256, 128)
-        self.bn_fc2 = nn.BatchNorm1d(128)
+        self.fc2 = nn.Linear(f1, f2)
+        self.bn_fc2 = nn.BatchNorm1d(f2)
         self.dropout2 = nn.Dropout(p=dropout_rate)
         
-        self.fc3 = nn.Linear(128, 1 if num_classes == 2 else num_classes)
+        self.fc3 = nn.Linear(f2, 1 if num_classes == 2 else num_classes)
 
     def forward(self, x):
         # Conv Block 1
@@ -68,6 +78,149 @@ class SimpleCNN(nn.Module):
         x = self.fc3(x)
         return x
 
+@torch.no_grad()
+def _update_running_stats(bn, x):
+    """Update running_mean/var BatchNorm2d dari batch `x` persis seperti nn.BatchNorm2d (mode train)."""
+    if not bn.track_running_stats:
+        return
+    bn.num_batches_tracked += 1
+    momentum = 1 / bn.num_batches_tracked.item() if bn.momentum is None else bn.momentum
+    # Statistik dihitung dalam dtype buffer (float32), juga saat x bf16/fp16 di bawah autocast
+    x = x.detach().to(bn.running_mean.dtype)
+    bn.running_mean.lerp_(x.mean(dim=(0, 2, 3)), momentum)
+    bn.running_var.lerp_(x.var(dim=(0, 2, 3), unbiased=True), momentum)
+
+class AdaptiveSimpleCNN(SimpleCNN):
+    """
+    SimpleCNN untuk resolusi berapa pun (MedMNIST+ 28/64/128/224): setelah conv block ketiga,
+    AdaptiveAvgPool2d mengecilkan feature map ke 3x3 sehingga `fc1` tetap conv3*3*3. Parameternya
+    sama persis dengan SimpleCNN (state_dict kompatibel); pada input 28x28 outputnya identik.
+    - activation_checkpointing=True: aktivasi conv block tidak disimpan untuk backward tetapi
+      dihitung ulang, sehingga memori aktivasi turun drastis pada resolusi tinggi (dengan biaya
+      ~1 forward conv tambahan). Running_mean/var BatchNorm hanya di-update sekali pada forward
+      pertama, bukan lagi saat recompute (update momentum tidak dobel).
+    """
+    def __init__(self, in_channels=1, num_classes=10, dropout_rate=0.3, activation_checkpointing=False,
+                 widths=DEFAULT_WIDTHS):
+        super().__init__(in_channels, num_classes, dropout_rate, widths)
+        self.adaptive_pool = nn.AdaptiveAvgPool2d((3, 3))
+        self.activation_checkpointing = activation_checkpointing
+
+    def _conv_block(self, x, conv, bn, dropout):
+        x = self.pool(torch.relu(bn(conv(x))))
+        return self.dropout_conv(x) if dropout else x
+
+    def _checkpointed_block(self, x, conv, bn, dropout, update_stats):
+        x = conv(x)
+        if update_stats:
+            _update_running_stats(bn, x)
+        # Normalisasi selalu dengan statistik batch (sama seperti BatchNorm mode train), sehingga
+        # forward dan recompute menyimpan tensor yang sama
+        x = F.batch_norm(x, None, None, bn.weight, bn.bias, training=True, eps=bn.eps)
+        x = self.pool(torch.relu(x))
+        return self.dropout_conv(x) if dropout else x
+
+    def _run_block(self, x, conv, bn, dropout):
+        if not (self.activation_checkpointing and self.training and torch.is_grad_enabled()):
+            return self._conv_block(x, conv, bn, dropout)
+        calls = []
+
+        def block(x):
+            # Panggilan pertama = forward (update running stats), berikutnya = recompute di backward
+            calls.append(None)
+            return self._checkpointed_block(x, conv, bn, dropout, update_stats=len(calls) == 1)
+
+        # RNG state disimpan checkpoint, sehingga mask Dropout2d saat recompute sama
+        return torch.utils.checkpoint.checkpoint(block, x, use_reentrant=False)
+
+    def forward(self, x):
+        x = self._run_block(x, self.conv1, self.bn1, dropout=True)
+        x = self._run_block(x, self.conv2, self.bn2, dropout=True)
+        x = self._run_block(x, self.conv3, self.bn3, dropout=False)
+        x = torch.flatten(self.adaptive_pool(x), 1)   # (N, conv3 * 3 * 3) untuk resolusi apa pun
+
+        x = self.dropout1(torch.relu(self.bn_fc1(self.fc1(x))))
+        x = self.dropout2(torch.relu(self.bn_fc2(self.fc2(x))))
+        return self.fc3(x)
+
+class FusedSimpleCNN(nn.Module):
+    """
+    Versi inferensi dari SimpleCNN: setiap BatchNorm dilipat ke Conv2d/Linear sebelumnya
+    dan dropout dihapus, sehingga tiap blok hanya conv/linear → relu (→ pool).
+    Output identik (dalam toleransi float) dengan SimpleCNN dalam mode eval. Dari AdaptiveSimpleCNN,
+    AdaptiveAvgPool2d ikut dipertahankan sehingga model resolusi tinggi tetap bisa dipakai.
+    `image_size`: resolusi input model sumber (untuk contoh input export/benchmark).
+    """
+    def __init__(self, model: SimpleCNN):
+        super().__init__()
+        was_training = model.training
+        model.eval()
+        self.conv1 = fuse_conv_bn_eval(model.conv1, model.bn1)
+        self.conv2 = fuse_conv_bn_eval(model.conv2, model.bn2)
+        self.conv3 = fuse_conv_bn_eval(model.conv3, model.bn3)
+        self.fc1 = fuse_linear_bn_eval(model.fc1, model.bn_fc1)
+        self.fc2 = fuse_linear_bn_eval(model.fc2, model.bn_fc2)
+        self.fc3 = nn.Linear(model.fc3.in_features, model.fc3.out_features)
+        self.fc3.load_state_dict(model.fc3.state_dict())
+        model.train(was_training)
+
+        # Modul ReLU terpisah per blok agar bisa di-fuse lagi (misalnya untuk kuantisasi)
+        self.relu1 = nn.ReLU()
+        self.relu2 = nn.ReLU()
+        self.relu3 = nn.ReLU()
+        self.relu_fc1 = nn.ReLU()
+        self.relu_fc2 = nn.ReLU()
+        self.pool = nn.MaxPool2d(2, 2)
+        self.adaptive_pool = nn.AdaptiveAvgPool2d((3, 3)) if isinstance(model, AdaptiveSimpleCNN) else nn.Identity()
+        self.image_size = getattr(model, 'image_size', 28)
+        self.eval()
+
+    def forward(self, x):
+        x = self.pool(self.relu1(self.conv1(x)))   # (N, 16, 14, 14)
+        x = self.pool(self.relu2(self.conv2(x)))   # (N, 32, 7, 7)
+        x = self.pool(self.relu3(self.conv3(x)))   # (N, 64, 3, 3)
+        x = self.adaptive_pool(x)                  # Resolusi tinggi: (N, 64, 3, 3)
+        x = torch.flatten(x, 1)
+        x = self.relu_fc1(self.fc1(x))
+        x = self.relu_fc2(self.fc2(x))
+        return self.fc3(x)
+
+def state_dict_widths(state_dict):
+    """Lebar (conv1, conv2, conv3, fc1, fc2) dari bentuk bobot state_dict SimpleCNN."""
+    return tuple(state_dict[f'{name}.weight'].shape[0] for name in ('conv1', 'conv2', 'conv3', 'fc1', 'fc2'))
+
+def default_task(n_outputs):
+    """(task, class_names) untuk checkpoint tanpa metadata: 1 output = biner NEW_CLASS_NAMES, selain itu multi-kelas."""
+    if n_outputs == 1:
+        return 'binary', dict(NEW_CLASS_NAMES)
+    return 'multiclass', {i: f'kelas_{i}' for i in range(n_outputs)}
+
+def load_simple_cnn(checkpoint_path='best_model.pth', map_location='cpu', dropout_rate=0.3, mmap=False):
+    """
+    Muat SimpleCNN dari checkpoint yang disimpan `train()` (dict dengan 'model_state_dict')
+    atau dari state_dict biasa. in_channels, num_classes dan lebar layer (model hasil prune.py)
+    dibaca dari bentuk bobot.
+    Checkpoint resolusi tinggi ('image_size' > 28) dimuat sebagai AdaptiveSimpleCNN.
+    Metadata checkpoint disimpan sebagai atribut model: `task` ('binary'/'multiclass'/'multilabel'),
+    `class_names` ({indeks: nama}) dan `image_size`; checkpoint lama tanpa metadata lihat default_task.
+    - mmap=True: storage tensor di-memory-map dari file (torch.load(mmap=True)), tidak dibaca dulu
+      seluruhnya ke memori; hanya untuk checkpoint format zip (default torch.save).
+    """
+    checkpoint = torch.load(checkpoint_path, map_location=map_location, mmap=mmap)
+    state_dict = checkpoint.get('model_state_dict', checkpoint)
+    in_channels = state_dict['conv1.weight'].shape[1]
+    n_outputs = state_dict['fc3.weight'].shape[0]
+    model_class = SimpleCNN if checkpoint.get('image_size', 28) == 28 else AdaptiveSimpleCNN
+    model = model_class(in_channels=in_channels, num_classes=2 if n_outputs == 1 else n_outputs,
+                        dropout_rate=dropout_rate, widths=state_dict_widths(state_dict))
+    model.load_state_dict(state_dict)
+    task, class_names = default_task(n_outputs)
+    model.task = checkpoint.get('task', task)
+    model.class_names = dict(checkpoint.get('class_names') or class_names)
+    model.image_size = checkpoint.get('image_size', 28)
+    model.eval()
+    return model
+
 # --- Bagian untuk pengujian ---
 if __name__ == '__main__':
     NUM_CLASSES = 2
@@ -0,0 +1,247 @@
+# predict.py
+#
+# Inferensi offline (batch) untuk SimpleCNN dari best_model.pth.
+# Input di-stream dalam batch berukuran tetap dari:
+#   - file .npy (dibuka dengan memmap)
+#   - file .npz (array dibaca per potongan langsung dari arsip zip)
+#   - folder gambar (png/jpg/bmp/tif), di-decode dan di-resize ke resolusi checkpoint (28x28 atau
+#     image_size MedMNIST+) grayscale
+# Decode/preprocessing berjalan di thread terpisah (prefetch) sehingga overlap dengan forward pass.
+# Hasil ditulis bertahap ke CSV atau Parquet sesuai task checkpoint (model.task/class_names):
+#   - biner: id, logit, prob (sigmoid), label
+#   - multi-kelas: id, label (top-1), prob_<kelas> (softmax) per kelas
+#   - multi-label: id, label (kelas dengan prob > 0.5, dipisah '|'), prob_<kelas> (sigmoid) per kelas
+# Dengan --cache-db, prediksi disimpan di cache SQLite (cache.py) sehingga gambar yang sama pada
+# run berikutnya tidak di-forward lagi (selama best_model.pth tidak berubah).
+
+import argparse
+import csv
+import os
+import queue
+import threading
+import numpy as np
+import torch
+from cache import CACHE_CAPACITY, PredictionCache, model_fingerprint
+from datareader import iter_npz_rows
+from inference import CHECKPOINT_PATH, IMAGE_SIZE, decode_logits, forward_logits, load_model, model_task, to_model_input
+
+BATCH_SIZE = 512
+PREFETCH = 4  # Jumlah batch yang disiapkan di depan oleh thread decode
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+# --- Sumber input (generator batch: (ids, array uint8/float (n, H, W) atau (n, 1, H, W))) ---
+
+def _default_npz_key(path):
+    with np.load(path) as npz:
+        keys = list(npz.files)
+    if len(keys) == 1:
+        return keys[0]
+    image_keys = [k for k in keys if k.endswith('images')]
+    if not image_keys:
+        raise ValueError(f"Tidak bisa menentukan array gambar di {path}, gunakan --key (tersedia: {keys})")
+    return image_keys[0]
+
+def iter_npy_batches(path, batch_size):
+    images = np.load(path, mmap_mode='r')
+    for start in range(0, len(images), batch_size):
+        end = min(start + batch_size, len(images))
+        yield list(range(start, end)), np.asarray(images[start:end])
+
+def iter_npz_batches(path, batch_size, key=None):
+    key = key or _default_npz_key(path)
+    print(f"Membaca array '{key}' dari {path}")
+    for offset, chunk in iter_npz_rows(path, key, batch_size):
+        yield list(range(offset, offset + len(chunk))), chunk
+
+def decode_image(source, size=IMAGE_SIZE):
+    """Decode file gambar (path atau file-like) → array uint8 (size, size) grayscale."""
+    from PIL import Image
+
+    with Image.open(source) as img:
+        img = img.convert('L')
+        if img.size != (size, size):
+            img = img.resize((size, size), Image.BILINEAR)
+        return np.asarray(img)
+
+def iter_image_dir_batches(path, batch_size, size=IMAGE_SIZE):
+    files = sorted(
+        os.path.relpath(os.path.join(root, name), path)
+        for root, _, names in os.walk(path)
+        for name in names
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    for start in range(0, len(files), batch_size):
+        names = files[start:start + batch_size]
+        batch = np.empty((len(names), size, size), dtype=np.uint8)
+        for i, name in enumerate(names):
+            batch[i] = decode_image(os.path.join(path, name), size)
+        yield names, batch
+
+def iter_input_batches(path, batch_size, key=None, size=IMAGE_SIZE):
+    """Pilih sumber input berdasarkan path (folder, .npy atau .npz). Gambar di folder di-resize ke `size`."""
+    if os.path.isdir(path):
+        return iter_image_dir_batches(path, batch_size, size)
+    if path.endswith('.npy'):
+        return iter_npy_batches(path, batch_size)
+    if path.endswith('.npz'):
+        return iter_npz_batches(path, batch_size, key)
+    raise ValueError(f"Input tidak didukung: {path} (gunakan folder gambar, .npy atau .npz)")
+
+
+# --- Pipeline ---
+
+def prefetch(iterable, depth=PREFETCH):
+    """Jalankan `iterable` di thread latar belakang dengan antrean berukuran `depth`."""
+    if depth <= 0:
+        yield from iterable
+        return
+
+    q = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def producer():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                q.put(item)
+        except BaseException as exc:  # Diteruskan ke thread utama
+            q.put(exc)
+        finally:
+            q.put(done)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # Kosongkan antrean agar producer tidak tertahan di q.put
+        while thread.is_alive():
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                thread.join(timeout=0.1)
+
+def predict_batches(model, batches, device, cache=None):
+    """Generator (ids, logits, probs, labels) per batch sesuai task model (dengan cache: hanya miss yang di-forward)."""
+    model.eval()
+    task, class_names = model_task(model)
+    for ids, images in batches:
+        logits = forward_logits(model, images, device, cache)
+        probs, labels = decode_logits(logits, task, class_names)
+        yield ids, logits.numpy(), probs.numpy(), labels
+
+
+# --- Output ---
+
+def output_columns(task, class_names):
+    """Kolom output: biner (id, logit, prob, label), lainnya (id, label, prob_<kelas>...)."""
+    if task == 'binary':
+        return ['id', 'logit', 'prob', 'label']
+    return ['id', 'label', *(f'prob_{name}' for name in class_names.values())]
+
+def output_rows(task, ids, logits, probs, labels):
+    """Kolom per batch (list per kolom, urutan sama dengan output_columns)."""
+    if task == 'binary':
+        return [ids, logits.tolist(), probs.tolist(), labels]
+    if task == 'multilabel':
+        labels = ['|'.join(names) for names in labels]
+    return [ids, labels, *probs.T.tolist()]
+
+class CsvWriter:
+    def __init__(self, path, task='binary', class_names=None):
+        self.task = task
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(output_columns(task, class_names))
+
+    def write(self, ids, logits, probs, labels):
+        self.writer.writerows(zip(*output_rows(self.task, ids, logits, probs, labels)))
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    def __init__(self, path, task='binary', class_names=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise ImportError("Output Parquet membutuhkan pyarrow (pip install pyarrow)") from exc
+        self.pa = pa
+        self.task = task
+        self.schema = pa.schema([(name, pa.string() if name in ('id', 'label') else pa.float32())
+                                 for name in output_columns(task, class_names)])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, ids, logits, probs, labels):
+        columns = output_rows(self.task, [str(i) for i in ids], logits, probs, labels)
+        table = self.pa.Table.from_arrays([self.pa.array(c, type=field.type) for c, field in zip(columns, self.schema)],
+                                          schema=self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        self.writer.close()
+
+def open_writer(path, fmt=None, task='binary', class_names=None):
+    fmt = fmt or ('parquet' if path.endswith('.parquet') else 'csv')
+    return (ParquetWriter if fmt == 'parquet' else CsvWriter)(path, task, class_names)
+
+
+def run(input_path, output_path, checkpoint=CHECKPOINT_PATH, batch_size=BATCH_SIZE, key=None,
+        fmt=None, device=None, prefetch_depth=PREFETCH, cache_db=None, cache_size=CACHE_CAPACITY,
+        cache_purge=False):
+    device = torch.device(device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+    model = load_model(checkpoint, device)
+    cache = PredictionCache(model_fingerprint(model), cache_size, cache_db, cache_purge) if cache_db else None
+
+    # Decode + normalisasi di thread prefetch, forward di thread utama
+    batches = ((ids, to_model_input(batch))
+               for ids, batch in iter_input_batches(input_path, batch_size, key, model.image_size))
+    writer = open_writer(output_path, fmt, *model_task(model))
+    n_total = 0
+    try:
+        for ids, logits, probs, labels in predict_batches(model, prefetch(batches, prefetch_depth), device, cache):
+            writer.write(ids, logits, probs, labels)
+            n_total += len(ids)
+    finally:
+        writer.close()
+        if cache is not None:
+            cache.close()
+    print(f"✅ {n_total} prediksi ditulis ke '{output_path}'")
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Cache '{cache_db}': {stats['memory_hits'] + stats['disk_hits']} hit, {stats['misses']} miss "
+              f"(hit rate {stats['hit_rate'] or 0:.1%})")
+    return n_total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Prediksi batch SimpleCNN untuk folder gambar atau file npy/npz")
+    parser.add_argument('input', help="folder gambar, file .npy, atau file .npz")
+    parser.add_argument('--output', default='predictions.csv', help="file hasil (.csv atau .parquet)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=None,
+                        help="format output (default: dari ekstensi --output)")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--key', default=None, help="nama array di file .npz (default: *_images)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--prefetch', type=int, default=PREFETCH, help="jumlah batch yang di-decode di depan")
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--cache-db', default=None,
+                        help="file SQLite cache prediksi (dipakai ulang antar run selama model sama)")
+    parser.add_argument('--cache-size', type=int, default=CACHE_CAPACITY, help="entri LRU cache di memori")
+    parser.add_argument('--cache-purge', action='store_true',
+                        help="hapus prediksi model lain (fingerprint berbeda) dari --cache-db")
+    args = parser.parse_args()
+    run(args.input, args.output, checkpoint=args.checkpoint, batch_size=args.batch_size, key=args.key,
+        fmt=args.format, device=args.device, prefetch_depth=args.prefetch, cache_db=args.cache_db,
+        cache_size=args.cache_size, cache_purge=args.cache_purge)
@@ -0,0 +1,157 @@
+# profiling.py
+#
+# Instrumentasi training loop: waktu per fase (data, h2d, augment, forward, backward, optimizer, validation),
+# sampel/detik, peak memory dan rasio menunggu data per epoch, ditulis sebagai satu baris JSON
+# per epoch ke file metrics (JSONL). Opsional: trace torch.profiler untuk jendela step tertentu.
+# Jika dinonaktifkan, semua hook hanya mengembalikan nullcontext/iterator asli (overhead ~nol).
+
+import contextlib
+import json
+import os
+import time
+import torch
+
+try:
+    import resource  # Tidak tersedia di Windows
+except ImportError:
+    resource = None
+
+PHASES = ('data', 'h2d', 'augment', 'forward', 'backward', 'optimizer', 'validation')
+_NULL = contextlib.nullcontext()
+
+
+def parse_step_window(text):
+    """'10:20' → (10, 20): trace step ke-10 sampai sebelum step ke-20 (step global, mulai 0)."""
+    start, end = (int(v) for v in text.split(':'))
+    if not 0 <= start < end:
+        raise ValueError(f"Jendela step tidak valid: {text} (format START:END, START < END)")
+    return start, end
+
+
+class TrainingProfiler:
+    """
+    - enabled: aktifkan pencatatan waktu per fase dan file metrics JSONL.
+    - profile_steps: (start, end) jendela step global untuk torch.profiler (None = tanpa trace).
+      Trace Chrome/TensorBoard ditulis ke `trace_dir`.
+    Saat enabled di CUDA, setiap akhir fase memanggil torch.cuda.synchronize() agar waktu
+    per fase akurat (ini menambah sinkronisasi, jadi aktifkan hanya saat menganalisis).
+    """
+    def __init__(self, device, enabled=False, metrics_path='training_metrics.jsonl',
+                 profile_steps=None, trace_dir='profiler_traces'):
+        self.device = device
+        self.enabled = enabled
+        self.metrics_path = metrics_path
+        self.global_step = 0
+        self._sync = enabled and device.type == 'cuda'
+        self._times = dict.fromkeys(PHASES, 0.0)
+        self._epoch_start = None
+        self._train_end = None
+        self._metrics_file = None
+        if enabled:
+            self._metrics_file = open(metrics_path, 'a', buffering=1)
+
+        self._torch_profiler = None
+        if profile_steps is not None:
+            start, end = profile_steps
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if device.type == 'cuda':
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            os.makedirs(trace_dir, exist_ok=True)
+            self._torch_profiler = torch.profiler.profile(
+                activities=activities,
+                schedule=torch.profiler.schedule(skip_first=start, wait=0, warmup=0, active=end - start, repeat=1),
+                on_trace_ready=torch.profiler.tensorboard_trace_handler(trace_dir),
+                record_shapes=True,
+                profile_memory=True,
+            )
+            self._torch_profiler.start()
+
+    # --- Hook di dalam loop ---
+
+    def phase(self, name):
+        """Context manager yang mencatat durasi fase `name` (nullcontext jika nonaktif)."""
+        if not self.enabled:
+            return _NULL
+        return self._timed(name)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._sync:
+                torch.cuda.synchronize(self.device)
+            self._times[name] += time.perf_counter() - start
+
+    def iter_data(self, loader):
+        """Bungkus loader agar waktu menunggu batch berikutnya tercatat sebagai fase 'data'."""
+        if not self.enabled:
+            return loader
+        return self._timed_iter(loader)
+
+    def _timed_iter(self, loader):
+        iterator = iter(loader)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                self._train_end = time.perf_counter()
+                return
+            self._times['data'] += time.perf_counter() - start
+            yield batch
+
+    def step(self):
+        """Panggil sekali di akhir setiap training step."""
+        self.global_step += 1
+        if self._torch_profiler is not None:
+            self._torch_profiler.step()
+
+    # --- Batas epoch ---
+
+    def start_epoch(self):
+        if not self.enabled:
+            return
+        self._times = dict.fromkeys(PHASES, 0.0)
+        self._train_end = None
+        if self.device.type == 'cuda':
+            torch.cuda.reset_peak_memory_stats(self.device)
+        self._epoch_start = time.perf_counter()
+
+    def end_epoch(self, epoch, n_samples, **extra):
+        """Tulis satu baris metrics untuk epoch ini. `extra` (loss, akurasi, lr, ...) ikut disimpan."""
+        if not self.enabled:
+            return None
+        end = time.perf_counter()
+        train_end = self._train_end or end
+        train_time = train_end - self._epoch_start
+        record = {
+            'epoch': epoch,
+            'global_step': self.global_step,
+            'epoch_time_s': end - self._epoch_start,
+            'train_time_s': train_time,
+            'phases_s': dict(self._times),
+            'samples_per_s': n_samples / train_time if train_time > 0 else None,
+            'data_wait_ratio': self._times['data'] / train_time if train_time > 0 else None,
+            'peak_memory_mb': self._peak_memory_mb(),
+        }
+        record.update(extra)
+        self._metrics_file.write(json.dumps(record) + '\n')
+        return record
+
+    def _peak_memory_mb(self):
+        if self.device.type == 'cuda':
+            return torch.cuda.max_memory_allocated(self.device) / 2**20
+        if resource is not None:
+            # ru_maxrss: KB di Linux (peak RSS proses sejak start, bukan per epoch)
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return None
+
+    def close(self):
+        if self._torch_profiler is not None:
+            self._torch_profiler.stop()
+            self._torch_profiler = None
+        if self._metrics_file is not None:
+            self._metrics_file.close()
+            self._metrics_file = None
@@ -0,0 +1,226 @@
+# prune.py
+#
+# Structured pruning SimpleCNN/AdaptiveSimpleCNN (task, kelas dan resolusi dibaca dari checkpoint,
+# default biner Cardiomegaly vs Pneumothorax 28x28). Filter conv dan neuron FC
+# yang paling tidak penting dibuang secara fisik (bobot di-slice, bukan di-mask), sehingga model hasil
+# benar-benar lebih kecil dan lebih cepat:
+#   1. Ranking per layer: |gamma| BatchNorm setelahnya (--criterion bn, default) atau norma L1
+#      filter conv / baris bobot FC (--criterion l1)
+#   2. Untuk setiap rasio, SimpleCNN dengan lebar lebih kecil dibangun dan bobot yang dipertahankan
+#      disalin (termasuk input layer berikutnya dan statistik BatchNorm)
+#   3. Fine-tuning dengan train() (early stopping, task/kelas/resolusi yang sama dengan checkpoint),
+#      model terbaik disimpan sebagai <output-dir>/pruned_<rasio>.pth
+#   4. Tabel Pareto: akurasi (split 'test', split validasi train()) vs jumlah parameter, FLOPs dan
+#      latency CPU terukur
+# Model hasil dimuat ulang dengan model.load_simple_cnn (lebar layer dibaca dari bentuk bobot).
+#
+# Penggunaan:
+#   python prune.py --checkpoint best_model.pth --ratios 0.25 0.5 0.75 --epochs 10
+#   python prune.py --criterion l1 --epochs 0        # tanpa fine-tuning (hanya slice + evaluasi)
+
+import argparse
+import csv
+import os
+import torch
+import torch.nn as nn
+from export import benchmark
+from model import load_simple_cnn
+from quantize import checkpoint_dataset, evaluate_accuracy
+from train import BATCH_SIZE, LEARNING_RATE, train
+
+CHECKPOINT_PATH = 'best_model.pth'
+OUTPUT_DIR = 'pruned'
+RESULTS_FILE = 'pruning_results.csv'
+RATIOS = (0.25, 0.5, 0.75)  # Fraksi filter/neuron yang dibuang di setiap layer
+CRITERION = 'bn'
+FINETUNE_EPOCHS = 10
+FINETUNE_LR = LEARNING_RATE / 10  # Fine-tuning dari bobot terlatih: learning rate lebih kecil
+FINETUNE_PATIENCE = 3
+LATENCY_BATCH = 256
+# (layer, BatchNorm setelahnya) yang lebarnya dipangkas, urut sesuai SimpleCNN.widths
+PRUNABLE = (('conv1', 'bn1'), ('conv2', 'bn2'), ('conv3', 'bn3'), ('fc1', 'bn_fc1'), ('fc2', 'bn_fc2'))
+POOLED_SPATIAL = 3 * 3  # Ukuran feature map conv3 setelah pool (input fc1 = conv3 * 3 * 3)
+
+
+def importance(model, criterion=CRITERION):
+    """Skor per filter/neuron untuk setiap layer PRUNABLE (semakin besar semakin penting)."""
+    scores = []
+    for layer_name, bn_name in PRUNABLE:
+        if criterion == 'bn':
+            scores.append(getattr(model, bn_name).weight.detach().abs())
+        elif criterion == 'l1':
+            scores.append(getattr(model, layer_name).weight.detach().abs().flatten(1).sum(dim=1))
+        else:
+            raise ValueError(f"Kriteria tidak dikenal: {criterion} (gunakan 'bn' atau 'l1')")
+    return scores
+
+
+def pruned_widths(widths, ratio):
+    """Lebar setelah membuang `ratio` bagian di setiap layer (minimal 1)."""
+    return tuple(max(1, round(w * (1 - ratio))) for w in widths)
+
+
+def prune_simple_cnn(model, widths, criterion=CRITERION):
+    """
+    SimpleCNN/AdaptiveSimpleCNN baru dengan lebar `widths` (conv1, conv2, conv3, fc1, fc2), berisi
+    filter/neuron dengan skor tertinggi dari `model` (urutan asli dipertahankan).
+    """
+    keep = [score.topk(width).indices.sort().values.cpu()
+            for score, width in zip(importance(model, criterion), widths)]
+    k1, k2, k3, kf1, kf2 = keep
+    # Kolom fc1 untuk channel conv3 c adalah c * 9 .. c * 9 + 8 (flatten (C, 3, 3))
+    fc1_inputs = (k3[:, None] * POOLED_SPATIAL + torch.arange(POOLED_SPATIAL)).reshape(-1)
+    inputs = {'conv1': None, 'conv2': k1, 'conv3': k2, 'fc1': fc1_inputs, 'fc2': kf1, 'fc3': kf2}
+    outputs = {'conv1': k1, 'conv2': k2, 'conv3': k3, 'fc1': kf1, 'fc2': kf2, 'fc3': None}
+
+    state = {k: v.detach().cpu() for k, v in model.state_dict().items()}
+    new_state = {}
+    for name in inputs:
+        weight, bias = state[f'{name}.weight'], state[f'{name}.bias']
+        if outputs[name] is not None:
+            weight, bias = weight[outputs[name]], bias[outputs[name]]
+        if inputs[name] is not None:
+            weight = weight[:, inputs[name]]
+        new_state[f'{name}.weight'], new_state[f'{name}.bias'] = weight.contiguous(), bias.contiguous()
+    for (layer_name, bn_name), index in zip(PRUNABLE, keep):
+        for param in ('weight', 'bias', 'running_mean', 'running_var'):
+            new_state[f'{bn_name}.{param}'] = state[f'{bn_name}.{param}'][index].contiguous()
+        new_state[f'{bn_name}.num_batches_tracked'] = state[f'{bn_name}.num_batches_tracked'].clone()
+
+    n_outputs = model.fc3.out_features
+    pruned = type(model)(in_channels=model.conv1.in_channels, num_classes=2 if n_outputs == 1 else n_outputs,
+                         dropout_rate=model.dropout1.p, widths=widths)
+    pruned.load_state_dict(new_state)
+    for name in ('task', 'class_names', 'image_size'):  # Metadata checkpoint (lihat load_simple_cnn)
+        if hasattr(model, name):
+            setattr(pruned, name, getattr(model, name))
+    return pruned.eval()
+
+
+def count_parameters(model):
+    return sum(p.numel() for p in model.parameters())
+
+
+def count_flops(model, image_size=28):
+    """FLOPs (2 x multiply-accumulate) Conv2d dan Linear untuk satu gambar, diukur dengan forward hook."""
+    macs = []
+
+    def hook(module, inputs, output):
+        if isinstance(module, nn.Conv2d):
+            kernel = module.in_channels // module.groups * module.kernel_size[0] * module.kernel_size[1]
+            macs.append(output[0].numel() * kernel)
+        else:
+            macs.append(module.in_features * module.out_features)
+
+    handles = [m.register_forward_hook(hook) for m in model.modules() if isinstance(m, (nn.Conv2d, nn.Linear))]
+    was_training = model.training
+    model.eval()
+    try:
+        with torch.inference_mode():
+            model(torch.zeros(1, model.conv1.in_channels, image_size, image_size))
+    finally:
+        for handle in handles:
+            handle.remove()
+        model.train(was_training)
+    return 2 * sum(macs)
+
+
+def is_pareto(row, rows):
+    """True jika tidak ada baris lain yang sama/lebih baik di semua sumbu dan lebih baik di salah satunya."""
+    def no_worse(a, b):
+        return a['accuracy'] >= b['accuracy'] and a['params'] <= b['params'] and a['latency_ms'] <= b['latency_ms']
+
+    def better(a, b):
+        return a['accuracy'] > b['accuracy'] or a['params'] < b['params'] or a['latency_ms'] < b['latency_ms']
+    return not any(other is not row and no_worse(other, row) and better(other, row) for other in rows)
+
+
+def measure(name, ratio, model, val_dataset, iters, accuracy_before=None):
+    model = model.cpu().eval()
+    size = model.image_size
+    single = torch.randn(1, model.conv1.in_channels, size, size)
+    batched = torch.randn(LATENCY_BATCH, model.conv1.in_channels, size, size)
+    latency, _ = benchmark(model, single, iters)
+    _, throughput = benchmark(model, batched, max(iters // 4, 10))
+    accuracy = evaluate_accuracy(model, val_dataset)
+    return {
+        'name': name,
+        'ratio': ratio,
+        'widths': '/'.join(map(str, model.widths)),
+        'params': count_parameters(model),
+        'mflops': count_flops(model, size) / 1e6,
+        'latency_ms': latency,
+        'throughput': throughput,
+        'accuracy_before_finetune': accuracy if accuracy_before is None else accuracy_before,
+        'accuracy': accuracy,
+    }
+
+
+def print_table(rows):
+    print(f"\n{'Model':<14} {'Lebar':<18} {'Parameter':>10} {'MFLOPs':>8} {'Latency b=1 (ms)':>17} "
+          f"{f'b={LATENCY_BATCH} (sampel/detik)':>24} {'Akurasi awal':>13} {'Akurasi':>8}  Pareto")
+    for row in rows:
+        print(f"{row['name']:<14} {row['widths']:<18} {row['params']:>10,} {row['mflops']:>8.2f} "
+              f"{row['latency_ms']:>17.3f} {row['throughput']:>24.0f} {row['accuracy_before_finetune']:>12.2f}% "
+              f"{row['accuracy']:>7.2f}%  {'⭐' if row['pareto'] else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Structured pruning + fine-tuning SimpleCNN dengan tabel Pareto")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--ratios', type=float, nargs='+', default=list(RATIOS),
+                        help="fraksi filter/neuron yang dibuang per layer (0-1)")
+    parser.add_argument('--criterion', choices=['bn', 'l1'], default=CRITERION,
+                        help="ranking: |gamma| BatchNorm atau norma L1 bobot")
+    parser.add_argument('--epochs', type=int, default=FINETUNE_EPOCHS, help="epoch fine-tuning (0 = tanpa)")
+    parser.add_argument('--learning-rate', type=float, default=FINETUNE_LR)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--patience', type=int, default=FINETUNE_PATIENCE)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--iters', type=int, default=200, help="iterasi pengukuran latency")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    os.makedirs(args.output_dir, exist_ok=True)
+    model = load_simple_cnn(args.checkpoint)
+    val_dataset = checkpoint_dataset('test', model)  # Sama dengan split validasi train()
+    rows = [measure('asli', 0.0, model, val_dataset, args.iters)]
+
+    for ratio in args.ratios:
+        widths = pruned_widths(model.widths, ratio)
+        pruned = prune_simple_cnn(model, widths, args.criterion)
+        accuracy_before = evaluate_accuracy(pruned, val_dataset)
+        path = os.path.join(args.output_dir, f"pruned_{ratio:g}.pth")
+        print(f"\n--- Rasio {ratio:g}: lebar {model.widths} → {widths} "
+              f"(akurasi sebelum fine-tuning {accuracy_before:.2f}%) ---")
+        if args.epochs > 0:
+            train(epochs=args.epochs, batch_size=args.batch_size, learning_rate=args.learning_rate,
+                  dropout_rate=pruned.dropout1.p, early_stop_patience=args.patience, plot=False,
+                  checkpoint_every=0, widths=widths, initial_state_dict=pruned.state_dict(),
+                  best_model_path=path, classes=list(model.class_names.values()),
+                  multilabel=model.task == 'multilabel', image_size=model.image_size)
+        else:
+            torch.save({'model_state_dict': pruned.state_dict(), 'widths': widths, 'task': model.task,
+                        'class_names': model.class_names, 'image_size': model.image_size}, path)
+        # Muat ulang dari file: memastikan arsitektur hasil pruning bisa dibangun tanpa edit model.py
+        rows.append(measure(f"pruned {ratio:g}", ratio, load_simple_cnn(path), val_dataset, args.iters,
+                            accuracy_before))
+
+    for row in rows:
+        row['pareto'] = is_pareto(row, rows)
+    print(f"\n--- Pareto akurasi vs ukuran/latency (split test, {len(val_dataset)} sampel, {model.task}, "
+          f"{model.image_size}x{model.image_size}, "
+          f"{torch.get_num_threads()} thread, kriteria {args.criterion}) ---")
+    print_table(rows)
+
+    results_path = os.path.join(args.output_dir, RESULTS_FILE)
+    with open(results_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"\n✅ Model hasil pruning dan tabel disimpan di '{args.output_dir}/' ({RESULTS_FILE})")
+
+
+if __name__ == '__main__':
+    main()
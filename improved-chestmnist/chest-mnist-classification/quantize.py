@@ -0,0 +1,188 @@
+# quantize.py
+#
+# Post-training quantization INT8 SimpleCNN untuk inferensi CPU:
+#   - static : BN dilipat ke conv/linear, fuse conv+relu & linear+relu, kalibrasi pada
+#              sampel split 'train', lalu semua layer dijalankan dalam int8
+#   - dynamic: hanya fc1/fc2/fc3 yang dikuantisasi (bobot int8, aktivasi dikuantisasi saat runtime)
+# Hasilnya disimpan sebagai checkpoint terpisah di samping best_model.pth, lalu akurasi dan
+# latency dibandingkan dengan FP32 pada split 'test' (task, kelas dan resolusi dari checkpoint).
+
+import argparse
+import os
+import warnings
+import torch
+from torch.ao.quantization import (
+    DeQuantStub, QuantStub, convert, fuse_modules, get_default_qconfig, prepare, quantize_dynamic,
+)
+from datareader import FilteredBinaryDataset
+from export import benchmark
+from model import DEFAULT_WIDTHS, AdaptiveSimpleCNN, FusedSimpleCNN, SimpleCNN, load_simple_cnn
+
+CHECKPOINT_PATH = 'best_model.pth'
+CALIBRATION_SAMPLES = 1024
+DYNAMIC_LAYERS = {'fc1', 'fc2', 'fc3'}
+FUSE_PATTERNS = [['conv1', 'relu1'], ['conv2', 'relu2'], ['conv3', 'relu3'],
+                 ['fc1', 'relu_fc1'], ['fc2', 'relu_fc2']]
+
+
+class QuantizableSimpleCNN(FusedSimpleCNN):
+    """FusedSimpleCNN dengan QuantStub/DeQuantStub: input dan output tetap float."""
+    def __init__(self, model: SimpleCNN):
+        super().__init__(model)
+        self.quant = QuantStub()
+        self.dequant = DeQuantStub()
+
+    def forward(self, x):
+        return self.dequant(super().forward(self.quant(x)))
+
+
+def quantized_path(checkpoint_path, mode):
+    """best_model.pth → best_model_int8_static.pth / best_model_int8_dynamic.pth"""
+    root, ext = os.path.splitext(checkpoint_path)
+    return f"{root}_int8_{mode}{ext}"
+
+
+def _prepare_static(model, engine):
+    qmodel = QuantizableSimpleCNN(model)
+    fuse_modules(qmodel, FUSE_PATTERNS, inplace=True)
+    qmodel.qconfig = get_default_qconfig(engine)
+    return prepare(qmodel)
+
+
+def quantize_static(model, calibration_images, engine=None, batch_size=256):
+    """Kuantisasi statis: kalibrasi observer dengan `calibration_images` (N, C, H, W) lalu convert."""
+    engine = engine or torch.backends.quantized.engine
+    torch.backends.quantized.engine = engine
+    prepared = _prepare_static(model, engine)
+    with torch.inference_mode():
+        for start in range(0, len(calibration_images), batch_size):
+            prepared(calibration_images[start:start + batch_size])
+    return convert(prepared)
+
+
+def quantize_dynamic_fc(model):
+    """Kuantisasi dinamis untuk fc1/fc2/fc3 (bobot int8) pada model yang BN-nya sudah dilipat."""
+    return quantize_dynamic(FusedSimpleCNN(model), DYNAMIC_LAYERS, dtype=torch.qint8)
+
+
+def save_quantized(qmodel, path, mode, template):
+    torch.save({
+        'mode': mode,
+        'engine': torch.backends.quantized.engine,
+        'in_channels': template.conv1.in_channels,
+        'num_classes': 2 if template.fc3.out_features == 1 else template.fc3.out_features,
+        'widths': template.widths,
+        'image_size': getattr(template, 'image_size', 28),
+        'model_state_dict': qmodel.state_dict(),
+    }, path)
+
+
+def load_quantized(path):
+    """Bangun ulang struktur model terkuantisasi lalu muat bobot int8 dari `path`."""
+    checkpoint = torch.load(path, map_location='cpu', weights_only=False)
+    image_size = checkpoint.get('image_size', 28)
+    model_class = SimpleCNN if image_size == 28 else AdaptiveSimpleCNN
+    template = model_class(in_channels=checkpoint['in_channels'], num_classes=checkpoint['num_classes'],
+                           widths=checkpoint.get('widths', DEFAULT_WIDTHS)).eval()
+    template.image_size = image_size
+    if checkpoint['mode'] == 'static':
+        torch.backends.quantized.engine = checkpoint['engine']
+        # Struktur dibangun tanpa kalibrasi (scale/zero point ditimpa load_state_dict di bawah), jadi
+        # peringatan observer yang belum pernah dijalankan tidak relevan
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='must run observer before calling calculate_qparams')
+            qmodel = convert(_prepare_static(template, checkpoint['engine']))
+    else:
+        qmodel = quantize_dynamic_fc(template)
+    qmodel.load_state_dict(checkpoint['model_state_dict'])
+    return qmodel.eval()
+
+
+def checkpoint_dataset(split, model):
+    """FilteredBinaryDataset (preload) dengan task, kelas dan resolusi checkpoint `model` (lihat load_simple_cnn)."""
+    return FilteredBinaryDataset(split, preload=True, size=model.image_size,
+                                 classes=list(model.class_names.values()), multilabel=model.task == 'multilabel')
+
+
+def evaluate_accuracy(model, dataset, batch_size=256):
+    """
+    Akurasi (%) sesuai dataset.task, sama seperti di train(): biner `outputs > 0`, multi-kelas
+    argmax, multi-label `outputs > 0` per label (dibagi jumlah sampel x jumlah kelas).
+    """
+    correct = 0
+    total = 0
+    with torch.inference_mode():
+        for start in range(0, len(dataset), batch_size):
+            images, labels = dataset.get_batch(torch.arange(start, min(start + batch_size, len(dataset))))
+            outputs = model(images)
+            if dataset.task == 'multiclass':
+                correct += (outputs.argmax(dim=1) == labels).sum().item()
+            else:
+                correct += ((outputs > 0).long() == labels).sum().item()
+            total += labels.numel()
+    return 100 * correct / total
+
+
+def _state_dict_size_mb(model):
+    total = 0
+    for value in model.state_dict().values():
+        if isinstance(value, torch.Tensor):
+            total += value.numel() * value.element_size()
+        elif isinstance(value, tuple):
+            # Packed params Linear terkuantisasi: (bobot, bias)
+            total += sum(t.numel() * t.element_size() for t in value if isinstance(t, torch.Tensor))
+    return total / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post-training quantization INT8 untuk SimpleCNN")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--mode', choices=['static', 'dynamic', 'both'], default='both')
+    parser.add_argument('--calibration-samples', type=int, default=CALIBRATION_SAMPLES)
+    parser.add_argument('--batch-size', type=int, default=256, help="batch untuk pengukuran throughput")
+    parser.add_argument('--iters', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    model = load_simple_cnn(args.checkpoint)
+
+    variants = [('fp32', model)]
+    if args.mode in ('static', 'both'):
+        train_dataset = checkpoint_dataset('train', model)
+        n_calib = min(args.calibration_samples, len(train_dataset))
+        calib_idx = torch.randperm(len(train_dataset))[:n_calib]
+        calibration_images, _ = train_dataset.get_batch(calib_idx)
+        static = quantize_static(model, calibration_images)
+        path = quantized_path(args.checkpoint, 'static')
+        save_quantized(static, path, 'static', model)
+        print(f"✅ Model INT8 statis ({n_calib} sampel kalibrasi) disimpan sebagai '{path}'")
+        variants.append(('int8 static', load_quantized(path)))
+    if args.mode in ('dynamic', 'both'):
+        dynamic = quantize_dynamic_fc(model)
+        path = quantized_path(args.checkpoint, 'dynamic')
+        save_quantized(dynamic, path, 'dynamic', model)
+        print(f"✅ Model INT8 dinamis (fc1/fc2/fc3) disimpan sebagai '{path}'")
+        variants.append(('int8 dynamic', load_quantized(path)))
+
+    test_dataset = checkpoint_dataset('test', model)
+    in_channels, size = model.conv1.in_channels, model.image_size
+    single = torch.randn(1, in_channels, size, size)
+    batched = torch.randn(args.batch_size, in_channels, size, size)
+
+    print(f"\n--- FP32 vs INT8 pada split test ({len(test_dataset)} sampel, "
+          f"{torch.get_num_threads()} thread, engine {torch.backends.quantized.engine}) ---")
+    print(f"{'Varian':<14} {'Akurasi':>9} {'Δ Akurasi':>10} {'Ukuran (MB)':>12} "
+          f"{'Latency b=1 (ms)':>17} {f'b={args.batch_size} (sampel/detik)':>24} {'Speedup':>8}")
+    base = None
+    for name, module in variants:
+        accuracy = evaluate_accuracy(module, test_dataset)
+        latency, _ = benchmark(module, single, args.iters)
+        _, throughput = benchmark(module, batched, max(args.iters // 4, 10))
+        base = base or (accuracy, throughput)
+        print(f"{name:<14} {accuracy:>8.2f}% {accuracy - base[0]:>+9.2f}% {_state_dict_size_mb(module):>12.3f} "
+              f"{latency:>17.3f} {throughput:>24.0f} {throughput / base[1]:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+# reporting.py
+#
+# Plot training di proses terpisah agar training loop tidak pernah menunggu matplotlib.
+# Proses utama hanya mengirim data kecil lewat queue (metrics per epoch, satu batch prediksi
+# berupa array numpy); proses reporter merender PNG dengan backend non-interaktif (Agg), jadi
+# aman di node headless. training_history.png diperbarui setiap epoch. Dengan live=True,
+# plot juga ditampilkan di jendela yang diperbarui selama training (jika ada display).
+#
+# Penggunaan (lihat train.py):
+#   reporter = Reporter(live=False)
+#   reporter.log_epoch(1, train_loss=0.5, val_loss=0.4, train_acc=80.0, val_acc=85.0)
+#   reporter.log_predictions(collect_val_predictions(model, val_loader))   # utils.py
+#   reporter.close()   # tunggu render terakhir selesai
+#
+# matplotlib hanya diimpor di proses reporter / saat render, tidak saat modul ini diimpor.
+
+import math
+import multiprocessing
+import os
+import queue
+import sys
+import types
+import numpy as np
+
+REPORT_DPI = 120  # Cukup tajam untuk laporan; dpi 300 membuat render ~6x lebih lambat
+HISTORY_FILE = 'training_history.png'
+PREDICTIONS_FILE = 'val_predictions.png'
+CLOSE_TIMEOUT = 60  # Detik menunggu render terakhir saat close()
+LIVE_REFRESH = 0.2  # Detik antar pemrosesan event GUI di mode live
+REPORTER_NICENESS = 10  # Tambahan nice value proses reporter (Unix)
+
+
+class Reporter:
+    """
+    Antarmuka proses utama ke proses reporter. Semua method hanya memasukkan pesan ke queue
+    (tidak menunggu render). Pesan yang menumpuk selama satu render digabung, sehingga reporter
+    yang lambat tidak pernah membuat antrean render panjang.
+    """
+    def __init__(self, output_dir='.', live=False, dpi=REPORT_DPI):
+        self.output_dir = output_dir
+        self.paths = []
+        # 'spawn', bukan 'fork': fork dari proses yang sudah punya thread pool torch/OpenMP (atau
+        # context CUDA) bisa deadlock. Proses spawn biasanya mengimpor ulang script utama (train.py
+        # beserta torch); __main__ disembunyikan selama start() sehingga reporter hanya mengimpor
+        # modul ini (numpy) dan matplotlib.
+        context = multiprocessing.get_context('spawn')
+        self._queue = context.Queue()
+        self._process = context.Process(target=_report_worker, args=(self._queue, output_dir, live, dpi),
+                                        name='reporter', daemon=True)
+        main_module = sys.modules['__main__']
+        sys.modules['__main__'] = types.ModuleType('__main__')
+        try:
+            self._process.start()
+        finally:
+            sys.modules['__main__'] = main_module
+
+    def _send(self, kind, payload, filename):
+        self._queue.put((kind, payload))
+        path = os.path.join(self.output_dir, filename)
+        if path not in self.paths:
+            self.paths.append(path)
+
+    def log_epoch(self, epoch, **metrics):
+        """Metrics satu epoch (angka biasa: loss, akurasi, val_roc_auc, lr, ...)."""
+        self._send('epoch', {'epoch': epoch, **metrics}, HISTORY_FILE)
+
+    def log_predictions(self, batch):
+        """Batch prediksi dari utils.collect_val_predictions (array numpy)."""
+        self._send('predictions', batch, PREDICTIONS_FILE)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Hentikan reporter setelah semua pesan dirender. Return list file yang ditulis."""
+        if self._process is None:
+            return self.paths
+        self._queue.put(None)
+        self._process.join(timeout)
+        if self._process.is_alive():
+            print(f"⚠️  Reporter belum selesai setelah {timeout} detik, dihentikan")
+            self._process.terminate()
+        self._process = None
+        return [path for path in self.paths if os.path.exists(path)]
+
+
+def _report_worker(messages, output_dir, live, dpi):
+    # Prioritas rendah: di mesin dengan core terbatas, render tidak merebut CPU dari training
+    if hasattr(os, 'nice'):
+        os.nice(REPORTER_NICENESS)
+    import matplotlib
+    if live:
+        # pyplot (dan backend GUI) hanya diimpor untuk mode live; render file cukup memakai Figure
+        import matplotlib.pyplot as plt
+        live = matplotlib.get_backend().lower() != 'agg'
+        if live:
+            plt.ion()
+            history_fig = plt.figure('Training History', figsize=(18, 5))
+            predictions_fig = None
+        else:
+            print("⚠️  Tidak ada display untuk live plot; plot hanya disimpan ke file")
+    else:
+        matplotlib.use('Agg')
+
+    records = {}
+    batch = None
+    done = False
+    while not done:
+        try:
+            pending = [messages.get(timeout=LIVE_REFRESH if live else None)]
+        except queue.Empty:
+            plt.pause(0.001)
+            continue
+        # Gabungkan semua pesan yang sudah menunggu menjadi satu render
+        while True:
+            try:
+                pending.append(messages.get_nowait())
+            except queue.Empty:
+                break
+        history_changed = False
+        new_batch = None
+        for message in pending:
+            if message is None:
+                done = True
+                break
+            kind, payload = message
+            if kind == 'epoch':
+                records[payload['epoch']] = payload
+                history_changed = True
+            elif kind == 'predictions':
+                new_batch = batch = payload
+
+        try:
+            if history_changed:
+                history = [records[epoch] for epoch in sorted(records)]
+                render_training_history(history, os.path.join(output_dir, HISTORY_FILE), dpi)
+                if live:
+                    history_fig.clear()
+                    render_training_history(history, fig=history_fig)
+            if new_batch is not None:
+                render_predictions(batch, os.path.join(output_dir, PREDICTIONS_FILE), dpi)
+                if live:
+                    if predictions_fig is None:
+                        predictions_fig = plt.figure('Validation Predictions')
+                    predictions_fig.clear()
+                    render_predictions(batch, fig=predictions_fig)
+            if live:
+                plt.pause(0.001)
+        except Exception as exc:
+            # Gagal render tidak boleh menghentikan reporter (training tetap jalan)
+            print(f"⚠️  Reporter gagal merender plot: {exc!r}")
+
+
+def render_training_history(records, path=None, dpi=REPORT_DPI, fig=None):
+    """Plot loss dan akurasi (serta ROC-AUC validasi jika ada) dari list metrics per epoch."""
+    has_auc = any(not math.isnan(r.get('val_roc_auc', math.nan)) for r in records)
+    n_panels = 3 if has_auc else 2
+    if fig is None:
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(7.5 * n_panels, 5))
+    axes = fig.subplots(1, n_panels)
+    epochs_range = [r['epoch'] for r in records]
+
+    panels = [
+        (axes[0], 'train_loss', 'val_loss', 'Loss', 'Training dan Validation Loss'),
+        (axes[1], 'train_acc', 'val_acc', 'Accuracy (%)', 'Training dan Validation Accuracy'),
+    ]
+    for ax, train_key, val_key, ylabel, title in panels:
+        name = ylabel.split(' ')[0]
+        ax.plot(epochs_range, [r[train_key] for r in records], 'b-', label=f'Training {name}', linewidth=2)
+        ax.plot(epochs_range, [r[val_key] for r in records], 'r-', label=f'Validation {name}', linewidth=2)
+        ax.set_ylabel(ylabel, fontsize=12)
+        ax.set_title(title, fontsize=14, fontweight='bold')
+    if has_auc:
+        ax = axes[2]
+        ax.plot(epochs_range, [r.get('val_roc_auc', math.nan) for r in records], 'g-',
+                label='Validation ROC-AUC', linewidth=2)
+        ax.set_ylabel('ROC-AUC (macro)', fontsize=12)
+        ax.set_title('Validation ROC-AUC', fontsize=14, fontweight='bold')
+    for ax in axes:
+        ax.set_xlabel('Epoch', fontsize=12)
+        ax.legend(fontsize=10)
+        ax.grid(True, alpha=0.3)
+
+    fig.tight_layout()
+    if path is not None:
+        fig.savefig(path, dpi=dpi, bbox_inches='tight')
+    return fig
+
+
+def _display_image(img):
+    # (C, H, W) → gambar yang dinormalisasi ke [0, 1] untuk imshow
+    img = np.moveaxis(img, 0, -1) if img.ndim == 3 else img
+    img = (img - img.min()) / (img.max() - img.min() + 1e-8)
+    if img.ndim == 3 and img.shape[2] == 1:
+        return img[..., 0], 'gray'
+    return img, 'gray' if img.ndim == 2 else None
+
+
+def _format_gt(label, task, class_names):
+    if label is None:
+        return '-'
+    label = np.asarray(label, dtype=np.float32).reshape(-1)
+    if task == 'binary':
+        v = int(label[0] >= 0.5)
+        return class_names.get(v, str(v))
+    if task == 'multiclass':
+        v = int(label[0])
+        return class_names.get(v, str(v))
+    chosen = np.flatnonzero(label >= 0.5).tolist()
+    if not chosen:
+        return '[]'
+    names = [class_names.get(ci, str(ci)) for ci in chosen]
+    if len(names) > 3:
+        names = names[:3] + ['…']
+    return '[' + ', '.join(names) + ']'
+
+
+def _prediction_lines(p, task, class_names):
+    if task == 'binary':
+        p_scalar = float(p[0])
+        pred_idx = 1 if p_scalar >= 0.5 else 0
+        p_pred = p_scalar if pred_idx == 1 else (1 - p_scalar)
+        return f"Pred: {class_names.get(pred_idx, str(pred_idx))}", f"Prob: {p_pred:.2f}"
+    chosen = np.flatnonzero(p >= 0.5).tolist() if task == 'multilabel' else []
+    if not chosen:
+        top1 = int(np.argmax(p))
+        return f"Pred: {class_names.get(top1, str(top1))}", f"Prob: {p[top1]:.2f}"
+    chosen_sorted = sorted(chosen, key=lambda ci: float(p[ci]), reverse=True)
+    name_parts = [class_names.get(ci, str(ci)) for ci in chosen_sorted[:2]]
+    prob_parts = [f"{p[ci]:.2f}" for ci in chosen_sorted[:2]]
+    if len(chosen_sorted) > 2:
+        name_parts.append('…')
+        prob_parts.append('…')
+    return "Pred: " + ", ".join(name_parts), "Prob: " + ", ".join(prob_parts)
+
+
+def render_predictions(batch, path=None, dpi=REPORT_DPI, fig=None):
+    """
+    Grid gambar validasi dengan 3 baris teks berwarna: Pred (biru), Prob (oranye), GT (hijau).
+    - binary: kelas prediksi dan probabilitasnya; multiclass: top-1 softmax;
+      multilabel: hingga 2 kelas dengan p>=0.5 (jika tidak ada, top-1).
+    """
+    images, labels, probs = batch['images'], batch['labels'], batch['probs']
+    task, class_names = batch['task'], batch['class_names']
+    k = len(images)
+    cols = 5
+    rows = math.ceil(k / cols)
+    if fig is None:
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(cols * 3, rows * 3))
+    axes = np.atleast_1d(fig.subplots(rows, cols)).reshape(-1)
+
+    for i, ax in enumerate(axes):
+        ax.axis('off')
+        if i >= k:
+            continue
+        disp_img, cmap = _display_image(images[i])
+        ax.imshow(disp_img, cmap=cmap)
+        pred_line, prob_line = _prediction_lines(probs[i], task, class_names)
+        gt_line = f"GT: {_format_gt(None if labels is None else labels[i], task, class_names)}"
+
+        # Tiga baris teks berwarna untuk keterbacaan
+        y0 = 0.98
+        dy = 0.10
+        for j, (line, color) in enumerate(((pred_line, 'tab:blue'), (prob_line, 'tab:orange'),
+                                           (gt_line, 'tab:green'))):
+            ax.text(0.02, y0 - j * dy, line, transform=ax.transAxes, va='top', ha='left', fontsize=9,
+                    color=color, bbox=dict(facecolor='white', alpha=0.6, edgecolor='none', pad=1.5))
+
+    fig.tight_layout()
+    if path is not None:
+        fig.savefig(path, dpi=dpi, bbox_inches='tight')
+    return fig
@@ -0,0 +1,264 @@
+# serve.py
+#
+# Server HTTP lokal untuk inferensi SimpleCNN dengan dynamic micro-batching.
+# Checkpoint best_model.pth dimuat sekali saat startup. Request gambar tunggal yang datang
+# bersamaan dikumpulkan menjadi satu batch (maksimal --max-batch-size, menunggu paling lama
+# --max-wait-ms) lalu diproses dengan satu forward pass di bawah torch.inference_mode().
+#
+# Endpoint:
+#   POST /predict  body: file gambar (png/jpg/...), atau JSON {"image": [[...piksel 0-255...]]}
+#                  (ukuran image_size x image_size checkpoint, default 28x28; file gambar di-resize)
+#                  → biner: {"logit": ..., "prob": ..., "label": ...}
+#                  → multi-kelas/multi-label: {"logits": [...], "probs": {kelas: prob}, "label": ...}
+#                    (label multi-label = list kelas dengan prob > 0.5)
+#   GET  /metrics  → persentil latency (p50/p95/p99), histogram ukuran batch dan hit rate cache
+#   GET  /health
+#
+# Gambar yang sudah pernah diprediksi dengan model yang sama dilayani dari cache prediksi (cache.py):
+# setiap micro-batch dipecah menjadi hit dan miss, dan hanya miss yang di-forward.
+
+import argparse
+import collections
+import io
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import torch
+from cache import CACHE_CAPACITY, PredictionCache, model_fingerprint
+from inference import CHECKPOINT_PATH, IMAGE_SIZE, decode_logits, forward_logits, load_model, model_task, to_model_input
+from predict import decode_image
+
+HOST = '127.0.0.1'
+PORT = 8000
+MAX_BATCH_SIZE = 64
+MAX_WAIT_MS = 5.0
+LATENCY_WINDOW = 10000  # Jumlah latency terakhir yang disimpan untuk persentil
+
+
+class ServingMetrics:
+    """Latency per request (jendela geser) dan histogram ukuran batch, aman untuk banyak thread."""
+    def __init__(self, window=LATENCY_WINDOW):
+        self.lock = threading.Lock()
+        self.latencies_ms = collections.deque(maxlen=window)
+        self.batch_sizes = collections.Counter()
+        self.requests = 0
+        self.batches = 0
+
+    def record_batch(self, size):
+        with self.lock:
+            self.batch_sizes[size] += 1
+            self.batches += 1
+
+    def record_latency(self, latency_ms):
+        with self.lock:
+            self.latencies_ms.append(latency_ms)
+            self.requests += 1
+
+    def snapshot(self):
+        with self.lock:
+            latencies = np.array(self.latencies_ms, dtype=np.float64)
+            batch_sizes = dict(sorted(self.batch_sizes.items()))
+            requests, batches = self.requests, self.batches
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]).tolist()
+        else:
+            p50 = p95 = p99 = None
+        return {
+            'requests': requests,
+            'batches': batches,
+            'mean_batch_size': requests / batches if batches else None,
+            'latency_ms': {'p50': p50, 'p95': p95, 'p99': p99, 'window': len(latencies)},
+            'batch_size_histogram': {str(k): v for k, v in batch_sizes.items()},
+        }
+
+
+class MicroBatcher:
+    """
+    Mengumpulkan request tunggal menjadi micro-batch di satu thread worker.
+    submit() mengembalikan Future berisi dict hasil JSON sesuai task model (lihat prediction_payload).
+    Dengan `cache` (PredictionCache), hanya gambar yang belum ada di cache yang di-forward.
+    """
+    def __init__(self, model, device, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, metrics=None,
+                 cache=None):
+        self.model = model.eval()
+        self.task, self.class_names = model_task(model)
+        self.image_size = getattr(model, 'image_size', IMAGE_SIZE)
+        self.device = device
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = metrics or ServingMetrics()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    def submit(self, image):
+        """`image`: tensor ternormalisasi (1, H, W)."""
+        future = Future()
+        self.queue.put((image, future))
+        return future
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _collect(self):
+        first = self.queue.get()
+        if first is None:
+            return None
+        items = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)  # Proses batch ini dulu, lalu berhenti
+                break
+            items.append(item)
+        return items
+
+    def _worker(self):
+        while True:
+            items = self._collect()
+            if items is None:
+                return
+            images = torch.stack([image for image, _ in items])
+            try:
+                logits = forward_logits(self.model, images, self.device, self.cache)
+                probs, labels = decode_logits(logits, self.task, self.class_names)
+            except Exception as exc:
+                for _, future in items:
+                    future.set_exception(exc)
+                continue
+            self.metrics.record_batch(len(items))
+            for (_, future), logit, prob, label in zip(items, logits.tolist(), probs.tolist(), labels):
+                future.set_result(self.prediction_payload(logit, prob, label))
+
+    def prediction_payload(self, logit, prob, label):
+        if self.task == 'binary':
+            return {'logit': logit, 'prob': prob, 'label': label}
+        return {'logits': logit, 'probs': dict(zip(self.class_names.values(), prob)),
+                'label': list(label) if self.task == 'multilabel' else label}
+
+
+def parse_image(body, content_type, size=IMAGE_SIZE):
+    """Body request → tensor ternormalisasi (1, size, size); file gambar di-resize ke `size`."""
+    if content_type.startswith('application/json'):
+        pixels = np.asarray(json.loads(body)['image'])
+        if pixels.shape != (size, size):
+            raise ValueError(f"'image' harus berukuran {size}x{size}, didapat {pixels.shape}")
+        # Bilangan bulat = piksel 0-255, bilangan pecahan = piksel yang sudah di rentang [0, 1]
+        if np.issubdtype(pixels.dtype, np.integer):
+            if pixels.min() < 0 or pixels.max() > 255:
+                raise ValueError("piksel bilangan bulat harus di rentang 0-255")
+            pixels = pixels.astype(np.uint8)
+        elif np.issubdtype(pixels.dtype, np.floating):
+            if not (pixels.min() >= 0 and pixels.max() <= 1):   # juga menolak NaN
+                raise ValueError("piksel bilangan pecahan harus di rentang [0, 1]")
+            pixels = pixels.astype(np.float32)
+        else:
+            raise ValueError(f"'image' harus berisi angka, didapat dtype {pixels.dtype}")
+    else:
+        pixels = decode_image(io.BytesIO(body), size)
+    return to_model_input(pixels[None])[0]
+
+
+def make_handler(batcher, timeout=30.0):
+    class InferenceHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                metrics = batcher.metrics.snapshot()
+                if batcher.cache is not None:
+                    metrics['cache'] = batcher.cache.stats()
+                self._send_json(200, metrics)
+            elif self.path == '/health':
+                self._send_json(200, {'status': 'ok'})
+            else:
+                self._send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._send_json(404, {'error': 'not found'})
+                return
+            start = time.perf_counter()
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                image = parse_image(body, self.headers.get('Content-Type', ''), batcher.image_size)
+            except Exception as exc:
+                self._send_json(400, {'error': f'gambar tidak valid: {exc}'})
+                return
+            try:
+                result = batcher.submit(image).result(timeout=timeout)
+            except Exception as exc:
+                self._send_json(500, {'error': str(exc)})
+                return
+            batcher.metrics.record_latency((time.perf_counter() - start) * 1000)
+            self._send_json(200, result)
+
+        def log_message(self, format, *args):
+            pass  # Jangan cetak log per request
+
+    return InferenceHandler
+
+
+class InferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Backlog listen() yang cukup untuk banyak klien bersamaan
+
+
+def serve(checkpoint=CHECKPOINT_PATH, host=HOST, port=PORT, max_batch_size=MAX_BATCH_SIZE,
+          max_wait_ms=MAX_WAIT_MS, device=None, cache_size=CACHE_CAPACITY, cache_db=None, cache_purge=False):
+    device = torch.device(device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+    model = load_model(checkpoint, device)
+    cache = PredictionCache(model_fingerprint(model), cache_size, cache_db, cache_purge) if cache_size > 0 else None
+    batcher = MicroBatcher(model, device, max_batch_size, max_wait_ms, cache=cache)
+    server = InferenceServer((host, port), make_handler(batcher))
+    print(f"Model '{checkpoint}' dimuat di {device}")
+    print(f"Server berjalan di http://{host}:{server.server_address[1]} "
+          f"(max batch {max_batch_size}, max wait {max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        if cache is not None:
+            cache.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Server HTTP lokal SimpleCNN dengan micro-batching")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--cache-size', type=int, default=CACHE_CAPACITY,
+                        help="entri LRU cache prediksi di memori (0 = tanpa cache)")
+    parser.add_argument('--cache-db', default=None, help="file SQLite untuk cache prediksi yang persisten")
+    parser.add_argument('--cache-purge', action='store_true',
+                        help="hapus prediksi model lain (fingerprint berbeda) dari --cache-db")
+    args = parser.parse_args()
+    serve(args.checkpoint, args.host, args.port, args.max_batch_size, args.max_wait_ms, args.device,
+          args.cache_size, args.cache_db, args.cache_purge)
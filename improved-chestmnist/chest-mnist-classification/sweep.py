@@ -0,0 +1,211 @@
+# sweep.py
+#
+# Hyperparameter sweep untuk train.py (grid atau random search). Trial dijalankan bersamaan di
+# process pool dengan jumlah worker = core // thread per trial.
+#   - Dataset terfilter dibuat sekali sebagai cache .npy di proses utama. Setiap trial membukanya
+#     sebagai memmap, sehingga halaman memorinya dibagi antar proses (tidak ada trial yang
+#     membangun FilteredBinaryDataset dari npz sendiri).
+#   - Trial yang kurva validasinya jelek dihentikan lebih awal (median stopping rule).
+#   - Semua hasil ditulis ke satu tabel CSV; artefak tiap trial (best_model.pth, train.log)
+#     ada di folder trial_XXX masing-masing.
+#
+# Spesifikasi sweep (JSON):
+#   {"method": "random", "n_trials": 16, "seed": 0,
+#    "parameters": {"learning_rate": {"min": 1e-4, "max": 1e-2, "log": true},
+#                   "dropout_rate": [0.2, 0.3, 0.5],
+#                   "batch_size": [32, 64, 128],
+#                   "epochs": 15}}
+#   - list: pilihan nilai (grid: semua kombinasi, random: dipilih acak)
+#   - {"min", "max", "log", "int"}: rentang kontinu (hanya untuk random search)
+#   - nilai tunggal: tetap untuk semua trial
+#
+# Penggunaan:
+#   python sweep.py sweep.json --threads-per-trial 1
+
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import torch
+from datareader import load_filtered_split
+
+SWEEP_PARAMETERS = ('epochs', 'batch_size', 'learning_rate', 'dropout_rate', 'early_stop_patience')
+OUTPUT_DIR = 'sweep'
+RESULTS_FILE = 'sweep_results.csv'
+THREADS_PER_TRIAL = 1
+PRUNE_WARMUP_EPOCHS = 2  # Tidak ada pruning sebelum epoch ini selesai
+PRUNE_MIN_TRIALS = 3  # Minimal jumlah trial pembanding pada epoch yang sama
+
+
+def _sample(value, rng):
+    if isinstance(value, list):
+        return rng.choice(value)
+    if isinstance(value, dict):
+        low, high = value['min'], value['max']
+        if value.get('log'):
+            sampled = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            sampled = rng.uniform(low, high)
+        return int(round(sampled)) if value.get('int') else sampled
+    return value
+
+
+def make_trials(spec):
+    """Spesifikasi sweep → list dict hyperparameter (argumen train())."""
+    parameters = spec['parameters']
+    unknown = set(parameters) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Parameter tidak dikenal: {sorted(unknown)} (pilihan: {', '.join(SWEEP_PARAMETERS)})")
+
+    method = spec.get('method', 'grid')
+    if method == 'grid':
+        names = list(parameters)
+        choices = []
+        for name in names:
+            value = parameters[name]
+            if isinstance(value, dict):
+                raise ValueError(f"'{name}': rentang min/max hanya bisa dipakai untuk random search")
+            choices.append(value if isinstance(value, list) else [value])
+        return [dict(zip(names, combo)) for combo in itertools.product(*choices)]
+    if method == 'random':
+        rng = random.Random(spec.get('seed', 0))
+        return [{name: _sample(value, rng) for name, value in parameters.items()}
+                for _ in range(spec['n_trials'])]
+    raise ValueError(f"method harus 'grid' atau 'random', didapat '{method}'")
+
+
+class MedianPruner:
+    """
+    Median stopping rule: setelah `warmup_epochs`, trial dihentikan jika val loss terbaiknya sejauh
+    ini lebih buruk dari median val loss terbaik trial lain pada epoch yang sama (minimal
+    `min_trials` pembanding). Kurva disimpan di dict milik multiprocessing.Manager agar terlihat
+    oleh semua worker.
+    """
+    def __init__(self, curves, lock, warmup_epochs=PRUNE_WARMUP_EPOCHS, min_trials=PRUNE_MIN_TRIALS):
+        self.curves = curves
+        self.lock = lock
+        self.warmup_epochs = warmup_epochs
+        self.min_trials = min_trials
+
+    def report(self, trial_id, epoch, val_loss):
+        """Catat val loss trial pada `epoch`; return True jika trial sebaiknya dihentikan."""
+        with self.lock:
+            curve = self.curves.get(trial_id, [])
+            best = min(curve[-1], val_loss) if curve else val_loss
+            self.curves[trial_id] = curve + [best]
+            others = [c[epoch - 1] for other_id, c in self.curves.items()
+                      if other_id != trial_id and len(c) >= epoch]
+        if epoch <= self.warmup_epochs or len(others) < self.min_trials:
+            return False
+        return best > statistics.median(others)
+
+
+def _run_trial(trial_id, params, trial_dir, threads, seed, pruner):
+    # Dijalankan di proses worker: satu folder per trial agar best_model.pth tidak saling menimpa
+    from train import train
+
+    os.makedirs(trial_dir, exist_ok=True)
+    os.chdir(trial_dir)
+    torch.set_num_threads(threads)
+    torch.manual_seed(seed)
+    start = time.perf_counter()
+    with open('train.log', 'w') as log_file, contextlib.redirect_stdout(log_file):
+        history = train(**params, plot=False, checkpoint_every=0,
+                        epoch_callback=lambda epoch, metrics: pruner.report(trial_id, epoch, metrics['val_loss']))
+    return {
+        'status': 'pruned' if history['pruned'] else 'selesai',
+        'epochs_run': history['epochs'],
+        'best_val_loss': history['best_val_loss'],
+        'best_val_acc': history['best_val_acc'],
+        'samples_per_s': history['samples_per_s'],
+        'time_s': time.perf_counter() - start,
+    }
+
+
+def run_sweep(spec, output_dir=OUTPUT_DIR, threads_per_trial=THREADS_PER_TRIAL, workers=None, seed=0):
+    trials = make_trials(spec)
+    workers = workers or max(1, (os.cpu_count() or 1) // threads_per_trial)
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Cache memmap dibuat sekali di sini; semua trial membuka file yang sama (split train dan test)
+    for split in ('train', 'test'):
+        load_filtered_split(split)
+
+    print(f"Sweep: {len(trials)} trial ({spec.get('method', 'grid')}), {workers} worker x "
+          f"{threads_per_trial} thread")
+    param_names = sorted({name for params in trials for name in params})
+    rows = []
+    # 'spawn': worker bersih tanpa state thread/OpenMP milik proses utama
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        pruner = MedianPruner(manager.dict(), manager.Lock())
+        futures = {}
+        for trial_id, params in enumerate(trials):
+            trial_dir = os.path.join(output_dir, f'trial_{trial_id:03d}')
+            future = executor.submit(_run_trial, trial_id, params, trial_dir, threads_per_trial,
+                                     seed + trial_id, pruner)
+            futures[future] = (trial_id, params)
+
+        for future in as_completed(futures):
+            trial_id, params = futures[future]
+            row = {'trial': trial_id, **params}
+            try:
+                row.update(future.result())
+            except Exception as exc:
+                row.update(status='gagal', error=str(exc))
+            rows.append(row)
+            described = ', '.join(f'{k}={v:g}' if isinstance(v, float) else f'{k}={v}' for k, v in params.items())
+            if row['status'] == 'gagal':
+                print(f"  trial {trial_id:03d} [{described}] gagal: {row['error']}")
+            else:
+                print(f"  trial {trial_id:03d} [{described}] {row['status']} setelah {row['epochs_run']} epoch | "
+                      f"Best Val Loss: {row['best_val_loss']:.4f} | Best Val Acc: {row['best_val_acc']:.2f}%")
+
+    rows.sort(key=lambda r: (r['status'] == 'gagal', r.get('best_val_loss', math.inf)))
+    results_path = os.path.join(output_dir, RESULTS_FILE)
+    columns = ['trial', *param_names, 'status', 'epochs_run', 'best_val_loss', 'best_val_acc',
+               'samples_per_s', 'time_s', 'error']
+    with open(results_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print_results(rows, param_names)
+    print(f"\n✅ Tabel hasil sweep disimpan ke '{results_path}'")
+    return rows
+
+
+def print_results(rows, param_names):
+    header = ''.join(f'{name:>20}' for name in param_names)
+    print(f"\n{'Trial':>5}{header} {'Status':>8} {'Epoch':>6} {'Val Loss':>9} {'Val Acc':>8}")
+    for row in rows:
+        values = ''.join(f"{row[name]:>20g}" if isinstance(row.get(name), (int, float)) else f"{'-':>20}"
+                         for name in param_names)
+        if row['status'] == 'gagal':
+            print(f"{row['trial']:>5}{values} {row['status']:>8}")
+            continue
+        print(f"{row['trial']:>5}{values} {row['status']:>8} {row['epochs_run']:>6} "
+              f"{row['best_val_loss']:>9.4f} {row['best_val_acc']:>7.2f}%")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep paralel untuk train.py")
+    parser.add_argument('spec', help="file JSON spesifikasi sweep")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--threads-per-trial', type=int, default=THREADS_PER_TRIAL)
+    parser.add_argument('--workers', type=int, default=None, help="default: core // thread per trial")
+    parser.add_argument('--seed', type=int, default=0, help="seed torch trial ke-i = seed + i")
+    args = parser.parse_args()
+    with open(args.spec) as f:
+        spec = json.load(f)
+    run_sweep(spec, args.output_dir, args.threads_per_trial, args.workers, args.seed)
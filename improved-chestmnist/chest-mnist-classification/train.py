@@ -1,12 +1,23 @@
 # train.py
 
+import argparse
+import copy
+import os
+import time
 import torch
+import torch.distributed as dist
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
-from datareader import get_data_loaders, NEW_CLASS_NAMES
-from model import SimpleCNN
-import matplotlib.pyplot as plt
-from utils import plot_training_history, visualize_random_val_predictions
+from torch.nn.parallel import DistributedDataParallel
+from augment import BatchAugment
+from checkpoint import AsyncCheckpointer, Snapshot, load_checkpoint, rng_state, set_rng_state, snapshot
+from datareader import get_data_loaders, get_fast_data_loaders, resolve_classes
+from metrics import StreamingMetrics, format_report
+from model import DEFAULT_WIDTHS, AdaptiveSimpleCNN, SimpleCNN
+from profiling import TrainingProfiler, parse_step_window
+from reporting import Reporter
+from utils import collect_val_predictions
 
 # --- Hyperparameter ---
 EPOCHS = 30  # Lebih banyak epoch dengan early stopping
@@ -14,27 +25,231 @@ BATCH_SIZE = 32  # Batch size lebih besar untuk stabilitas
 LEARNING_RATE = 0.001  # Learning rate lebih besar di awal
 DROPOUT_RATE = 0.3  # Dropout untuk regularisasi
 EARLY_STOP_PATIENCE = 7  # Stop jika tidak ada improvement dalam 7 epoch
+USE_FAST_LOADER = True  # Batch langsung dari tensor di device (tanpa DataLoader per-sampel)
+USE_AMP = False  # Mixed precision: float16 + GradScaler di CUDA, bfloat16 di CPU
+CHANNELS_LAST = False  # Memory format channels_last untuk conv stack
+THROUGHPUT_STEPS = 50  # Jumlah step untuk perbandingan throughput di akhir run
+LOG_INTERVAL = 0  # Cetak progress tiap N step (0 = hanya per epoch, tanpa sinkronisasi per step)
+DIST_BACKEND = 'gloo'  # Backend torch.distributed saat dijalankan lewat torchrun (gloo: tanpa GPU)
+PROFILE = False  # Catat waktu per fase, sampel/detik dan peak memory per epoch ke METRICS_PATH
+METRICS_PATH = 'training_metrics.jsonl'
+CHECKPOINT_PATH = 'last_checkpoint.pth'  # Checkpoint lengkap untuk --resume
+BEST_MODEL_PATH = 'best_model.pth'
+AUGMENT = False  # Augmentasi per batch di device (augment.py), hanya untuk batch training
+AUGMENT_SEED = None  # Seed RNG augmentasi (None = dari torch.initial_seed(), jadi ikut torch.manual_seed)
+CHECKPOINT_EVERY = 1  # Tulis checkpoint tiap N epoch di thread latar belakang (0 = nonaktif)
+IMAGE_SIZE = 28  # Resolusi ChestMNIST (28/64/128/224); di atas 28 data di-stream dari cache memmap
+ACTIVATION_CHECKPOINTING = False  # Hitung ulang aktivasi conv saat backward (hemat memori resolusi tinggi)
+LIVE_PLOT = False  # Tampilkan plot history di jendela yang diperbarui tiap epoch (butuh display)
 
-#Menampilkan plot riwayat training dan validasi setelah training selesai.
+def _setup_distributed(backend):
+    """Inisialisasi process group jika dijalankan lewat torchrun. Return (world_size, rank, local_rank)."""
+    world_size = int(os.environ.get('WORLD_SIZE', 1))
+    if world_size <= 1:
+        return 1, 0, 0
+    dist.init_process_group(backend=backend)
+    return world_size, dist.get_rank(), int(os.environ.get('LOCAL_RANK', 0))
 
-def train():
+def _reduce_epoch_stats(values, device, world_size):
+    """Jumlahkan statistik epoch (tensor/angka) dari semua proses; satu sinkronisasi ke host."""
+    stats = torch.stack([torch.as_tensor(v, device=device).to(torch.float64) for v in values])
+    if world_size > 1:
+        dist.all_reduce(stats)
+    return stats.tolist()
+
+def _silent(*args, **kwargs):
+    pass
+
+def _amp_dtype(device):
+    return torch.float16 if device.type == 'cuda' else torch.bfloat16
+
+def _memory_format(channels_last):
+    return torch.channels_last if channels_last else torch.contiguous_format
+
+def _portable_state_dict(model):
+    # Simpan semua tensor dalam format contiguous agar checkpoint bisa di-load oleh model
+    # dengan memory format apa pun (channels_last maupun default)
+    return {k: v.contiguous() for k, v in model.state_dict().items()}
+
+def _criterion(task):
+    # Multi-class (>2 kelas single-label): softmax + cross entropy; biner/multi-label: sigmoid per logit
+    return nn.CrossEntropyLoss() if task == 'multiclass' else nn.BCEWithLogitsLoss()
+
+def _targets(labels, task):
+    return labels if task == 'multiclass' else labels.float()
+
+def _count_correct(outputs, labels, task):
+    """Jumlah prediksi benar (multi-label: dihitung per label)."""
+    if task == 'multiclass':
+        return (outputs.argmax(dim=1) == labels).sum()
+    return ((outputs > 0).float() == labels).sum()
+
+def measure_train_throughput(model, loader, device, use_amp=False, channels_last=False,
+                             steps=THROUGHPUT_STEPS, task='binary'):
+    """Ukur throughput training (sampel/detik) pada salinan model, tanpa mengubah model asli."""
+    memory_format = _memory_format(channels_last)
+    model = copy.deepcopy(model).to(device, memory_format=memory_format)
+    model.train()
+    criterion = _criterion(task)
+    optimizer = optim.Adam(model.parameters(), lr=LEARNING_RATE)
+    scaler = torch.amp.GradScaler(device.type, enabled=use_amp and device.type == 'cuda')
+
+    batches = []
+    while len(batches) < steps:
+        for images, labels in loader:
+            batches.append((images.to(device, memory_format=memory_format), _targets(labels, task).to(device)))
+            if len(batches) == steps:
+                break
+
+    def step(images, labels):
+        with torch.autocast(device_type=device.type, dtype=_amp_dtype(device), enabled=use_amp):
+            loss = criterion(model(images), labels)
+        optimizer.zero_grad()
+        scaler.scale(loss).backward()
+        scaler.step(optimizer)
+        scaler.update()
+
+    # Warm-up (alokasi memori, pemilihan kernel cuDNN)
+    for images, labels in batches[:5]:
+        step(images, labels)
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+
+    start = time.perf_counter()
+    n_samples = 0
+    for images, labels in batches:
+        step(images, labels)
+        n_samples += labels.size(0)
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    return n_samples / (time.perf_counter() - start)
+
+def _resume_settings(resume, resume_state, classes, multilabel, image_size):
+    """
+    (classes, multilabel, image_size) untuk melanjutkan checkpoint `resume`: argumen yang tidak diisi
+    diambil dari checkpoint, argumen yang bertentangan dengan checkpoint → ValueError.
+    """
+    saved_size = resume_state.get('image_size', IMAGE_SIZE)
+    if image_size is None:
+        image_size = saved_size
+    elif image_size != saved_size:
+        raise ValueError(f"Checkpoint '{resume}' dilatih pada resolusi {saved_size}px, bukan {image_size}px")
+    if 'task' not in resume_state:   # Checkpoint lama tanpa metadata task: pakai argumen apa adanya
+        return classes, multilabel, image_size
+    saved_task, saved_names = resume_state['task'], resume_state['class_names']
+    if classes is None and not multilabel:
+        return list(saved_names.values()), saved_task == 'multilabel', image_size
+    _, task, class_names = resolve_classes(classes, multilabel)
+    if (task, class_names) != (saved_task, saved_names):
+        raise ValueError(f"Checkpoint '{resume}' dilatih untuk task {saved_task} dengan kelas "
+                         f"{list(saved_names.values())}, bukan {task} dengan kelas {list(class_names.values())}")
+    return classes, multilabel, image_size
+
+
+def train(epochs=EPOCHS, use_amp=USE_AMP, channels_last=CHANNELS_LAST, log_interval=LOG_INTERVAL,
+          backend=DIST_BACKEND, profile=PROFILE, metrics_path=METRICS_PATH, profile_steps=None,
+          resume=None, checkpoint_path=CHECKPOINT_PATH, checkpoint_every=CHECKPOINT_EVERY,
+          batch_size=BATCH_SIZE, learning_rate=LEARNING_RATE, dropout_rate=DROPOUT_RATE,
+          early_stop_patience=EARLY_STOP_PATIENCE, plot=True, epoch_callback=None, augment=AUGMENT,
+          classes=None, multilabel=False, live_plot=LIVE_PLOT, image_size=None,
+          activation_checkpointing=ACTIVATION_CHECKPOINTING, widths=None, initial_state_dict=None,
+          best_model_path=BEST_MODEL_PATH, augment_seed=AUGMENT_SEED):
+    """
+    Latih SimpleCNN dan return history (loss/akurasi per epoch, best val loss/acc, throughput).
+    - epoch_callback(epoch, metrics): dipanggil setelah setiap epoch dengan dict train_loss, train_acc,
+      val_loss, val_acc dan lr. Jika mengembalikan True, training dihentikan (pruning oleh sweep.py).
+    - plot=False: lewati plot history dan visualisasi prediksi. Plot dirender di proses terpisah
+      (reporting.Reporter) setiap epoch; live_plot=True juga menampilkannya di jendela.
+    - augment: True (BatchAugment default), objek BatchAugment, atau False.
+    - augment_seed: seed BatchAugment untuk augment=True, digabung dengan rank (tiap proses beda
+      stream). None = torch.initial_seed(), sehingga run dengan torch.manual_seed yang sama identik.
+    - classes/multilabel: subset kelas ChestMNIST (lihat datareader.resolve_classes); default biner
+      Cardiomegaly vs Pneumothorax. Loss dan akurasi mengikuti task (biner/multi-class/multi-label).
+    - image_size: resolusi MedMNIST+ (default IMAGE_SIZE). Di atas 28 (atau dengan
+      activation_checkpointing) model memakai AdaptiveSimpleCNN dan batch dibaca per potongan dari cache memmap.
+    - resume: classes/multilabel dan image_size yang tidak diisi diambil dari checkpoint; nilai yang
+      berbeda dari checkpoint menghasilkan ValueError.
+    - widths: lebar layer (conv1, conv2, conv3, fc1, fc2); default model.DEFAULT_WIDTHS, atau dari
+      checkpoint --resume. initial_state_dict: bobot awal (fine-tuning model hasil prune.py).
+    - best_model_path: file model terbaik (default best_model.pth).
+    """
+    # Data-parallel multi-proses (torchrun): hanya rank 0 yang mencetak log, menyimpan model dan plot
+    world_size, rank, local_rank = _setup_distributed(backend)
+    is_main = rank == 0
+    log = print if is_main else _silent
+    
     # Setup Device (GPU/CPU)
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    print(f"Menggunakan device: {device}")
-    if torch.cuda.is_available():
-        print(f"GPU: {torch.cuda.get_device_name(0)}")
+    if world_size > 1:
+        device = torch.device(f'cuda:{local_rank}' if backend == 'nccl' else 'cpu')
+    else:
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    log(f"Menggunakan device: {device}")
+    if device.type == 'cuda':
+        log(f"GPU: {torch.cuda.get_device_name(device)}")
+    if world_size > 1:
+        log(f"Distributed: {world_size} proses (backend {backend}), "
+            f"{torch.get_num_threads()} thread per proses")
     
+    # Resume: checkpoint dibaca sebelum data, karena task, kelas dan resolusi mengikuti checkpoint
+    resume_state = load_checkpoint(resume) if resume else None
+    if resume_state is not None:
+        classes, multilabel, image_size = _resume_settings(resume, resume_state, classes, multilabel, image_size)
+    elif image_size is None:
+        image_size = IMAGE_SIZE
+
     # 1. Memuat Data
-    train_loader, val_loader, num_classes, in_channels = get_data_loaders(BATCH_SIZE)
+    if USE_FAST_LOADER:
+        train_loader, val_loader, num_classes, in_channels = get_fast_data_loaders(
+            batch_size, device=device, world_size=world_size, rank=rank, classes=classes, multilabel=multilabel,
+            size=image_size)
+    else:
+        train_loader, val_loader, num_classes, in_channels = get_data_loaders(
+            batch_size, world_size=world_size, rank=rank, classes=classes, multilabel=multilabel,
+            size=image_size)
+    task = train_loader.dataset.task
+    class_names = train_loader.dataset.class_names
+    # Akurasi multi-label dihitung per label: setiap sampel menyumbang num_classes prediksi
+    targets_per_sample = num_classes if task == 'multilabel' else 1
     
     # 2. Inisialisasi Model dengan Dropout
-    model = SimpleCNN(in_channels=in_channels, num_classes=num_classes, dropout_rate=DROPOUT_RATE).to(device)
-    print(model)
+    # Resume: bobot dimuat sebelum DDP dibuat (semua rank membaca checkpoint yang sama)
+    if widths is None:
+        widths = resume_state.get('widths', DEFAULT_WIDTHS) if resume_state is not None else DEFAULT_WIDTHS
+    memory_format = _memory_format(channels_last)
+    if image_size == 28 and not activation_checkpointing:
+        model = SimpleCNN(in_channels=in_channels, num_classes=num_classes, dropout_rate=dropout_rate,
+                          widths=widths)
+    else:
+        model = AdaptiveSimpleCNN(in_channels=in_channels, num_classes=num_classes, dropout_rate=dropout_rate,
+                                  activation_checkpointing=activation_checkpointing, widths=widths)
+    model = model.to(device, memory_format=memory_format)
+    log(model)
+    if resume_state is not None:
+        model.load_state_dict(resume_state['model_state_dict'])
+    elif initial_state_dict is not None:
+        model.load_state_dict(initial_state_dict)
+    # `net` dipakai untuk forward/backward (DDP me-reduce gradien), `model` untuk simpan/evaluasi
+    if world_size > 1:
+        net = DistributedDataParallel(model, device_ids=[device] if device.type == 'cuda' else None)
+    else:
+        net = model
+    
+    # Augmentasi per batch (opt-in); validasi selalu memakai gambar asli
+    if augment is True:
+        seed = torch.initial_seed() if augment_seed is None else augment_seed
+        augment = BatchAugment(seed=[seed, rank])
+    elif not augment:
+        augment = None
+    
+    # Mixed precision (opt-in): GradScaler hanya diperlukan untuk float16 di CUDA
+    amp_dtype = _amp_dtype(device)
+    scaler = torch.amp.GradScaler(device.type, enabled=use_amp and device.type == 'cuda')
     
     # 3. Mendefinisikan Loss Function dan Optimizer
-    # Gunakan BCEWithLogitsLoss untuk klasifikasi biner. Ini lebih stabil secara numerik.
-    criterion = nn.BCEWithLogitsLoss()
-    optimizer = optim.Adam(model.parameters(), lr=LEARNING_RATE, weight_decay=1e-4)  # L2 regularization
+    # Gunakan BCEWithLogitsLoss untuk klasifikasi biner (dan multi-label). Ini lebih stabil secara numerik.
+    # Multi-class memakai CrossEntropyLoss.
+    criterion = _criterion(task)
+    optimizer = optim.Adam(model.parameters(), lr=learning_rate, weight_decay=1e-4)  # L2 regularization
     
     # Learning Rate Scheduler - mengurangi LR saat plateau
     scheduler = optim.lr_scheduler.ReduceLROnPlateau(
@@ -45,73 +260,185 @@ def train():
     best_val_loss = float('inf')
     best_val_acc = 0.0
     patience_counter = 0
-    best_model_state = None
+    # Snapshot CPU (bukan alias dari parameter yang sedang dilatih) dari epoch terbaik
+    best_snapshot = None
+    best_val_metrics = None
+    early_stopped = False
+    pruned = False
     
     # Inisialisasi list untuk menyimpan history
     train_losses_history = []
     val_losses_history = []
     train_accs_history = []
     val_accs_history = []
+    val_metrics_history = []
+    # ROC-AUC, PR-AUC, sensitivity/specificity, confusion matrix dan ECE (histogram di device)
+    val_metrics = StreamingMetrics(task, num_classes, device, class_names)
     
-    print("\n--- Memulai Training ---")
-    print(f"Hyperparameters:")
-    print(f"  - Epochs: {EPOCHS} (max)")
-    print(f"  - Batch Size: {BATCH_SIZE}")
-    print(f"  - Learning Rate: {LEARNING_RATE}")
-    print(f"  - Dropout: {DROPOUT_RATE}")
-    print(f"  - Early Stop Patience: {EARLY_STOP_PATIENCE}")
-    print()
+    log("\n--- Memulai Training ---")
+    log(f"Hyperparameters:")
+    log(f"  - Epochs: {epochs} (max)")
+    log(f"  - Batch Size: {batch_size}")
+    log(f"  - Learning Rate: {learning_rate}")
+    log(f"  - Dropout: {dropout_rate}")
+    log(f"  - Early Stop Patience: {early_stop_patience}")
+    log(f"  - Mixed Precision: {f'{amp_dtype}'.replace('torch.', '') if use_amp else 'off'}")
+    log(f"  - Channels Last: {'on' if channels_last else 'off'}")
+    log(f"  - Augmentation: {'on' if augment is not None else 'off'}")
+    log(f"  - Task: {task} ({', '.join(class_names.values())})")
+    log(f"  - Image Size: {image_size}x{image_size}"
+        f"{' (activation checkpointing)' if activation_checkpointing else ''}")
+    log(f"  - Widths (conv1/conv2/conv3/fc1/fc2): {'/'.join(map(str, model.widths))}")
+    log()
+    
+    train_time_total = 0.0
+    train_samples_total = 0
+    
+    # Lanjutkan run yang terputus: optimizer, scheduler, early stopping, history dan RNG dipulihkan
+    start_epoch = 0
+    if resume_state is not None:
+        optimizer.load_state_dict(resume_state['optimizer_state_dict'])
+        scheduler.load_state_dict(resume_state['scheduler_state_dict'])
+        # Checkpoint dari run tanpa AMP (GradScaler nonaktif) berisi state kosong: scaler mulai baru
+        if resume_state.get('scaler_state_dict'):
+            scaler.load_state_dict(resume_state['scaler_state_dict'])
+        best_val_loss = resume_state['best_val_loss']
+        best_val_acc = resume_state['best_val_acc']
+        patience_counter = resume_state['patience_counter']
+        if resume_state['best'] is not None:
+            best_snapshot = Snapshot(resume_state['best'])
+        early_stopped = resume_state['early_stopped']
+        (train_losses_history, val_losses_history,
+         train_accs_history, val_accs_history) = resume_state['history']
+        val_metrics_history = resume_state.get('val_metrics_history', [])
+        best_val_metrics = resume_state.get('best_val_metrics')
+        train_time_total = resume_state['train_time_total']
+        train_samples_total = resume_state['train_samples_total']
+        start_epoch = resume_state['epoch']
+        set_rng_state(resume_state['rng_state'])
+        if hasattr(train_loader, 'seed'):
+            train_loader.seed = resume_state['loader_seed']
+        if augment is not None and resume_state.get('augment_state') is not None:
+            augment.load_state_dict(resume_state['augment_state'])
+        log(f"▶️  Melanjutkan dari '{resume}' setelah epoch {start_epoch}"
+            f"{' (sudah early stopping)' if early_stopped else ''}\n")
+        del resume_state
+    
+    # Penulisan best_model.pth dan checkpoint periodik di thread latar belakang (hanya rank 0)
+    best_writer = AsyncCheckpointer()
+    checkpointer = AsyncCheckpointer()
+    
+    # Instrumentasi (hanya rank 0): waktu per fase ke JSONL, trace torch.profiler untuk jendela step
+    profiler = TrainingProfiler(device, enabled=profile and is_main, metrics_path=metrics_path,
+                                profile_steps=profile_steps if is_main else None)
+    
+    # Plot di proses reporter terpisah (hanya rank 0): training loop hanya mengirim angka per epoch
+    reporter = Reporter(live=live_plot) if plot and is_main else None
+    if reporter is not None:
+        for i in range(len(train_losses_history)):
+            reporter.log_epoch(i + 1, train_loss=train_losses_history[i], val_loss=val_losses_history[i],
+                               train_acc=train_accs_history[i], val_acc=val_accs_history[i],
+                               val_roc_auc=val_metrics_history[i]['macro_roc_auc']
+                               if i < len(val_metrics_history) else float('nan'))
     
     # 4. Training Loop
-    for epoch in range(EPOCHS):
-        model.train()
-        running_loss = 0.0
-        train_correct = 0
+    for epoch in range(start_epoch, start_epoch if early_stopped else epochs):
+        net.train()
+        # Urutan shuffle berbeda tiap epoch (dan sama di semua rank)
+        if hasattr(train_loader, 'set_epoch'):
+            train_loader.set_epoch(epoch)
+        elif hasattr(train_loader.sampler, 'set_epoch'):
+            train_loader.sampler.set_epoch(epoch)
+        # Akumulator tetap di device (float64 agar hasilnya identik dengan penjumlahan .item()),
+        # dibaca ke host sekali per epoch
+        running_loss = torch.zeros((), dtype=torch.float64, device=device)
+        train_correct = torch.zeros((), dtype=torch.long, device=device)
         train_total = 0
+        epoch_start = time.perf_counter()
+        step = 0
+        profiler.start_epoch()
         
-        for images, labels in train_loader:
-            images = images.to(device)
-            # Ubah tipe data label menjadi float untuk BCEWithLogitsLoss
-            labels = labels.float().to(device)
+        for images, labels in profiler.iter_data(train_loader):
+            with profiler.phase('h2d'):
+                images = images.to(device, memory_format=memory_format)
+                # Ubah tipe data label menjadi float untuk BCEWithLogitsLoss
+                labels = _targets(labels, task).to(device)
             
-            outputs = model(images)
-            loss = criterion(outputs, labels) # Loss dihitung antara output tunggal dan label
+            # targets = label untuk loss (label lunak jika mixup aktif), akurasi tetap dari labels
+            targets = labels
+            if augment is not None:
+                with profiler.phase('augment'):
+                    # Multi-class: one-hot agar mixup menghasilkan distribusi target (CrossEntropyLoss menerimanya)
+                    aug_labels = F.one_hot(labels, num_classes) if task == 'multiclass' else labels
+                    images, targets = augment(images, aug_labels)
+                    images = images.contiguous(memory_format=memory_format)
             
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
+            with profiler.phase('forward'), \
+                    torch.autocast(device_type=device.type, dtype=amp_dtype, enabled=use_amp):
+                outputs = net(images)
+                loss = criterion(outputs, targets) # Loss dihitung antara output tunggal dan label
             
-            running_loss += loss.item()
+            with profiler.phase('backward'):
+                optimizer.zero_grad()
+                scaler.scale(loss).backward()
+            with profiler.phase('optimizer'):
+                scaler.step(optimizer)
+                scaler.update()
+            
+            running_loss += loss.detach()
             
             # Hitung training accuracy
-            predicted = (outputs > 0).float()
             train_total += labels.size(0)
-            train_correct += (predicted == labels).sum().item()
+            train_correct += _count_correct(outputs, labels, task)
+            
+            step += 1
+            profiler.step()
+            if log_interval and step % log_interval == 0:
+                log(f"  Step [{step}/{len(train_loader)}] | "
+                    f"Train Loss: {running_loss.item() / step:.4f} | "
+                    f"Train Acc: {100 * train_correct.item() / (train_total * targets_per_sample):.2f}%")
         
-        avg_train_loss = running_loss / len(train_loader)
-        train_accuracy = 100 * train_correct / train_total
+        # Satu sinkronisasi per epoch (plus all-reduce antar proses jika distributed)
+        running_loss, n_batches, train_correct, train_total = _reduce_epoch_stats(
+            [running_loss, step, train_correct, train_total], device, world_size)
+        avg_train_loss = running_loss / n_batches
+        train_accuracy = 100 * train_correct / (train_total * targets_per_sample)
+        train_time_total += time.perf_counter() - epoch_start
+        train_samples_total += train_total
         
         # --- Fase Validasi ---
-        model.eval()
-        val_correct = 0
+        net.eval()
+        val_correct = torch.zeros((), dtype=torch.long, device=device)
         val_total = 0
-        val_running_loss = 0.0
+        val_batches = 0
+        val_running_loss = torch.zeros((), dtype=torch.float64, device=device)
+        val_metrics.reset()
         
-        with torch.no_grad():
+        with torch.no_grad(), profiler.phase('validation'):
             for images, labels in val_loader:
-                images = images.to(device)
-                labels = labels.float().to(device)
+                images = images.to(device, memory_format=memory_format)
+                labels = _targets(labels, task).to(device)
                 
-                outputs = model(images)
-                val_loss = criterion(outputs, labels)
-                val_running_loss += val_loss.item()
+                with torch.autocast(device_type=device.type, dtype=amp_dtype, enabled=use_amp):
+                    outputs = model(images)
+                    val_loss = criterion(outputs, labels)
+                val_running_loss += val_loss
+                val_batches += 1
                 
-                predicted = (outputs > 0).float()
                 val_total += labels.size(0)
-                val_correct += (predicted == labels).sum().item()
+                val_correct += _count_correct(outputs, labels, task)
+                val_metrics.update(outputs, labels)
         
-        avg_val_loss = val_running_loss / len(val_loader)
-        val_accuracy = 100 * val_correct / val_total
+        val_running_loss, val_batches, val_correct, val_total = _reduce_epoch_stats(
+            [val_running_loss, val_batches, val_correct, val_total], device, world_size)
+        avg_val_loss = val_running_loss / val_batches
+        val_accuracy = 100 * val_correct / (val_total * targets_per_sample)
+        val_metrics.all_reduce()
+        epoch_metrics = val_metrics.compute()
+        
+        profiler.end_epoch(epoch + 1, train_total, train_loss=avg_train_loss, train_acc=train_accuracy,
+                           val_loss=avg_val_loss, val_acc=val_accuracy, lr=optimizer.param_groups[0]['lr'],
+                           val_metrics=epoch_metrics)
         
         # Update Learning Rate Scheduler
         scheduler.step(avg_val_loss)
@@ -121,53 +448,203 @@ def train():
         val_losses_history.append(avg_val_loss)
         train_accs_history.append(train_accuracy)
         val_accs_history.append(val_accuracy)
+        val_metrics_history.append(epoch_metrics)
+        if reporter is not None:
+            reporter.log_epoch(epoch + 1, train_loss=avg_train_loss, val_loss=avg_val_loss,
+                               train_acc=train_accuracy, val_acc=val_accuracy,
+                               val_roc_auc=epoch_metrics['macro_roc_auc'], lr=optimizer.param_groups[0]['lr'])
         
         # Early Stopping Logic
         if avg_val_loss < best_val_loss:
             best_val_loss = avg_val_loss
             best_val_acc = val_accuracy
+            best_val_metrics = epoch_metrics
             patience_counter = 0
-            best_model_state = model.state_dict().copy()
-            print(f"Epoch [{epoch+1}/{EPOCHS}] | "
-                  f"Train Loss: {avg_train_loss:.4f} | Train Acc: {train_accuracy:.2f}% | "
-                  f"Val Loss: {avg_val_loss:.4f} | Val Acc: {val_accuracy:.2f}% ⭐ NEW BEST!")
+            best_snapshot = snapshot({
+                'epoch': epoch + 1,
+                'model_state_dict': _portable_state_dict(model),
+                'optimizer_state_dict': optimizer.state_dict(),
+                'best_val_loss': best_val_loss,
+                'best_val_acc': best_val_acc,
+                'val_metrics': epoch_metrics,
+                'image_size': image_size,
+                'widths': model.widths,
+                'task': task,
+                'class_names': class_names,
+            })
+            if is_main:
+                best_writer.save(best_snapshot, best_model_path)
+            log(f"Epoch [{epoch+1}/{epochs}] | "
+                f"Train Loss: {avg_train_loss:.4f} | Train Acc: {train_accuracy:.2f}% | "
+                f"Val Loss: {avg_val_loss:.4f} | Val Acc: {val_accuracy:.2f}% ⭐ NEW BEST!")
         else:
             patience_counter += 1
-            print(f"Epoch [{epoch+1}/{EPOCHS}] | "
-                  f"Train Loss: {avg_train_loss:.4f} | Train Acc: {train_accuracy:.2f}% | "
-                  f"Val Loss: {avg_val_loss:.4f} | Val Acc: {val_accuracy:.2f}% "
-                  f"[Patience: {patience_counter}/{EARLY_STOP_PATIENCE}]")
+            log(f"Epoch [{epoch+1}/{epochs}] | "
+                f"Train Loss: {avg_train_loss:.4f} | Train Acc: {train_accuracy:.2f}% | "
+                f"Val Loss: {avg_val_loss:.4f} | Val Acc: {val_accuracy:.2f}% "
+                f"[Patience: {patience_counter}/{early_stop_patience}]")
+        log(f"{'':>10}Val ROC-AUC: {epoch_metrics['macro_roc_auc']:.4f} | "
+            f"PR-AUC: {epoch_metrics['macro_pr_auc']:.4f} | ECE: {epoch_metrics['ece']:.4f}")
+        
+        # Callback per epoch (mis. pruning trial sweep yang kurvanya jelek)
+        if epoch_callback is not None:
+            pruned = bool(epoch_callback(epoch + 1, {
+                'train_loss': avg_train_loss, 'train_acc': train_accuracy,
+                'val_loss': avg_val_loss, 'val_acc': val_accuracy, 'lr': optimizer.param_groups[0]['lr'],
+                'val_roc_auc': epoch_metrics['macro_roc_auc'],
+            }))
         
         # Check Early Stopping
-        if patience_counter >= EARLY_STOP_PATIENCE:
-            print(f"\n⚠️  Early Stopping triggered at epoch {epoch+1}")
-            print(f"Best Val Loss: {best_val_loss:.4f} | Best Val Acc: {best_val_acc:.2f}%")
+        early_stopped = patience_counter >= early_stop_patience
+        
+        # Checkpoint periodik: cukup untuk melanjutkan run ini persis dari epoch berikutnya
+        last_epoch = early_stopped or pruned or epoch + 1 == epochs
+        if is_main and checkpoint_every and ((epoch + 1) % checkpoint_every == 0 or last_epoch):
+            checkpointer.save({
+                'epoch': epoch + 1,
+                'model_state_dict': _portable_state_dict(model),
+                'optimizer_state_dict': optimizer.state_dict(),
+                'scheduler_state_dict': scheduler.state_dict(),
+                'scaler_state_dict': scaler.state_dict(),
+                'best_val_loss': best_val_loss,
+                'best_val_acc': best_val_acc,
+                'patience_counter': patience_counter,
+                'best': best_snapshot,
+                'early_stopped': early_stopped,
+                'history': [train_losses_history, val_losses_history, train_accs_history, val_accs_history],
+                'val_metrics_history': val_metrics_history,
+                'best_val_metrics': best_val_metrics,
+                'train_time_total': train_time_total,
+                'train_samples_total': train_samples_total,
+                'image_size': image_size,
+                'widths': model.widths,
+                'task': task,
+                'class_names': class_names,
+                'rng_state': rng_state(),
+                'loader_seed': getattr(train_loader, 'seed', None),
+                'augment_state': augment.state_dict() if augment is not None else None,
+            }, checkpoint_path)
+        
+        if early_stopped:
+            log(f"\n⚠️  Early Stopping triggered at epoch {epoch+1}")
+            log(f"Best Val Loss: {best_val_loss:.4f} | Best Val Acc: {best_val_acc:.2f}%")
+            break
+        if pruned:
+            log(f"\n✂️  Training dihentikan oleh epoch_callback (pruned) setelah epoch {epoch+1}")
             break
 
+    profiler.close()
+    if profile and is_main:
+        log(f"\n📈 Metrics per epoch disimpan ke '{metrics_path}'")
+    
     # Load best model
-    if best_model_state is not None:
-        model.load_state_dict(best_model_state)
-        print(f"\n✅ Loaded best model with Val Acc: {best_val_acc:.2f}%")
+    if best_snapshot is not None:
+        model.load_state_dict(best_snapshot.wait()['model_state_dict'])
+        log(f"\n✅ Loaded best model with Val Acc: {best_val_acc:.2f}%")
+    if best_val_metrics is not None:
+        log("\n--- Metrik Validasi Model Terbaik ---")
+        log(format_report(best_val_metrics))
 
-    print("--- Training Selesai ---")
+    log("--- Training Selesai ---")
     
-    # Simpan model terbaik
-    torch.save({
-        'epoch': epoch + 1,
-        'model_state_dict': model.state_dict(),
-        'optimizer_state_dict': optimizer.state_dict(),
+    history = {
+        'train_loss': train_losses_history,
+        'val_loss': val_losses_history,
+        'train_acc': train_accs_history,
+        'val_acc': val_accs_history,
         'best_val_loss': best_val_loss,
         'best_val_acc': best_val_acc,
-    }, 'best_model.pth')
-    print("✅ Model terbaik disimpan sebagai 'best_model.pth'")
+        'val_metrics': val_metrics_history,
+        'best_val_metrics': best_val_metrics,
+        'epochs': len(train_losses_history),
+        'early_stopped': early_stopped,
+        'pruned': pruned,
+        'samples_per_s': train_samples_total / train_time_total if train_time_total else None,
+    }
     
-    # Tampilkan plot
-    plot_training_history(train_losses_history, val_losses_history, 
-                         train_accs_history, val_accs_history)
-
-    # Visualisasi prediksi pada 10 gambar random dari validation set
-    visualize_random_val_predictions(model, val_loader, num_classes, count=10)
+    if not is_main:
+        dist.destroy_process_group()
+        return history
+    
+    # Model terbaik sudah ditulis di latar belakang setiap ada NEW BEST; tunggu penulisan terakhir
+    best_writer.close()
+    checkpointer.close()
+    log(f"✅ Model terbaik disimpan sebagai '{best_model_path}'")
+    if checkpoint_every:
+        log(f"✅ Checkpoint terakhir disimpan sebagai '{checkpoint_path}' (lanjutkan dengan --resume)")
+    
+    # Perbandingan throughput: FP32 default vs konfigurasi yang dipakai pada run ini
+    if train_time_total:
+        log(f"\nThroughput training run ini: {train_samples_total / train_time_total:.0f} sampel/detik")
+    if use_amp or channels_last:
+        log(f"\n--- Perbandingan Throughput ({THROUGHPUT_STEPS} step, batch {batch_size}) ---")
+        baseline = measure_train_throughput(model, train_loader, device, task=task)
+        optimized = measure_train_throughput(model, train_loader, device, use_amp, channels_last, task=task)
+        label = ' + '.join(name for name, on in (('AMP', use_amp), ('channels_last', channels_last)) if on)
+        log(f"  FP32 (default)       : {baseline:10.0f} sampel/detik")
+        log(f"  {label:<21}: {optimized:10.0f} sampel/detik ({optimized / baseline:.2f}x)")
+    
+    if reporter is not None:
+        # Visualisasi prediksi pada 10 gambar random dari validation set (satu batch, dirender reporter)
+        predictions = collect_val_predictions(model, val_loader, count=10, class_names=class_names)
+        if predictions is not None:
+            reporter.log_predictions(predictions)
+        for path in reporter.close():
+            log(f"✅ Plot disimpan sebagai '{path}'")
+    
+    if world_size > 1:
+        dist.destroy_process_group()
+    return history
 
 if __name__ == '__main__':
-    train()
+    parser = argparse.ArgumentParser(description="Training SimpleCNN pada ChestMNIST biner")
+    parser.add_argument('--epochs', type=int, default=EPOCHS, help="jumlah epoch maksimum")
+    parser.add_argument('--backend', default=DIST_BACKEND,
+                        help="backend torch.distributed saat dijalankan dengan torchrun (gloo/nccl)")
+    parser.add_argument('--amp', action='store_true', default=USE_AMP,
+                        help="mixed precision (float16 di CUDA, bfloat16 di CPU)")
+    parser.add_argument('--channels-last', action='store_true', default=CHANNELS_LAST,
+                        help="memory format channels_last untuk conv stack")
+    parser.add_argument('--profile', action='store_true', default=PROFILE,
+                        help="catat waktu per fase/sampel per detik/peak memory per epoch (JSONL)")
+    parser.add_argument('--metrics-file', default=METRICS_PATH, help="file JSONL untuk --profile")
+    parser.add_argument('--profile-steps', type=parse_step_window, default=None, metavar='START:END',
+                        help="rekam trace torch.profiler untuk step global START..END-1")
+    parser.add_argument('--log-interval', type=int, default=LOG_INTERVAL,
+                        help="cetak progress tiap N step (0 = hanya per epoch)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--learning-rate', type=float, default=LEARNING_RATE)
+    parser.add_argument('--dropout-rate', type=float, default=DROPOUT_RATE)
+    parser.add_argument('--patience', type=int, default=EARLY_STOP_PATIENCE, help="patience early stopping")
+    parser.add_argument('--augment', action='store_true', default=AUGMENT,
+                        help="augmentasi per batch di device (affine, intensity jitter; lihat augment.py)")
+    parser.add_argument('--augment-seed', type=int, default=AUGMENT_SEED,
+                        help="seed augmentasi (default: dari seed torch, torch.initial_seed())")
+    parser.add_argument('--classes', nargs='+', default=None, metavar='KELAS',
+                        help="nama/indeks kelas ChestMNIST (default: Cardiomegaly Pneumothorax)")
+    parser.add_argument('--multilabel', action='store_true',
+                        help="task multi-label (default: ke-14 kelas, termasuk sampel tanpa temuan)")
+    parser.add_argument('--no-plot', action='store_true', help="lewati plot history dan visualisasi prediksi")
+    parser.add_argument('--size', type=int, default=None, choices=(28, 64, 128, 224),
+                        help=f"resolusi ChestMNIST (MedMNIST+, default {IMAGE_SIZE} atau dari --resume); "
+                             ">28 dibaca per potongan dari cache memmap")
+    parser.add_argument('--activation-checkpointing', action='store_true', default=ACTIVATION_CHECKPOINTING,
+                        help="hitung ulang aktivasi conv saat backward (hemat memori pada resolusi tinggi)")
+    parser.add_argument('--live-plot', action='store_true', default=LIVE_PLOT,
+                        help="tampilkan plot history yang diperbarui tiap epoch di jendela (butuh display)")
+    parser.add_argument('--resume', nargs='?', const=CHECKPOINT_PATH, default=None, metavar='CHECKPOINT',
+                        help=f"lanjutkan run dari checkpoint (default: {CHECKPOINT_PATH})")
+    parser.add_argument('--checkpoint-file', default=CHECKPOINT_PATH, help="file checkpoint periodik")
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY,
+                        help="tulis checkpoint tiap N epoch (0 = nonaktif)")
+    args = parser.parse_args()
+    train(epochs=args.epochs, use_amp=args.amp, channels_last=args.channels_last,
+          log_interval=args.log_interval, backend=args.backend, profile=args.profile,
+          metrics_path=args.metrics_file, profile_steps=args.profile_steps, resume=args.resume,
+          checkpoint_path=args.checkpoint_file, checkpoint_every=args.checkpoint_every,
+          batch_size=args.batch_size, learning_rate=args.learning_rate, dropout_rate=args.dropout_rate,
+          early_stop_patience=args.patience, plot=not args.no_plot, augment=args.augment,
+          augment_seed=args.augment_seed,
+          classes=args.classes, multilabel=args.multilabel, live_plot=args.live_plot,
+          image_size=args.size, activation_checkpointing=args.activation_checkpointing)
     
\ No newline at end of file